@@ -1,15 +1,28 @@
+import time
+_imports_started = time.perf_counter()
+
 from dotenv import load_dotenv
+import os
 
-from google.genai import types
-from PIL import Image
 from livekit.agents.llm import ImageContent
-import numpy as np
 
-from livekit import agents
-from livekit.agents import AgentSession, Agent, ChatContext, ChatMessage, RoomInputOptions
+from livekit import agents, rtc
+from livekit.agents import AgentSession, Agent, ChatContext, ChatMessage, RoomInputOptions, get_job_context
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from livekit.plugins import google, noise_cancellation, silero, openai, deepgram,rime
-from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
+from livekit.plugins import noise_cancellation, silero
+from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION, SCENE_UNCHANGED_NOTE, LOW_QUALITY_NOTES, MEMORY_NOTE, VISION_SHED_NOTE, CROP_NOTE, CROP_KINDS
+from broadcaster import CameraBroadcaster
+from camera import CameraStateStore
+from identity import SessionIdentity
+from memory import ConversationMemory, format_memories
+from history import ConversationRecorder
+from resources import ResourceRegistry, StartupReport, import_plugins
+from providers import PROVIDERS, ProviderRouter
+from telemetry import TurnTracer, start_metrics_server
+from load import AdmissionController, load_reporter
+from supervisor import VIDEO_STREAM_PREFIX, SessionSupervisor
+from loop_watchdog import watch_loop
+from db import db_enabled, get_pool
 from tools import (
     search_web, 
     get_weather, 
@@ -17,41 +30,91 @@ from tools import (
     camera_on,
     camera_off,
     switch_camera,
+    identify_person,
+    recognize_item,
+    read_text,
+    close_http_session,
+    get_http_session,
+    warm_tool_dependencies,
 )
 import logging
 import asyncio
+from typing import Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# LLM/STT/TTS stack per session, from AGENT_PROVIDERS. Plugins register themselves on
+# import, so only the ones the configured providers need are imported, on the main thread.
+router = ProviderRouter()
+import_plugins(",".join(router.required_plugins()))
+
+# Loaded once per worker process and shared read-only by every session
+resources = ResourceRegistry()
+resources.register("vad", silero.VAD.load)
+resources.register("turn_detector", MultilingualModel)
+resources.register("noise_cancellation", noise_cancellation.BVC)
+
+# The vision modules pull in cv2 and their model runtimes, so they are imported by the
+# loaders in prewarm rather than when the worker imports this module
+def _load_face_engine():
+    from faces import get_face_engine
+    return get_face_engine()
+
+def _load_classifiers():
+    from recognition import load_classifiers
+    return load_classifiers()
+
+def _load_text_reader():
+    from ocr import load_text_reader
+    return load_text_reader()
+
+_region_finder = None
+
+def get_region_finder():
+    """Worker-wide: picks each turn's resolution and crop; holds the text detector."""
+    global _region_finder
+    if _region_finder is None:
+        from regions import RegionFinder
+        _region_finder = RegionFinder()
+    return _region_finder
+
+resources.register("face_engine", _load_face_engine)
+resources.register("classifiers", _load_classifiers)
+resources.register("text_reader", _load_text_reader)
+resources.register("text_detector", lambda: get_region_finder().load())
+
+async def _warm_http() -> None:
+    get_http_session()
+
+resources.register_async("http_pool", _warm_http)
+if db_enabled():
+    resources.register_async("db_pool", get_pool)
+
+startup_report = StartupReport(resources, import_seconds=time.perf_counter() - _imports_started)
+
 def prewarm(proc: agents.JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    started = time.perf_counter()
+    resources.load_all()
+    startup_report.log_prewarm(time.perf_counter() - started)
+    start_metrics_server()
+    load_reporter.start()
 
 class AssistiveAgent(Agent):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        chat_ctx: ChatContext = None,
+        supports_vision: bool = True,
+        supervisor: Optional[SessionSupervisor] = None,
+        **models,
+    ) -> None:
+        # models: llm (and stt/tts for cascaded pipelines) from the provider router
         super().__init__(
             instructions=AGENT_INSTRUCTION,
-            llm=google.beta.realtime.RealtimeModel(
-                voice="Leda",
-                # so far this model is fucking good at calling tools, and great for vision
-                model="gemini-live-2.5-flash-preview",
-                # The best model for now, but very expensive, bad for calling tools
-                # model="gemini-2.5-flash-preview-native-audio-dialog",
-                # Best for speech and vision, bad for calling tools
-                # model="gemini-2.5-flash-exp-native-audio-thinking-dialog",
-            ),
-            # Fuckk this model is fucking good at calling tools, but nope for vision
-            # llm=openai.realtime.RealtimeModel(
-            #     model="gpt-4o-realtime-preview-2025-06-03",
-            #     voice="sage",
-            #     modalities=["audio", "text"]
-            # ),
-            # stt= deepgram.STT(),
-            # tts= rime.TTS(),
-
-            vad=silero.VAD.load(),
+            chat_ctx=chat_ctx,
+            **models,
             tools=[
                 search_web, 
                 get_weather, 
@@ -59,45 +122,356 @@ class AssistiveAgent(Agent):
                 camera_on,
                 camera_off,
                 switch_camera,
+                identify_person,
+                recognize_item,
+                read_text,
             ]
         )
         self._latest_frame = None
         self._video_stream = None
+        self._video_track_sid = None
+        self._video_task = None
         self._tasks = []
-        
+        self._room = None
+        # Session-scoped owner of the reader task, stream and frame buffers
+        self._owns_supervisor = supervisor is None
+        self._supervisor = supervisor or SessionSupervisor(f"agent_{id(self):x}")
+        from vision import FrameDeduplicator, FrameEncoder, FrameRing
+        self._encoder = FrameEncoder(region_finder=get_region_finder())
+        self._deduplicator = FrameDeduplicator()
+        # The newest frame is held outside the ring, so it gets the rest of the budget
+        self._frame_ring = FrameRing(max_bytes=self._supervisor.max_buffer_bytes // 2)
+        self._supervisor.register_buffer(f"frames_{id(self):x}", self._frame_bytes)
+        self.last_vision = None
+        self.supports_vision = supports_vision
+
+    @property
+    def latest_frame(self):
+        return self._latest_frame
+
+    def _frame_bytes(self) -> int:
+        latest = len(self._latest_frame.data) if self._latest_frame is not None else 0
+        return latest + self._frame_ring.nbytes
+
+    async def on_enter(self) -> None:
+        self._room = get_job_context().room
+        self._room.on("track_subscribed", self._on_track_subscribed)
+        self._room.on("track_unsubscribed", self._on_track_unsubscribed)
+
+        # Pick up a camera that was already published before the agent joined
+        for participant in self._room.remote_participants.values():
+            for publication in participant.track_publications.values():
+                if publication.track and publication.track.kind == rtc.TrackKind.KIND_VIDEO:
+                    self._create_video_stream(publication.track)
+                    return
+
+    async def on_exit(self) -> None:
+        await self.close_video()
+
+    def _on_track_subscribed(
+        self, track: rtc.Track, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant
+    ) -> None:
+        # Switching camera republishes the track, so this also restarts the reader
+        if track.kind == rtc.TrackKind.KIND_VIDEO:
+            self._create_video_stream(track)
+
+    def _on_track_unsubscribed(
+        self, track: rtc.Track, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant
+    ) -> None:
+        if track.kind == rtc.TrackKind.KIND_VIDEO and track.sid == self._video_track_sid:
+            self._stop_video_stream()
+            self._latest_frame = None
+            self._frame_ring.clear()
+
+    def _create_video_stream(self, track: rtc.Track) -> None:
+        self._stop_video_stream()
+        self._deduplicator.reset()
+        self._frame_ring.clear()
+        # capacity=1: the stream itself keeps at most one pending frame
+        stream = rtc.VideoStream(track, capacity=1)
+        self._video_stream = stream
+        self._video_track_sid = track.sid
+        self._supervisor.register(f"{VIDEO_STREAM_PREFIX}{track.sid}", stream.aclose)
+
+        async def read_stream() -> None:
+            # Single slot: every new frame replaces the previous one
+            async for event in stream:
+                self._latest_frame = event.frame
+                self._frame_ring.push(event.frame)
+
+        self._video_task = self._track_task(read_stream(), name=f"video_reader_{track.sid}")
+        logger.info(f"Started video reader for track {track.sid}")
+
+    def _track_task(self, coro, name: str) -> asyncio.Task:
+        task = self._supervisor.spawn(coro, name=name, essential=True)
+        if task is not None:
+            task.add_done_callback(self._tasks.remove)
+            self._tasks.append(task)
+        return task
+
+    def _stop_video_stream(self) -> None:
+        if self._video_task is not None:
+            self._video_task.cancel()
+            self._video_task = None
+        if self._video_stream is not None:
+            self._supervisor.release(f"{VIDEO_STREAM_PREFIX}{self._video_track_sid}")
+            self._track_task(self._video_stream.aclose(), name="video_stream_close")
+            self._video_stream = None
+            self._video_track_sid = None
+
+    async def close_video(self) -> None:
+        """Stop the frame reader and detach room listeners. Safe to call more than once."""
+        if self._room is not None:
+            self._room.off("track_subscribed", self._on_track_subscribed)
+            self._room.off("track_unsubscribed", self._on_track_unsubscribed)
+            self._room = None
+        self._stop_video_stream()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._latest_frame = None
+        self._frame_ring.clear()
+        self._supervisor.unregister_buffer(f"frames_{id(self):x}")
+        if self._owns_supervisor:
+            await self._supervisor.aclose()
+        logger.info(
+            f"Vision frames sent={self._deduplicator.sent}, skipped as unchanged={self._deduplicator.skipped}"
+        )
+
     async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
-        if self._latest_frame:
-            # Tambahkan ke konten pesan (sesuai implementasi aslinya)
-            new_message.content.append(ImageContent(image=self._latest_frame))
+        userdata = self.session.userdata
+        tracer = userdata["turn_tracer"]
+        memory = userdata.get("memory")
+
+        async def attach_frame() -> None:
+            with tracer.span("frame_handling"):
+                await self._attach_frame(new_message)
+
+        async def recall() -> list:
+            if memory is None:
+                return []
+            with tracer.span("memory_recall"):
+                return await memory.recall(new_message.text_content or "")
 
-            # Convert VideoFrame ke NumPy array (asumsi frame RGB)
-            frame_array = self._latest_frame.to_ndarray(format="rgb24")  # bisa juga 'bgr24'
+        # Recall is bounded by its own budget and overlaps the frame work
+        _, memories = await asyncio.gather(attach_frame(), recall())
+        if memories:
+            turn_ctx.add_message(role="system", content=MEMORY_NOTE.format(memories=format_memories(memories)))
 
-            # Konversi ke Image dan simpan
-            image = Image.fromarray(frame_array)
-            image.save("latest_frame.png")  # Simpan ke file
+    async def _attach_frame(self, new_message: ChatMessage) -> None:
+        # What happened to the camera frame this turn, recorded with the user message
+        self.last_vision = None
+        frame = self._latest_frame if self.supports_vision else None
+        if frame is not None and load_reporter.should_shed("frames"):
+            # Worker is saturated: a turn without the image beats a late turn
+            new_message.content.append(VISION_SHED_NOTE)
+            self.last_vision = {"attached": False, "reason": "load"}
+            return
+        if frame is not None:
+            # Score, downscale and compress off the event loop; only the reduced image is uploaded
+            try:
+                if load_reporter.should_shed("frame_selection"):
+                    # Skip best-of-window scoring and send the newest frame as is
+                    quality = None
+                else:
+                    frame, quality = await self._frame_ring.select(frame)
+                if quality is not None and quality.problem is not None:
+                    # Nothing in the recent window is worth uploading; let the model ask the user to adjust
+                    new_message.content.append(LOW_QUALITY_NOTES[quality.problem])
+                    self.last_vision = {"attached": False, "reason": quality.problem, **_quality_metadata(quality)}
+                    logger.debug(f"Skipped low quality frame: {quality}")
+                    return
+                from regions import turn_focus
+                focus = turn_focus(new_message.text_content or "")
+                encoded = await self._encoder.encode(frame, self._deduplicator, focus=focus)
+            except Exception as e:
+                logger.warning(f"Failed to process frame, sending turn without image: {e}")
+                self.last_vision = {"attached": False, "reason": "error"}
+                return
+            if encoded is None:
+                # Same scene as the last image the model saw, skip the upload
+                new_message.content.append(SCENE_UNCHANGED_NOTE)
+                self.last_vision = {"attached": False, "reason": "unchanged"}
+                logger.debug(
+                    f"Frame unchanged, skipped attachment "
+                    f"(sent={self._deduplicator.sent}, skipped={self._deduplicator.skipped})"
+                )
+                return
+            new_message.content.append(ImageContent(image=encoded.data_url, mime_type=encoded.mime_type))
+            region = encoded.region
+            if region is not None:
+                # Tell the model it's seeing a crop, and of what
+                new_message.content.append(CROP_NOTE.format(
+                    kind=CROP_KINDS[region.kind], position=region.position, percent=round(region.coverage * 100)
+                ))
+            self.last_vision = {
+                "attached": True,
+                "width": encoded.width,
+                "height": encoded.height,
+                "bytes": len(encoded.data),
+                "mime_type": encoded.mime_type,
+                "focus": focus,
+                **({"region": region.to_dict()} if region is not None else {}),
+                **(_quality_metadata(quality) if quality is not None else {}),
+            }
+
+
+def _quality_metadata(quality) -> dict:
+    return {
+        "sharpness": round(quality.sharpness, 1),
+        "brightness": round(quality.brightness, 1),
+        "motion": round(quality.motion, 1),
+    }
 
 
 async def entrypoint(ctx: agents.JobContext):
     """Main entry point for the agent"""
+    job_started_at = time.perf_counter()
     try:
+        # Everything this room starts is closed when it disconnects, even if the job lingers
+        supervisor = SessionSupervisor(ctx.room.name)
+        ctx.room.on("disconnected", lambda *_: supervisor.close_soon())
+        ctx.add_shutdown_callback(supervisor.aclose)
+
+        supervisor.spawn(resources.warm_async(), name="warm_pools")
+        # Flags blocking calls with their stack; tick lag also feeds the worker's load function
+        watch_loop(on_lag=load_reporter.record_lag)
+        # Map the room to its sessions row once; tools read it from userdata
+        identity_task = asyncio.create_task(SessionIdentity(ctx.room.name).resolve(), name="resolve_session")
+        # One realtime channel per room, reused by every camera tool call
+        camera_broadcaster = CameraBroadcaster()
+        camera_broadcaster.start()
+        supervisor.register("camera_broadcaster", camera_broadcaster.aclose)
+        session_identity = await identity_task
+        supervisor.register("session", session_identity.deactivate)
+        # Authoritative camera state; tools answer from memory, camera_states follows
+        camera_state = CameraStateStore(session_identity, camera_broadcaster)
+        supervisor.spawn(camera_state.load(), name="camera_state_load")
+        supervisor.register("camera_state", camera_state.aclose)
+
+        @ctx.room.on("track_subscribed")
+        def _on_camera_published(track: rtc.Track, *_):
+            if track.kind == rtc.TrackKind.KIND_VIDEO:
+                camera_state.observe_track(True)
+
+        @ctx.room.on("track_unsubscribed")
+        def _on_camera_unpublished(track: rtc.Track, *_):
+            if track.kind == rtc.TrackKind.KIND_VIDEO:
+                camera_state.observe_track(False)
+
+        ctx.add_shutdown_callback(close_http_session)
+        # Resume anything left in the outbox by a previous job
+        from mailer import get_mail_queue
+        get_mail_queue().start()
+        ctx.add_shutdown_callback(get_mail_queue().aclose)
+
+        # Long-term memory across this user's sessions; the latest snippets seed the context
+        memory = ConversationMemory(session_identity)
+        memory.start()
+        supervisor.register("memory", memory.aclose)
+        initial_ctx = ChatContext.empty()
+        recent_memories = await memory.recent()
+        if recent_memories:
+            initial_ctx.add_message(role="system", content=MEMORY_NOTE.format(memories=format_memories(recent_memories)))
+
+        # Per-turn span timeline; slow turns go to SLOW_TURN_LOG
+        turn_tracer = TurnTracer(ctx.room.name)
+
         # Initialize session
         session = AgentSession(
-                vad=ctx.proc.userdata["vad"],
-                turn_detection=MultilingualModel(),
+                vad=resources.get("vad"),
+                turn_detection=resources.get("turn_detector"),
+                userdata={
+                    "camera_broadcaster": camera_broadcaster,
+                    "camera_state": camera_state,
+                    "session": session_identity,
+                    "memory": memory,
+                    "turn_tracer": turn_tracer,
+                    "supervisor": supervisor,
+                },
+        )
+        turn_tracer.attach(session)
+        provider = router.choose(ctx.room.name)
+        logger.info(f"Session {ctx.room.name} routed to provider {provider}")
+        agent = AssistiveAgent(
+            chat_ctx=initial_ctx,
+            supports_vision=PROVIDERS[provider].supports_vision,
+            supervisor=supervisor,
+            **router.build(provider),
         )
-        agent = AssistiveAgent()
+
+        def _on_failover(next_provider: str):
+            # Same conversation on the next provider; on_exit/on_enter hand over the camera stream
+            replacement = AssistiveAgent(
+                chat_ctx=session.current_agent.chat_ctx,
+                supports_vision=PROVIDERS[next_provider].supports_vision,
+                supervisor=supervisor,
+                **router.build(next_provider),
+            )
+            session.update_agent(replacement)
+
+        router.attach(session, provider, on_failover=_on_failover)
+
+        # Write-behind persistence of every turn to conversation_history
+        recorder = ConversationRecorder(session_identity)
+        recorder.start()
+        supervisor.register("conversation_recorder", recorder.aclose)
+
+        async def _close_agent():
+            await session.current_agent.close_video()
+            # The stats thread is a daemon; hand this session's last samples to the other processes
+            await asyncio.to_thread(router.flush)
+            logger.info(f"Provider stats: {router.summary()}")
+
+        # Closed newest first: the agent's video goes before the recorder's final flush
+        supervisor.register("agent", _close_agent)
+
+        saw_image = False
+
+        @session.on("conversation_item_added")
+        def _on_conversation_item_added(ev):
+            nonlocal saw_image
+            item = ev.item
+            if getattr(item, "role", None) not in ("user", "assistant"):
+                return
+            metadata = {"item_id": item.id, "interrupted": item.interrupted}
+            current_agent = session.current_agent
+            if item.role == "user":
+                vision = current_agent.last_vision
+                if vision is not None:
+                    metadata["vision"] = vision
+                saw_image = bool(vision and vision.get("attached"))
+            recorder.record(item.role, item.text_content, metadata)
+            # A reply to a turn with an image is the model's description of the scene
+            memory.remember("vision" if item.role == "assistant" and saw_image else item.role, item.text_content)
+
+        def _on_first_speech(ev):
+            if ev.new_state == "speaking":
+                session.off("agent_state_changed", _on_first_speech)
+                startup_report.log_first_reply(job_started_at)
+
+        session.on("agent_state_changed", _on_first_speech)
 
         await session.start(
             room=ctx.room,
             agent=agent,
             room_input_options=RoomInputOptions(
                 video_enabled=True,
-                noise_cancellation=noise_cancellation.BVC(),
+                noise_cancellation=resources.get("noise_cancellation"),
             ),
         )
 
         await ctx.connect()
+        # Tool dependencies (e.g. langchain for search) load in the background, not on first use
+        supervisor.spawn(warm_tool_dependencies(), name="warm_tools")
+
+        # Speaks up on obstacles and scene changes between turns; idle while the provider can't see
+        from watcher import SceneWatcher
+        scene_watcher = SceneWatcher(
+            session,
+            get_frame=lambda: session.current_agent.latest_frame if session.current_agent.supports_vision else None,
+            should_pause=lambda: load_reporter.should_shed("background"),
+        )
+        scene_watcher.start()
+        supervisor.register("scene_watcher", scene_watcher.aclose)
 
         # Start the conversation
         await session.generate_reply(
@@ -112,7 +486,23 @@ async def entrypoint(ctx: agents.JobContext):
         raise
 
 
+def worker_options() -> agents.WorkerOptions:
+    # Jobs are admitted on measured CPU, memory, loop lag and video streams, not CPU alone
+    admission = AdmissionController()
+    # One room per job process: the HTTP session, DB pool, mail queue and caches are per-process singletons
+    # bound to the job's event loop, so rooms must not share a process (no JobExecutorType.THREAD)
+    options = {}
+    if os.getenv("WORKER_IDLE_PROCESSES"):
+        options["num_idle_processes"] = int(os.getenv("WORKER_IDLE_PROCESSES"))
+    return agents.WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        request_fnc=admission.request_fnc,
+        load_fnc=admission.load_fnc,
+        load_threshold=admission.config.threshold,
+        **options,
+    )
+
+
 if __name__ == "__main__":
-    agents.cli.run_app(
-        agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm)
-    )
\ No newline at end of file
+    agents.cli.run_app(worker_options())
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Startup import-time budget.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each
+budgeted module, prints the slowest imports, and exits non-zero when a module's
+cumulative import time is over budget. Run from the repository root:
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py tools --runs 5 --budget tools=400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Cumulative import time budgets in milliseconds (median of --runs)
+DEFAULT_BUDGETS = {
+    "tools": 600,
+    "agent": 2500,
+}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> dict:
+    """Self/cumulative microseconds per imported module, from one fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2].strip()
+        timings[name] = (self_us, cumulative_us)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help="only check these modules (default: every budgeted module)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", action="append", default=[], help="module=milliseconds, overrides the default")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for override in args.budget:
+        module, ms = override.split("=")
+        budgets[module] = int(ms)
+    if args.modules:
+        budgets = {module: budgets.get(module, 0) for module in args.modules}
+
+    failed = False
+    for module, budget_ms in budgets.items():
+        runs = [measure(module) for _ in range(args.runs)]
+        total_ms = statistics.median(run[module][1] for run in runs) / 1000
+        status = "OK" if total_ms <= budget_ms else "OVER BUDGET"
+        failed |= total_ms > budget_ms
+        print(f"{module}: {total_ms:.0f} ms (budget {budget_ms} ms) {status}")
+
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1][1], reverse=True)
+        top_level = [(name, cumulative) for name, (_, cumulative) in slowest if "." not in name and name != module]
+        for name, cumulative in top_level[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+Offline replay benchmark for the agent's turn pipeline.
+
+Replays a script of user turns (recorded audio, camera frames and the tool
+calls the model made) through AssistiveAgent's frame handling and the real
+tools in tools.py, with every external service replaced by a local stand-in:
+
+    realtime LLM      FakeRealtimeModel: fixed first-token delay, then the scripted tool calls
+    wttr.in / search  stub HTTP server on a thread (WEATHER_URL points at it)
+    SMTP              sink on a thread; the mail queue delivers to it
+    Supabase realtime FakeBroadcaster: an in-memory channel with a fixed round trip
+
+Each concurrency level runs in a fresh interpreter so memory numbers don't
+leak between levels. Run from the repository root:
+
+    python benchmarks/replay.py
+    python benchmarks/replay.py --script session.json --sessions 1,10,100 --turns 20
+
+A script is JSON: {"turns": [{"audio": "turn1.wav", "frame": "frame1.png",
+"text": "...", "tools": [{"name": "get_weather", "args": {"city": "Jakarta"}}]}]}.
+"audio" (or "speech_ms") only sets how long the user speaks; "frame" is
+optional and synthetic frames are used when it is missing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+from urllib.request import urlopen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SCRIPT = {
+    "turns": [
+        {"speech_ms": 1500, "text": "Apa yang ada di depan saya?"},
+        {"speech_ms": 1200, "text": "Bagaimana cuaca di Jakarta?", "tools": [{"name": "get_weather", "args": {"city": "Jakarta"}}]},
+        {"speech_ms": 900, "text": "Nyalakan kamera belakang", "tools": [{"name": "camera_on", "args": {"camera_type": "environment"}}]},
+        {"speech_ms": 1800, "text": "Cari berita terbaru tentang transportasi umum", "tools": [{"name": "search_web", "args": {"query": "berita transportasi umum"}}]},
+        {"speech_ms": 1600, "text": "Kirim email ke adik saya", "tools": [{"name": "send_email", "args": {"to_email": "adik@example.com", "subject": "Halo", "message": "Saya sudah sampai."}}]},
+        {"speech_ms": 1000, "text": "Ini uang berapa?", "tools": [{"name": "recognize_item", "args": {"item_type": "currency"}}]},
+        {"speech_ms": 800, "text": "Matikan kamera", "tools": [{"name": "camera_off", "args": {}}]},
+    ]
+}
+
+WEATHER_BODY = json.dumps({
+    "current_condition": [{
+        "temp_C": "31", "FeelsLikeC": "36", "humidity": "74", "windspeedKmph": "9",
+        "weatherDesc": [{"value": "Partly cloudy"}],
+    }]
+}).encode()
+
+SEARCH_BODY = (
+    "Jakarta is extending its MRT and LRT lines this year. Bus rapid transit routes were "
+    "reorganised to connect with the new stations. Fares remain unchanged for now. "
+) * 8
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def percentile(values, q: int):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+# --- Stand-ins ---------------------------------------------------------------------------
+
+
+def start_stub_http(delay_ms: float) -> ThreadingHTTPServer:
+    """wttr.in and search stand-in; each response is delayed like a real upstream."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay_ms / 1000)
+            url = urlparse(self.path)
+            if url.path.startswith("/weather/"):
+                body, content_type = WEATHER_BODY, "application/json"
+            elif url.path == "/search":
+                query = parse_qs(url.query).get("q", [""])[0]
+                body, content_type = f"{query}: {SEARCH_BODY}".encode(), "text/plain"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Accepts and counts messages; just enough SMTP for smtplib without STARTTLS or AUTH."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.received = 0
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with self.server._lock:
+                    self.server.received += 1
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self.reply("250 ok")
+
+
+class StubSearch:
+    """Stands in for DuckDuckGoSearchRun; blocking, like the real one, so it runs on the search pool."""
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+
+    def run(self, tool_input: str) -> str:
+        with urlopen(f"{self.base_url}/search?q={quote(tool_input)}") as response:
+            return response.read().decode()
+
+
+class FakeChannel:
+    def __init__(self, rtt_ms: float) -> None:
+        self.rtt_ms = rtt_ms
+        self.sent = 0
+
+    async def send_broadcast(self, event: str, payload: dict) -> None:
+        await asyncio.sleep(self.rtt_ms / 1000)
+        self.sent += 1
+
+
+class FakeRealtimeModel:
+    """Replays the scripted tool calls of a turn after a fixed first-token delay."""
+
+    def __init__(self, ttft_ms: float, tts_ms: float, tools: dict) -> None:
+        self.ttft_ms = ttft_ms
+        self.tts_ms = tts_ms
+        self.tools = tools
+
+    async def respond(self, turn: dict, context, trace) -> None:
+        started = time.perf_counter()
+        await asyncio.sleep(self.ttft_ms / 1000)
+        trace.add("llm_first_token", time.perf_counter() - started, start=started)
+        for call in turn.get("tools", []):
+            await self.tools[call["name"]](context, **call.get("args", {}))
+        started = time.perf_counter()
+        await asyncio.sleep(self.tts_ms / 1000)
+        trace.add("tts_first_audio", time.perf_counter() - started, start=started)
+
+
+# --- One concurrency level (child process) -----------------------------------------------
+
+
+def load_script(path):
+    if path is None:
+        return DEFAULT_SCRIPT
+    with open(path) as f:
+        script = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for turn in script["turns"]:
+        for key in ("audio", "frame"):
+            if key in turn and not os.path.isabs(turn[key]):
+                turn[key] = os.path.join(base, turn[key])
+        if "audio" in turn:
+            with wave.open(turn["audio"]) as w:
+                turn["speech_ms"] = w.getnframes() / w.getframerate() * 1000
+    return script
+
+
+def make_frame(rtc, turn: dict, index: int):
+    import cv2
+    import numpy as np
+
+    if "frame" in turn:
+        bgr = cv2.imread(turn["frame"])
+        if bgr is None:
+            raise FileNotFoundError(turn["frame"])
+    else:
+        # A textured 720p scene that shifts a little every turn, so dedup sees real changes
+        rng = np.random.default_rng(index)
+        bgr = cv2.resize(rng.integers(0, 255, (45, 80, 3), dtype=np.uint8), (1280, 720), interpolation=cv2.INTER_CUBIC)
+    bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+    frame = rtc.VideoFrame(bgra.shape[1], bgra.shape[0], rtc.VideoBufferType.BGRA, bgra.tobytes())
+    # Camera tracks arrive as I420, so frame handling is timed on the path live sessions take
+    return frame.convert(rtc.VideoBufferType.I420)
+
+
+async def run_level(args) -> dict:
+    http = start_stub_http(args.upstream_ms)
+    smtp = SmtpSink()
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    workdir = tempfile.mkdtemp(prefix="replay_")
+    os.environ.update({
+        "WEATHER_URL": f"http://127.0.0.1:{http.server_address[1]}/weather",
+        "MAIL_TRANSPORT": "smtp",
+        "GMAIL_USER": "bench@localhost",
+        "MAIL_SMTP_HOST": "127.0.0.1",
+        "MAIL_SMTP_PORT": str(smtp.server_address[1]),
+        "MAIL_SMTP_STARTTLS": "0",
+        "MAIL_SMTP_AUTH": "0",
+        "MAIL_QUEUE_PATH": os.path.join(workdir, "mail_queue.db"),
+        "METRICS_PORT": "0",
+        "SLOW_TURN_LOG": os.path.join(workdir, "turn_traces.jsonl"),
+    })
+    sys.path.insert(0, ROOT)
+
+    # Imported after the environment points every service at the stand-ins
+    from livekit import rtc
+    from livekit.agents.llm import ChatMessage
+
+    import tools
+    from agent import AssistiveAgent
+    from broadcaster import CameraBroadcaster
+    from mailer import get_mail_queue
+    from telemetry import TurnTrace, TurnTracer
+
+    class FakeBroadcaster(CameraBroadcaster):
+        async def _connect(self) -> None:
+            self._channel = FakeChannel(args.realtime_rtt_ms)
+
+    tools._search_engine = StubSearch(f"http://127.0.0.1:{http.server_address[1]}")
+    llm = FakeRealtimeModel(args.ttft_ms, args.tts_ms, {
+        name: getattr(tools, name)
+        for name in ("get_weather", "search_web", "send_email", "camera_on", "camera_off",
+                     "switch_camera", "identify_person", "recognize_item")
+    })
+    script = load_script(args.script)
+    mail_queue = get_mail_queue()
+    mail_queue.start()
+
+    stages = {}
+    first_audio = []
+    broadcasters = []
+    played = [script["turns"][n % len(script["turns"])] for n in range(args.turns)]
+    emails = sum(1 for turn in played for call in turn.get("tools", []) if call["name"] == "send_email")
+
+    async def session(index: int) -> None:
+        agent = AssistiveAgent()
+        broadcaster = FakeBroadcaster()
+        broadcaster.start()
+        broadcasters.append(broadcaster)
+        tracer = TurnTracer(f"replay-{index}")
+        context = types.SimpleNamespace(
+            userdata={"camera_broadcaster": broadcaster, "turn_tracer": tracer},
+            session=types.SimpleNamespace(current_agent=agent),
+        )
+        for turn_number, turn in enumerate(played):
+            agent._latest_frame = make_frame(rtc, turn, index * args.turns + turn_number)
+            if args.pace:
+                await asyncio.sleep(turn.get("speech_ms", 1000) / 1000)
+            trace = tracer.current = TurnTrace()
+            message = ChatMessage(role="user", content=[turn.get("text", "")])
+            with tracer.span("frame_handling"):
+                await agent._attach_frame(message)
+            await llm.respond(turn, context, trace)
+            first_audio.append((time.perf_counter() - trace.origin) * 1000)
+            for span in trace.spans:
+                stages.setdefault(span["name"], []).append(span["duration_ms"])
+        await agent.close_video()
+
+    baseline = rss_bytes()
+    peak = baseline
+    done = asyncio.Event()
+
+    async def sample_memory() -> None:
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, rss_bytes())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_memory())
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(args.child)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    # Background delivery isn't part of a turn; report how long it took to drain
+    drain_started = time.perf_counter()
+    while smtp.received < emails * args.child and time.perf_counter() - drain_started < 30:
+        await asyncio.sleep(0.05)
+    drain_seconds = time.perf_counter() - drain_started
+    for broadcaster in broadcasters:
+        await broadcaster.aclose()
+    await mail_queue.aclose()
+    await tools.close_http_session()
+    http.shutdown()
+    smtp.shutdown()
+
+    turns = args.child * args.turns
+    return {
+        "sessions": args.child,
+        "turns": turns,
+        "seconds": round(elapsed, 2),
+        "turns_per_second": round(turns / elapsed, 1),
+        "first_audio_ms": {"p50": percentile(first_audio, 50), "p95": percentile(first_audio, 95)},
+        "stages_ms": {
+            name: {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+            for name, values in sorted(stages.items())
+        },
+        "rss_per_session_mb": round((peak - baseline) / args.child / 2**20, 2),
+        "rss_peak_mb": round(peak / 2**20, 1),
+        "emails_delivered": smtp.received,
+        "email_drain_seconds": round(drain_seconds, 2),
+        "broadcasts_sent": sum(b._channel.sent for b in broadcasters if b._channel is not None),
+    }
+
+
+# --- Driver ------------------------------------------------------------------------------
+
+
+def print_level(result: dict) -> None:
+    fmt = lambda v: "-" if v is None else f"{v:.0f}"
+    print(
+        f"{result['sessions']:>4} sessions: {result['turns']} turns in {result['seconds']}s "
+        f"({result['turns_per_second']} turns/s), first audio p50 {fmt(result['first_audio_ms']['p50'])} ms "
+        f"p95 {fmt(result['first_audio_ms']['p95'])} ms, {result['rss_per_session_mb']} MB/session "
+        f"(peak RSS {result['rss_peak_mb']} MB)"
+    )
+    for name, p in result["stages_ms"].items():
+        print(f"        {name:<22} p50 {fmt(p['p50']):>6} ms   p95 {fmt(p['p95']):>6} ms")
+    print(
+        f"        emails {result['emails_delivered']} delivered, drained in {result['email_drain_seconds']}s; "
+        f"{result['broadcasts_sent']} camera broadcasts"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--script", help="replay script (JSON); default is a built-in mixed session")
+    parser.add_argument("--sessions", default="1,10,100", help="comma-separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=14, help="turns per session (the script repeats)")
+    parser.add_argument("--pace", action="store_true", help="wait for each turn's speech duration, like a live user")
+    parser.add_argument("--ttft-ms", type=float, default=350)
+    parser.add_argument("--tts-ms", type=float, default=150)
+    parser.add_argument("--upstream-ms", type=float, default=120, help="stub HTTP response delay")
+    parser.add_argument("--realtime-rtt-ms", type=float, default=40, help="fake Supabase broadcast round trip")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_level(args))))
+        return 0
+
+    results = []
+    child_args = [
+        "--turns", str(args.turns),
+        "--ttft-ms", str(args.ttft_ms),
+        "--tts-ms", str(args.tts_ms),
+        "--upstream-ms", str(args.upstream_ms),
+        "--realtime-rtt-ms", str(args.realtime_rtt_ms),
+    ]
+    if args.script:
+        child_args += ["--script", os.path.abspath(args.script)]
+    if args.pace:
+        child_args.append("--pace")
+    for level in (int(n) for n in args.sessions.split(",")):
+        # Fresh interpreter per level so RSS and caches start clean
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *child_args, "--child", str(level)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{level} sessions failed:\n{proc.stderr[-2000:]}", file=sys.stderr)
+            return 1
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        if not args.json:
+            print_level(result)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
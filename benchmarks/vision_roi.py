@@ -0,0 +1,177 @@
+"""
+Offline benchmark for per-turn resolution and region-of-interest cropping.
+
+Encodes each saved frame twice: the old way (whole frame at VISION_MAX_EDGE)
+and through regions.RegionFinder with the turn's focus. It compares bytes,
+pixels, estimated image tokens and encode latency. Run from the repository
+root:
+
+    python benchmarks/vision_roi.py
+    python benchmarks/vision_roi.py --frames saved_frames/ --questions questions.json --repeat 10
+
+--frames is a directory of .png/.jpg camera frames, for example collected
+with VISION_DEBUG_DUMP_PATH. --questions maps a file name to the user's
+question for that frame; the question picks the focus, just like in a
+live turn. Frames without a question use --focus. Without --frames, a few
+synthetic frames are used (a label, a sign on a busy background and a plain
+scene).
+
+Token counts are estimates from the providers' published image tiling rules
+and are not billed numbers.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from livekit import rtc  # noqa: E402
+
+from regions import RegionFinder, turn_focus  # noqa: E402
+from vision import EncoderConfig, FrameEncoder  # noqa: E402
+
+
+def openai_tokens(width: int, height: int) -> int:
+    """High-detail estimate: fit in 2048, shortest side to 768, then 170 per 512px tile plus 85."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def gemini_tokens(width: int, height: int) -> int:
+    """258 for images up to 384px on both sides, otherwise 258 per 768px tile."""
+    if width <= 384 and height <= 384:
+        return 258
+    return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+
+
+def synthetic_frames() -> list:
+    rng = np.random.default_rng(7)
+    background = cv2.resize(rng.integers(40, 200, (36, 64, 3), dtype=np.uint8), (1280, 720), interpolation=cv2.INTER_CUBIC)
+
+    label = background.copy()
+    cv2.rectangle(label, (760, 300), (1180, 560), (245, 245, 245), -1)
+    for i, line in enumerate(("PARACETAMOL 500mg", "2 biji setiap 6 jam", "Tamat: 03/2027")):
+        cv2.putText(label, line, (780, 360 + i * 70), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2, cv2.LINE_AA)
+
+    sign = background.copy()
+    cv2.rectangle(sign, (300, 80), (980, 220), (30, 110, 30), -1)
+    cv2.putText(sign, "KELUAR / EXIT", (360, 170), cv2.FONT_HERSHEY_DUPLEX, 2.0, (255, 255, 255), 3, cv2.LINE_AA)
+
+    return [
+        ("label.png", label, "Tolong baca label ubat ini"),
+        ("sign.png", sign, "Apa yang tertulis di papan itu?"),
+        ("scene.png", background, "Apa yang ada di depan saya?"),
+    ]
+
+
+def load_frames(directory: str, questions: dict, default_question: str) -> list:
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        bgr = cv2.imread(os.path.join(directory, name))
+        if bgr is None:
+            print(f"skipping unreadable {name}", file=sys.stderr)
+            continue
+        frames.append((name, bgr, questions.get(name, default_question)))
+    return frames
+
+
+def to_video_frame(bgr: np.ndarray) -> rtc.VideoFrame:
+    bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+    frame = rtc.VideoFrame(bgra.shape[1], bgra.shape[0], rtc.VideoBufferType.BGRA, bgra.tobytes())
+    # Camera tracks arrive as I420
+    return frame.convert(rtc.VideoBufferType.I420)
+
+
+def measure(encoder: FrameEncoder, frame: rtc.VideoFrame, focus, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encoded = encoder._encode_sync(frame, None, focus)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "bytes": len(encoded.data),
+        "width": encoded.width,
+        "height": encoded.height,
+        "openai_tokens": openai_tokens(encoded.width, encoded.height),
+        "gemini_tokens": gemini_tokens(encoded.width, encoded.height),
+        "ms": statistics.median(timings),
+        "region": encoded.region.to_dict() if encoded.region is not None else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", help="directory of saved frames; default is synthetic frames")
+    parser.add_argument("--questions", help="JSON object: frame file name -> user question")
+    parser.add_argument("--focus", default="auto", help="question used for frames without one (or a focus name)")
+    parser.add_argument("--repeat", type=int, default=5, help="encodes per frame; latency is the median")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args()
+
+    if args.frames:
+        questions = {}
+        if args.questions:
+            with open(args.questions, encoding="utf-8") as f:
+                questions = json.load(f)
+        frames = load_frames(args.frames, questions, args.focus)
+    else:
+        frames = synthetic_frames()
+    if not frames:
+        print("no frames found", file=sys.stderr)
+        return 1
+
+    config = EncoderConfig.from_env()
+    baseline = FrameEncoder(config)
+    focused = FrameEncoder(config, region_finder=RegionFinder())
+
+    results = []
+    for name, bgr, question in frames:
+        frame = to_video_frame(bgr)
+        focus = question if question in ("text", "face", "scene", "auto") else turn_focus(question)
+        # Warm up scratch buffers and the text detector outside the timings
+        focused._encode_sync(frame, None, focus)
+        results.append({
+            "frame": name,
+            "focus": focus,
+            "baseline": measure(baseline, frame, None, args.repeat),
+            "roi": measure(focused, frame, focus, args.repeat),
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    for r in results:
+        b, o = r["baseline"], r["roi"]
+        region = o["region"]["kind"] if o["region"] else "whole frame"
+        print(
+            f"{r['frame']:<24} {r['focus']:<6} {region:<12} "
+            f"{b['width']}x{b['height']} {b['bytes'] / 1024:6.1f} KB {b['ms']:5.1f} ms -> "
+            f"{o['width']}x{o['height']} {o['bytes'] / 1024:6.1f} KB {o['ms']:5.1f} ms   "
+            f"tokens openai {b['openai_tokens']}->{o['openai_tokens']}, gemini {b['gemini_tokens']}->{o['gemini_tokens']}"
+        )
+    total = lambda side, key: sum(r[side][key] for r in results)
+    saved = lambda key: 100 * (1 - total("roi", key) / total("baseline", key))
+    print(
+        f"\n{len(results)} frames: bytes -{saved('bytes'):.0f}%, openai tokens -{saved('openai_tokens'):.0f}%, "
+        f"gemini tokens -{saved('gemini_tokens'):.0f}%, median encode "
+        f"{statistics.median(r['baseline']['ms'] for r in results):.1f} -> "
+        f"{statistics.median(r['roi']['ms'] for r in results):.1f} ms"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
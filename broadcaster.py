@@ -0,0 +1,156 @@
+from dotenv import load_dotenv
+import asyncio
+import importlib
+import logging
+import os
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_NAME = "visora_agent"
+CAMERA_EVENT = "camera_states"
+
+
+class CameraBroadcaster:
+    """
+    Long-lived Supabase realtime channel for camera control events.
+
+    One broadcaster lives for the whole session. Tools only enqueue events
+    (non-blocking), while a background task owns the async client and the
+    subscribed channel, sends queued events in order and reconnects with
+    backoff whenever a send fails.
+    """
+
+    def __init__(
+        self,
+        channel_name: str = CHANNEL_NAME,
+        max_queue: int = 32,
+        max_attempts: int = 5,
+        max_backoff: float = 10.0,
+    ) -> None:
+        self._channel_name = channel_name
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._max_attempts = max_attempts
+        self._max_backoff = max_backoff
+        self._client: Optional["AsyncClient"] = None
+        self._channel = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: Dict[str, List[Callable[[dict], None]]] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._channel is not None
+
+    def start(self) -> None:
+        """Start the sender task; the connection is opened right away so the first command is warm."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="camera_broadcaster")
+
+    def publish(self, payload: dict) -> bool:
+        """
+        Queue an event for broadcast without waiting on the network.
+        When the queue is full the oldest pending event is dropped, since only
+        the latest camera command matters to the client.
+        """
+        dropped = False
+        if self._queue.full():
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                dropped = True
+            except asyncio.QueueEmpty:
+                pass
+        self._queue.put_nowait(payload)
+        if dropped:
+            logger.warning("Camera broadcast queue full, dropped oldest event")
+        return not dropped
+
+    def add_listener(self, event: str, callback: Callable[[dict], None]) -> None:
+        """Receive broadcasts of event from clients; kept across reconnects."""
+        self._listeners.setdefault(event, []).append(callback)
+        if self._channel is not None:
+            # Already subscribed: _connect only binds listeners on the channels it creates
+            self._channel.on_broadcast(event, callback)
+
+    async def aclose(self, flush_timeout: float = 2.0) -> None:
+        """Flush pending events (bounded by flush_timeout), then close the channel and client."""
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=flush_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Camera broadcaster closed with {self._queue.qsize()} pending events")
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self._disconnect()
+
+    async def _connect(self) -> None:
+        # supabase pulls in httpx/postgrest/realtime; import it off the loop, once a room needs the channel
+        supabase = await asyncio.to_thread(importlib.import_module, "supabase")
+
+        self._client = await supabase.acreate_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+        channel = self._client.channel(self._channel_name)
+        bound = {event: list(callbacks) for event, callbacks in self._listeners.items()}
+        for event, callbacks in bound.items():
+            for callback in callbacks:
+                channel.on_broadcast(event, callback)
+        await channel.subscribe()
+        # Listeners added while subscribing saw no channel yet
+        for event, callbacks in self._listeners.items():
+            for callback in callbacks:
+                if callback not in bound.get(event, ()):
+                    channel.on_broadcast(event, callback)
+        self._channel = channel
+        logger.info(f"Camera broadcaster subscribed to '{self._channel_name}'")
+
+    async def _disconnect(self) -> None:
+        channel, client = self._channel, self._client
+        self._channel = None
+        self._client = None
+        if channel is not None and client is not None:
+            try:
+                await client.remove_channel(channel)
+            except Exception as e:
+                logger.debug(f"Error removing camera channel: {e}")
+
+    async def _send(self, payload: dict) -> None:
+        backoff = 0.5
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                if self._channel is None:
+                    await self._connect()
+                await self._channel.send_broadcast(CAMERA_EVENT, payload)
+                logger.info(f"Broadcast camera event: {payload}")
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Camera broadcast attempt {attempt} failed: {e}")
+                await self._disconnect()
+                if attempt < self._max_attempts:
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self._max_backoff)
+        logger.error(f"Dropping camera event after {self._max_attempts} attempts: {payload.get('event_id')}")
+
+    async def _run(self) -> None:
+        try:
+            await self._connect()
+        except Exception as e:
+            # Not fatal: _send reconnects on the first event
+            logger.warning(f"Initial camera channel connect failed: {e}")
+            await self._disconnect()
+
+        while True:
+            payload = await self._queue.get()
+            try:
+                await self._send(payload)
+            finally:
+                self._queue.task_done()
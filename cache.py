@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Async TTL + LRU cache for tool lookups.
+
+    Concurrent misses for the same key share one in-flight fetch, and when a
+    fetch fails an expired value no older than stale_ttl is served instead.
+    Meant for a single event loop; it is not thread-safe.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 600.0, stale_ttl: float = 3600.0, name: str = "cache") -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Fresh cached value for key, or None."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(key, fetch), name=f"{self.name}_fetch")
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_fetch_done(key, t))
+        # shield: one caller being cancelled must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def _on_fetch_done(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except Exception as e:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.stale_ttl:
+                self.stale_hits += 1
+                logger.warning(f"{self.name}: fetch failed for {key!r} ({e}), serving stale value")
+                return entry[1]
+            raise
+        self.set(key, value)
+        return value
@@ -0,0 +1,203 @@
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from broadcaster import CameraBroadcaster
+from db import db_enabled, get_pool
+from identity import SessionIdentity
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Sent by the client on the realtime channel once it has applied a camera event
+CAMERA_ACK_EVENT = "camera_ack"
+
+_LOAD_SQL = """
+SELECT is_enabled, camera_type FROM camera_states WHERE session_id = $1::uuid
+"""
+
+_UPSERT_SQL = """
+INSERT INTO camera_states (session_id, is_enabled, camera_type, updated_at)
+VALUES ($1::uuid, $2, $3, $4)
+ON CONFLICT (session_id) DO UPDATE
+SET is_enabled = EXCLUDED.is_enabled, camera_type = EXCLUDED.camera_type, updated_at = EXCLUDED.updated_at
+"""
+
+
+@dataclass
+class CameraState:
+    is_enabled: bool = False
+    # "user" is the front camera, "environment" the back camera
+    camera_type: str = "user"
+    # Event the client hasn't acknowledged yet, if any
+    pending_event_id: Optional[str] = None
+    updated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class CameraStateStore:
+    """
+    The agent's authoritative view of one session's camera.
+
+    Tools read and change it in memory, so they answer without a database
+    round trip, and commands that wouldn't change anything are never
+    broadcast. Changes go to the client over the realtime channel; the
+    client's camera_ack (and the video track appearing or going away)
+    confirm or correct the state. The row in camera_states follows with one
+    coalesced upsert per flush_delay, however many toggles happened, and is
+    read back when a session for the same room starts again.
+    """
+
+    def __init__(
+        self,
+        identity: SessionIdentity,
+        broadcaster: CameraBroadcaster,
+        flush_delay: Optional[float] = None,
+    ) -> None:
+        self.identity = identity
+        self.state = CameraState()
+        self.suppressed = 0
+        self.enabled = db_enabled()
+        self._broadcaster = broadcaster
+        self._flush_delay = flush_delay if flush_delay is not None else float(os.getenv("CAMERA_STATE_FLUSH_DELAY", "0.5"))
+        # A command whose ack hasn't arrived by then no longer holds back track events
+        self._ack_timeout = float(os.getenv("CAMERA_ACK_TIMEOUT", "5"))
+        self._pending_since = 0.0
+        self._dirty = False
+        self._revision = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        broadcaster.add_listener(CAMERA_ACK_EVENT, self._on_ack)
+
+    async def load(self) -> None:
+        """Restore the last known state for this session, e.g. after a reconnect."""
+        if not self.enabled:
+            return
+        revision = self._revision
+        try:
+            pool = await get_pool()
+            row = await pool.fetchrow(_LOAD_SQL, self.identity.session_id)
+        except Exception as e:
+            logger.warning(f"Failed to load camera state for {self.identity.session_id}: {e}")
+            return
+        # Anything that happened during the read is newer than the stored row
+        if row is not None and revision == self._revision:
+            self.state.is_enabled = row["is_enabled"]
+            self.state.camera_type = row["camera_type"] or "user"
+            logger.info(f"Restored camera state: enabled={self.state.is_enabled}, camera={self.state.camera_type}")
+
+    def turn_on(self, camera_type: str) -> bool:
+        """Returns False (and sends nothing) if that camera is already on."""
+        if self.state.is_enabled and self.state.camera_type == camera_type:
+            self.suppressed += 1
+            return False
+        self._command("on", True, camera_type)
+        return True
+
+    def turn_off(self) -> bool:
+        """Returns False (and sends nothing) if the camera is already off."""
+        if not self.state.is_enabled:
+            self.suppressed += 1
+            return False
+        self._command("off", False, self.state.camera_type)
+        return True
+
+    def switch(self) -> str:
+        """Switch to the other camera (turning it on if needed); returns the new camera type."""
+        new_camera_type = "environment" if self.state.camera_type == "user" else "user"
+        self._command("switch", True, new_camera_type, previous=self.state.camera_type)
+        return new_camera_type
+
+    def observe_track(self, is_enabled: bool) -> None:
+        """The camera's video track was published or removed: that is what the client is really doing."""
+        state = self.state
+        if state.pending_event_id is not None:
+            if state.is_enabled == is_enabled:
+                # The track confirms the command; its ack is no longer needed
+                state.pending_event_id = None
+                return
+            if time.monotonic() - self._pending_since < self._ack_timeout:
+                # Likely from before the command reached the client
+                return
+            logger.info(f"Camera event {state.pending_event_id} was never acknowledged; following the video track")
+            state.pending_event_id = None
+        if state.is_enabled != is_enabled:
+            state.is_enabled = is_enabled
+            self._mark_dirty()
+
+    def _command(self, action: str, is_enabled: bool, camera_type: str, previous: Optional[str] = None) -> None:
+        event_id = str(uuid.uuid4())[:8]
+        payload = {
+            "action": action,
+            "session_id": self.identity.session_id,
+            "camera_type": previous or camera_type,
+            "timestamp": datetime.now().isoformat(),
+            "event_id": event_id,
+            "is_enabled": is_enabled,
+        }
+        if action == "switch":
+            payload["new_camera_type"] = camera_type
+        self.state.is_enabled = is_enabled
+        self.state.camera_type = camera_type
+        self.state.pending_event_id = event_id
+        self._pending_since = time.monotonic()
+        self._broadcaster.publish(payload)
+        self._mark_dirty()
+
+    def _on_ack(self, message: dict) -> None:
+        # Realtime delivers {"event": ..., "payload": {...}}; the channel is shared, so filter by session
+        ack = message.get("payload", message)
+        if ack.get("session_id") != self.identity.session_id:
+            return
+        pending = self.state.pending_event_id
+        if pending is not None and ack.get("event_id") != pending:
+            # Ack for an older command; the newer one is still on its way
+            return
+        self.state.pending_event_id = None
+        # The client has the final say, e.g. when camera permission was denied
+        if "is_enabled" in ack:
+            self.state.is_enabled = bool(ack["is_enabled"])
+        if ack.get("camera_type") in ("user", "environment"):
+            self.state.camera_type = ack["camera_type"]
+        self._mark_dirty()
+
+    def _mark_dirty(self) -> None:
+        self._revision += 1
+        self.state.updated_at = datetime.now(timezone.utc)
+        if not self.enabled:
+            return
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(), name="camera_state_flush")
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._flush_delay)
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        self._dirty = False
+        state = self.state
+        try:
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                # camera_states.session_id references sessions(id)
+                await self.identity.ensure(conn)
+                await conn.execute(_UPSERT_SQL, self.identity.session_id, state.is_enabled, state.camera_type, state.updated_at)
+        except Exception as e:
+            # The in-memory state stays authoritative; the next change retries
+            self._dirty = True
+            logger.warning(f"Failed to persist camera state for {self.identity.session_id}: {e}")
+
+    async def aclose(self) -> None:
+        if self._flush_task is not None:
+            # At most flush_delay away; cancelling it mid-write could lose the last change
+            await self._flush_task
+        await self.flush()
+        logger.info(f"Camera state closed: {self.suppressed} redundant commands suppressed")
@@ -0,0 +1,53 @@
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import asyncpg
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Direct Postgres connection string (Supabase: Project Settings > Database)
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+_pool: Optional["asyncpg.Pool"] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+def db_enabled() -> bool:
+    return bool(DATABASE_URL)
+
+
+async def get_pool() -> "asyncpg.Pool":
+    """Worker-wide asyncpg pool, created on first use."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            import asyncpg
+
+            _pool = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=1,
+                max_size=int(os.getenv("DATABASE_POOL_SIZE", "5")),
+                # Supabase's pooler (pgbouncer) doesn't support prepared statements
+                statement_cache_size=0,
+            )
+            logger.info("Opened Postgres connection pool")
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
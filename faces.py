@@ -0,0 +1,187 @@
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+import cv2
+import numpy as np
+from livekit import rtc
+
+from vision import frame_to_bgr, run_in_vision_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# OpenCV Zoo models: https://github.com/opencv/opencv_zoo (face_detection_yunet, face_recognition_sface)
+DETECTOR_MODEL = os.getenv("FACE_DETECTOR_MODEL", "models/face_detection_yunet_2023mar.onnx")
+RECOGNIZER_MODEL = os.getenv("FACE_RECOGNIZER_MODEL", "models/face_recognition_sface_2021dec.onnx")
+GALLERY_DIR = os.getenv("FACE_GALLERY_DIR", "faces")
+# SFace cosine similarity above which two faces are the same person
+MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.363"))
+MAX_FACES = int(os.getenv("FACE_MAX_FACES", "5"))
+DETECT_MAX_EDGE = 640
+
+
+@dataclass
+class FaceMatch:
+    name: Optional[str]
+    score: float
+    # "left", "center" or "right" from the camera's point of view
+    position: str
+    # Face width relative to the frame, a rough proxy for distance
+    size: float
+
+
+class FaceEngine:
+    """
+    On-device face detection (YuNet) and embedding (SFace) with a local gallery.
+
+    The gallery is an (N, 128) float32 matrix of L2-normalized embeddings in
+    embeddings.npy, memory-mapped read-only, with names.json alongside it.
+    Matching every detected face is a single matrix product.
+    """
+
+    def __init__(self, detector_model: str = DETECTOR_MODEL, recognizer_model: str = RECOGNIZER_MODEL,
+                 gallery_dir: str = GALLERY_DIR) -> None:
+        self._detector = cv2.FaceDetectorYN.create(detector_model, "", (320, 320), 0.8, 0.3)
+        self._recognizer = cv2.FaceRecognizerSF.create(recognizer_model, "")
+        # The detector's input size is mutable state, so inference is serialized
+        self._lock = threading.Lock()
+        self._gallery_dir = gallery_dir
+        self._embeddings_path = os.path.join(gallery_dir, "embeddings.npy")
+        self._names_path = os.path.join(gallery_dir, "names.json")
+        self.names: List[str] = []
+        self.embeddings = np.zeros((0, 128), dtype=np.float32)
+        self._load_gallery()
+
+    def _load_gallery(self) -> None:
+        if not os.path.exists(self._embeddings_path):
+            return
+        with open(self._names_path, encoding="utf-8") as f:
+            self.names = json.load(f)
+        self.embeddings = np.load(self._embeddings_path, mmap_mode="r")
+        logger.info(f"Loaded face gallery with {len(self.names)} embeddings")
+
+    def _detect(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        self._detector.setInputSize((width, height))
+        _, faces = self._detector.detect(image)
+        return faces if faces is not None else np.zeros((0, 15), dtype=np.float32)
+
+    def _embed(self, image: np.ndarray, faces: np.ndarray) -> np.ndarray:
+        features = np.vstack([self._recognizer.feature(self._recognizer.alignCrop(image, face)) for face in faces])
+        features /= np.linalg.norm(features, axis=1, keepdims=True)
+        return features.astype(np.float32)
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """(x, y, w, h) boxes of the faces in a BGR image, largest first."""
+        with self._lock:
+            faces = self._detect(image)
+        return faces[np.argsort(-faces[:, 2])][:MAX_FACES, :4]
+
+    def identify(self, image: np.ndarray) -> List[FaceMatch]:
+        """Detect and identify every face in a BGR image, largest first."""
+        with self._lock:
+            faces = self._detect(image)
+            if len(faces) == 0:
+                return []
+            faces = faces[np.argsort(-faces[:, 2])][:MAX_FACES]
+            features = self._embed(image, faces)
+
+        if len(self.names):
+            # (faces, 128) @ (128, gallery): cosine similarity of every face to every enrolled embedding
+            scores = features @ np.asarray(self.embeddings).T
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(faces)), best]
+        else:
+            best = np.zeros(len(faces), dtype=int)
+            best_scores = np.zeros(len(faces), dtype=np.float32)
+
+        width = image.shape[1]
+        matches = []
+        for face, index, score in zip(faces, best.tolist(), best_scores.tolist()):
+            center = (face[0] + face[2] / 2) / width
+            position = "left" if center < 0.35 else "right" if center > 0.65 else "center"
+            name = self.names[index] if score >= MATCH_THRESHOLD else None
+            matches.append(FaceMatch(name=name, score=score, position=position, size=float(face[2] / width)))
+        return matches
+
+    def enroll(self, name: str, image: np.ndarray) -> bool:
+        """Add the largest face in a BGR image to the gallery under name. Returns False if no face was found."""
+        with self._lock:
+            faces = self._detect(image)
+            if len(faces) == 0:
+                return False
+            largest = faces[np.argmax(faces[:, 2])][None, :]
+            feature = self._embed(image, largest)
+
+        embeddings = np.vstack([np.asarray(self.embeddings), feature])
+        names = self.names + [name]
+        os.makedirs(self._gallery_dir, exist_ok=True)
+        # Write-then-rename so a concurrent reader never maps a half-written file
+        tmp_embeddings = f"{self._embeddings_path}.tmp.npy"
+        np.save(tmp_embeddings, embeddings)
+        with open(f"{self._names_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(names, f)
+        os.replace(tmp_embeddings, self._embeddings_path)
+        os.replace(f"{self._names_path}.tmp", self._names_path)
+        self._load_gallery()
+        return True
+
+    async def identify_frame(self, frame: rtc.VideoFrame) -> List[FaceMatch]:
+        return await run_in_vision_pool(lambda: self.identify(frame_to_bgr(frame, DETECT_MAX_EDGE)))
+
+
+_engine: Optional[FaceEngine] = None
+_models_missing = False
+
+
+def get_face_engine() -> Optional[FaceEngine]:
+    """The worker-wide face engine, or None when the models aren't installed."""
+    global _engine, _models_missing
+    if _engine is None and not _models_missing:
+        if not (os.path.exists(DETECTOR_MODEL) and os.path.exists(RECOGNIZER_MODEL)):
+            logger.warning(f"Face models not found ({DETECTOR_MODEL}, {RECOGNIZER_MODEL}), face recognition disabled")
+            _models_missing = True
+            return None
+        _engine = FaceEngine()
+    return _engine
+
+
+def describe_matches(matches: List[FaceMatch]) -> str:
+    """Short spoken summary of identified faces."""
+    if not matches:
+        return "I don't see anyone's face in front of you right now."
+    side = {"left": "on your left", "center": "in front of you", "right": "on your right"}
+    parts = []
+    for match in matches:
+        who = match.name if match.name else "someone I don't recognize"
+        parts.append(f"{who} {side[match.position]}")
+    if len(parts) == 1:
+        return f"I can see {parts[0]}."
+    return f"I can see {len(parts)} people: " + ", ".join(parts[:-1]) + f", and {parts[-1]}."
+
+
+if __name__ == "__main__":
+    # Enroll a person from a photo: python faces.py enroll "Farhan" path/to/photo.jpg
+    if len(sys.argv) != 4 or sys.argv[1] != "enroll":
+        print("Usage: python faces.py enroll <name> <image_path>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO)
+    engine = get_face_engine()
+    if engine is None:
+        sys.exit(1)
+    photo = cv2.imread(sys.argv[3])
+    if photo is None:
+        print(f"Can't read image {sys.argv[3]}")
+        sys.exit(1)
+    if engine.enroll(sys.argv[2], photo):
+        print(f"Added {sys.argv[2]} ({len(engine.names)} embeddings in gallery)")
+    else:
+        print(f"No face found in {sys.argv[3]}")
+        sys.exit(1)
@@ -0,0 +1,200 @@
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from db import db_enabled, get_pool
+from identity import SessionIdentity, session_id_for_room
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Single thread so spill appends and replays never interleave
+_spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history_spill")
+
+# One multi-row statement per flush; arrays keep it a single round-trip
+_INSERT_SQL = """
+INSERT INTO conversation_history (session_id, message_type, content, metadata, created_at)
+SELECT $1::uuid, t.message_type, t.content, t.metadata::jsonb, t.created_at
+FROM unnest($2::text[], $3::text[], $4::text[], $5::timestamptz[])
+    AS t(message_type, content, metadata, created_at)
+"""
+
+
+class ConversationRecorder:
+    """
+    Write-behind recorder for conversation_history.
+
+    record() only appends to an in-memory buffer, so a spoken turn never waits
+    on the database. A background task flushes the buffer in one multi-row
+    insert when batch_size rows are pending or every flush_interval seconds.
+    While the database is unreachable rows stay buffered up to max_backlog;
+    beyond that the oldest rows spill to a per-session JSONL file, which is
+    replayed once inserts succeed again.
+    """
+
+    def __init__(
+        self,
+        identity: SessionIdentity,
+        batch_size: int = 20,
+        flush_interval: float = 5.0,
+        max_backlog: int = 500,
+        spill_dir: Optional[str] = None,
+        close_timeout: float = 10.0,
+    ) -> None:
+        self.identity = identity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.close_timeout = close_timeout
+        self.enabled = db_enabled()
+        self.written = 0
+        self.spilled = 0
+        spill_dir = spill_dir or os.getenv("HISTORY_SPILL_DIR", "history_spill")
+        # Keyed by room, which is stable even if the session id is only resolved later
+        self._spill_path = os.path.join(spill_dir, f"{session_id_for_room(identity.room_name)}.jsonl")
+        self._buffer: deque = deque()
+        self._spill_future: Optional[asyncio.Future] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        if not self.enabled:
+            logger.info("DATABASE_URL not set, conversation history will not be persisted")
+            return
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="history_recorder")
+
+    def record(self, message_type: str, content: str, metadata: Optional[dict] = None) -> None:
+        """Buffer one turn. Never blocks."""
+        if not self.enabled or not content:
+            return
+        self._buffer.append(
+            (message_type, content, json.dumps(metadata) if metadata else None, datetime.now(timezone.utc))
+        )
+        if len(self._buffer) > self.max_backlog:
+            overflow = [self._buffer.popleft() for _ in range(len(self._buffer) - self.max_backlog)]
+            self._spill(overflow)
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def aclose(self) -> None:
+        """Final flush; whatever can't be written is spilled to disk."""
+        if self._task is not None:
+            # Let an insert that's already running finish: cancelling it mid-statement leaves
+            # its rows in the buffer, and they'd be spilled and replayed after being written
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=self.close_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Conversation history flush still running after {self.close_timeout}s, cancelled")
+            self._task = None
+        if self.enabled and self._buffer:
+            if not await self.flush():
+                self._spill(list(self._buffer))
+                self._buffer.clear()
+        if self._spill_future is not None:
+            await self._spill_future
+        logger.info(f"Conversation history: {self.written} rows written, {self.spilled} spilled to disk")
+
+    async def flush(self) -> bool:
+        """Write everything buffered. Returns False (rows kept) if the database is unavailable."""
+        while self._buffer:
+            batch = [self._buffer[i] for i in range(min(self.batch_size * 5, len(self._buffer)))]
+            try:
+                await self._insert(batch)
+            except Exception as e:
+                logger.warning(f"Conversation history flush failed, {len(self._buffer)} rows pending: {e}")
+                return False
+            for _ in batch:
+                self._buffer.popleft()
+        if os.path.exists(self._spill_path):
+            await self._replay_spill()
+        return True
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                # aclose() does the final flush
+                return
+            await self.flush()
+
+    async def _insert(self, rows: List[tuple]) -> None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            # conversation_history.session_id references sessions(id)
+            await self.identity.ensure(conn)
+            message_types, contents, metadata, created_at = zip(*rows)
+            await conn.execute(_INSERT_SQL, self.identity.session_id, message_types, contents, metadata, created_at)
+        self.written += len(rows)
+
+    def _spill(self, rows: List[tuple], count: bool = True) -> None:
+        if count:
+            self.spilled += len(rows)
+        lines = "".join(
+            json.dumps({"message_type": t, "content": c, "metadata": m, "created_at": ts.isoformat()}) + "\n"
+            for t, c, m, ts in rows
+        )
+        loop = asyncio.get_running_loop()
+        self._spill_future = loop.run_in_executor(_spill_executor, _append_file, self._spill_path, lines)
+
+    async def _replay_spill(self) -> None:
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(_spill_executor, _take_file, self._spill_path)
+        if not rows:
+            return
+        for i in range(0, len(rows), self.batch_size * 5):
+            chunk = rows[i:i + self.batch_size * 5]
+            try:
+                await self._insert(chunk)
+            except Exception as e:
+                logger.warning(f"Replaying spilled history failed, keeping {len(rows) - i} rows on disk: {e}")
+                self._spill(rows[i:], count=False)
+                return
+        logger.info(f"Replayed {len(rows)} spilled conversation rows")
+
+
+def _append_file(path: str, data: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(data)
+
+
+def _take_file(path: str) -> List[tuple]:
+    """Read and remove a spill file; rename first so concurrent appends start a new file."""
+    claimed = f"{path}.replay"
+    try:
+        os.replace(path, claimed)
+    except FileNotFoundError:
+        return []
+    rows = []
+    with open(claimed, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            rows.append((
+                row["message_type"],
+                row["content"],
+                row["metadata"],
+                datetime.fromisoformat(row["created_at"]),
+            ))
+    os.remove(claimed)
+    return rows
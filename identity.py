@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import uuid
+from functools import lru_cache
+
+from db import db_enabled, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Session start waits on resolve; past this the deterministic room id is used and the greeting goes ahead
+RESOLVE_TIMEOUT = float(os.getenv("SESSION_RESOLVE_TIMEOUT", "2"))
+
+# One round trip: creates the row for a new room, or reactivates it and returns its id
+_UPSERT_SESSION_SQL = """
+INSERT INTO sessions (id, user_id, session_token)
+VALUES ($1::uuid, $2, $3)
+ON CONFLICT (session_token) DO UPDATE SET updated_at = NOW(), is_active = true
+RETURNING id
+"""
+
+_DEACTIVATE_SESSION_SQL = """
+UPDATE sessions SET is_active = false, updated_at = NOW() WHERE id = $1::uuid
+"""
+
+
+@lru_cache(maxsize=1024)
+def session_id_for_room(room_name: str) -> str:
+    """Deterministic id for a room, used until (or unless) the sessions row says otherwise."""
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, room_name))
+
+
+class SessionIdentity:
+    """
+    Who a session is, resolved once per job and shared through userdata.
+
+    session_id is the id of the room's sessions row. If the database is
+    unreachable at resolve time the deterministic room id is used and the
+    row is created by the first writer that calls ensure(). The same
+    fallback applies when the lookup takes longer than RESOLVE_TIMEOUT, so
+    a slow or unreachable database never delays the session's first words.
+    """
+
+    def __init__(self, room_name: str, user_id: str = "anonymous") -> None:
+        self.room_name = room_name
+        self.session_token = room_name
+        self.user_id = user_id
+        self.session_id = session_id_for_room(room_name)
+        self.persisted = False
+
+    async def resolve(self) -> "SessionIdentity":
+        if not db_enabled():
+            return self
+        try:
+            await asyncio.wait_for(self._resolve(), timeout=RESOLVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Resolving session for room '{self.room_name}' took over {RESOLVE_TIMEOUT:.1f}s, using {self.session_id}"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to resolve session for room '{self.room_name}', using {self.session_id}: {e}")
+        return self
+
+    async def _resolve(self) -> None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            await self.ensure(conn)
+
+    async def ensure(self, conn) -> None:
+        """Make sure the sessions row exists; a no-op after the first success."""
+        if self.persisted:
+            return
+        self.session_id = str(await conn.fetchval(_UPSERT_SESSION_SQL, self.session_id, self.user_id, self.session_token))
+        self.persisted = True
+        logger.info(f"Session {self.session_id} for room '{self.room_name}'")
+
+    async def deactivate(self) -> None:
+        if not self.persisted:
+            return
+        try:
+            pool = await get_pool()
+            await pool.execute(_DEACTIVATE_SESSION_SQL, self.session_id)
+        except Exception as e:
+            logger.warning(f"Failed to mark session {self.session_id} inactive: {e}")
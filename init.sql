@@ -11,7 +11,7 @@ CREATE TABLE sessions (
 -- Camera states table for real-time camera control
 CREATE TABLE camera_states (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
-    session_id UUID REFERENCES sessions(id) ON DELETE CASCADE,
+    session_id UUID UNIQUE REFERENCES sessions(id) ON DELETE CASCADE, -- one row per session, upserted by the agent
     is_enabled BOOLEAN DEFAULT false,
     camera_type TEXT DEFAULT 'user', -- 'user' for front camera, 'environment' for back camera
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
@@ -37,11 +37,25 @@ CREATE TABLE user_preferences (
     UNIQUE(session_id, preference_key)
 );
 
+-- Long-term conversation memory: embedded turns and scene descriptions (pgvector)
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE memory_embeddings (
+    id BIGSERIAL PRIMARY KEY,
+    owner TEXT NOT NULL, -- user id, or the room name for anonymous users
+    session_id UUID REFERENCES sessions(id) ON DELETE SET NULL,
+    kind TEXT NOT NULL, -- 'user', 'assistant' or 'vision'
+    content TEXT NOT NULL,
+    embedding vector(768) NOT NULL, -- must match MEMORY_DIM
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Enable Row Level Security
 ALTER TABLE sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE camera_states ENABLE ROW LEVEL SECURITY;
 ALTER TABLE conversation_history ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_preferences ENABLE ROW LEVEL SECURITY;
+ALTER TABLE memory_embeddings ENABLE ROW LEVEL SECURITY;
 
 -- Create policies for sessions table
 CREATE POLICY "Users can manage their own sessions" ON sessions
@@ -71,12 +85,17 @@ CREATE POLICY "Users can manage their preferences" ON user_preferences
         )
     );
 
+-- Create policies for memory_embeddings table
+CREATE POLICY "Users can access their memories" ON memory_embeddings
+    FOR ALL USING (owner = auth.uid()::text);
+
 -- Create indexes for better performance
 CREATE INDEX idx_sessions_user_id ON sessions(user_id);
 CREATE INDEX idx_sessions_token ON sessions(session_token);
-CREATE INDEX idx_camera_states_session_id ON camera_states(session_id);
 CREATE INDEX idx_conversation_history_session_id ON conversation_history(session_id);
 CREATE INDEX idx_user_preferences_session_id ON user_preferences(session_id);
+CREATE INDEX idx_memory_embeddings_owner ON memory_embeddings(owner, created_at);
+CREATE INDEX idx_memory_embeddings_embedding ON memory_embeddings USING hnsw (embedding vector_cosine_ops);
 
 -- Enable real-time for camera_states table
 ALTER PUBLICATION supabase_realtime ADD TABLE camera_states;
\ No newline at end of file
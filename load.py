@@ -0,0 +1,325 @@
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from supervisor import live_totals
+from telemetry import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _memory_total_bytes() -> int:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 8 * 2**30
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass
+class LoadConfig:
+    # The worker stops taking jobs at this load (0..1); LiveKit routes new rooms elsewhere
+    threshold: float = 0.75
+    # Each limit maps to load 1.0; the worker's load is the highest of the four
+    max_cpu: float = 0.85
+    max_rss_bytes: int = field(default_factory=lambda: int(_memory_total_bytes() * 0.8))
+    max_loop_lag_ms: float = 250.0
+    max_video_streams: int = 16
+    # Optional work a session drops once the worker's load reaches these
+    shed_background_at: float = 0.85
+    shed_frames_at: float = 0.95
+    # Load one more session is assumed to add, until there are sessions to measure
+    session_cost: float = 0.05
+    report_interval: float = 1.0
+    state_dir: str = field(default_factory=lambda: os.path.join(tempfile.gettempdir(), "visora-load"))
+
+    @classmethod
+    def from_env(cls) -> "LoadConfig":
+        config = cls(
+            threshold=float(os.getenv("LOAD_THRESHOLD", "0.75")),
+            max_cpu=float(os.getenv("LOAD_MAX_CPU", "0.85")),
+            max_loop_lag_ms=float(os.getenv("LOAD_MAX_LOOP_LAG_MS", "250")),
+            max_video_streams=int(os.getenv("LOAD_MAX_VIDEO_STREAMS", "16")),
+            shed_background_at=float(os.getenv("LOAD_SHED_BACKGROUND", "0.85")),
+            shed_frames_at=float(os.getenv("LOAD_SHED_FRAMES", "0.95")),
+            session_cost=float(os.getenv("LOAD_SESSION_COST", "0.05")),
+        )
+        if os.getenv("LOAD_MAX_RSS_MB"):
+            config.max_rss_bytes = int(os.getenv("LOAD_MAX_RSS_MB")) * 2**20
+        if os.getenv("LOAD_STATE_DIR"):
+            config.state_dir = os.getenv("LOAD_STATE_DIR")
+        return config
+
+
+class CpuSampler:
+    """Machine-wide CPU utilisation (0..1) between consecutive calls, from /proc/stat."""
+
+    def __init__(self) -> None:
+        self._last: Optional[tuple] = None
+
+    def sample(self) -> float:
+        try:
+            with open("/proc/stat") as f:
+                values = [int(v) for v in f.readline().split()[1:]]
+        except OSError:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        # idle + iowait
+        idle, total = values[3] + values[4], sum(values)
+        last, self._last = self._last, (idle, total)
+        if last is None or total == last[1]:
+            return 0.0
+        return 1.0 - (idle - last[0]) / (total - last[1])
+
+
+@dataclass
+class ProcessLoad:
+    """What one job process reports about itself, as a small JSON file in state_dir."""
+
+    pid: int
+    sessions: int = 0
+    video_streams: int = 0
+    rss_bytes: int = 0
+    loop_lag_ms: float = 0.0
+    updated_at: float = 0.0
+
+
+@dataclass
+class WorkerLoad:
+    cpu: float
+    rss_bytes: int
+    loop_lag_ms: float
+    video_streams: int
+    sessions: int
+    components: Dict[str, float]
+
+    @property
+    def value(self) -> float:
+        return min(1.0, max(self.components.values()))
+
+
+def read_reports(state_dir: str, max_age: float = 5.0) -> List[ProcessLoad]:
+    """Fresh reports from live job processes; files left by dead ones are removed."""
+    reports = []
+    try:
+        names = os.listdir(state_dir)
+    except FileNotFoundError:
+        return reports
+    now = time.time()
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(state_dir, name)
+        try:
+            with open(path) as f:
+                report = ProcessLoad(**json.load(f))
+            os.kill(report.pid, 0)
+        except ProcessLookupError:
+            _remove(path)
+            continue
+        except (OSError, ValueError, TypeError):
+            continue
+        if now - report.updated_at <= max_age:
+            reports.append(report)
+    return reports
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def measure_load(config: LoadConfig, cpu: CpuSampler, extra_rss: int = 0) -> WorkerLoad:
+    reports = read_reports(config.state_dir)
+    utilisation = cpu.sample()
+    rss = extra_rss + sum(r.rss_bytes for r in reports)
+    lag = max((r.loop_lag_ms for r in reports), default=0.0)
+    streams = sum(r.video_streams for r in reports)
+    return WorkerLoad(
+        cpu=utilisation,
+        rss_bytes=rss,
+        loop_lag_ms=lag,
+        video_streams=streams,
+        sessions=sum(r.sessions for r in reports),
+        components={
+            "cpu": utilisation / config.max_cpu,
+            "memory": rss / config.max_rss_bytes,
+            "loop_lag": lag / config.max_loop_lag_ms,
+            "video": streams / config.max_video_streams,
+        },
+    )
+
+
+LOAD_SHED = metrics.counter("visora_load_shed_total", "Optional work skipped because of worker load", labels=("kind",))
+
+
+class LoadReporter:
+    """
+    Job-process side: measures this process and decides what to shed.
+
+    A daemon thread writes the process's sessions, video streams, RSS and
+    worst event-loop lag to state_dir once per report_interval, where the
+    worker's load function reads them. It reads everyone's reports back, so
+    each session knows the worker-wide load and drops optional work
+    (background vision first, then frame attachments) before it adds
+    latency to turns. Lag comes from the loop watchdog of each session's loop.
+    """
+
+    # Kind of optional work -> the LoadConfig level at which it is dropped
+    SHED_LEVELS = {
+        "background": "shed_background_at",
+        "frame_selection": "shed_background_at",
+        "frames": "shed_frames_at",
+    }
+
+    LAG_WINDOW = 5.0
+
+    def __init__(self, config: Optional[LoadConfig] = None) -> None:
+        self.config = config or LoadConfig.from_env()
+        self.load: Optional[WorkerLoad] = None
+        self._cpu = CpuSampler()
+        self._lag_ms = 0.0
+        self._lag_history: List[tuple] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._path: Optional[str] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            os.makedirs(self.config.state_dir, exist_ok=True)
+            # Resolved here, not at import: job processes may be forked from the worker
+            self._path = os.path.join(self.config.state_dir, f"{os.getpid()}.json")
+            self._thread = threading.Thread(target=self._run, name="load_reporter", daemon=True)
+            self._thread.start()
+
+    @property
+    def value(self) -> float:
+        return self.load.value if self.load is not None else 0.0
+
+    def should_shed(self, kind: str) -> bool:
+        """True if optional work of this kind (a SHED_LEVELS key) should be skipped right now."""
+        if self.value < getattr(self.config, self.SHED_LEVELS[kind]):
+            return False
+        LOAD_SHED.inc(kind=kind)
+        return True
+
+    def record_lag(self, lag_ms: float) -> None:
+        """Called with each event-loop tick's lag (see loop_watchdog.LoopWatchdog); any thread."""
+        with self._lock:
+            self._lag_ms = max(self._lag_ms, lag_ms)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.config.report_interval)
+            try:
+                self._report()
+            except Exception as e:
+                logger.warning(f"Load report failed: {e}")
+
+    def _report(self) -> None:
+        with self._lock:
+            lag_ms, self._lag_ms = self._lag_ms, 0.0
+        # Worst lag over the last LAG_WINDOW seconds, so a stall outlives the worker's slower polling
+        now = time.monotonic()
+        self._lag_history = [(t, v) for t, v in self._lag_history if now - t < self.LAG_WINDOW]
+        self._lag_history.append((now, lag_ms))
+        lag_ms = max(v for _, v in self._lag_history)
+        totals = live_totals()
+        report = ProcessLoad(
+            pid=os.getpid(),
+            sessions=totals["sessions"],
+            video_streams=totals["video_streams"],
+            rss_bytes=rss_bytes(),
+            loop_lag_ms=round(lag_ms, 1),
+            updated_at=time.time(),
+        )
+        # Atomic replace: the worker never reads a half-written report
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(report), f)
+        os.replace(tmp_path, self._path)
+        self.load = measure_load(self.config, self._cpu)
+
+
+load_reporter = LoadReporter()
+
+metrics.gauge(
+    "visora_worker_load", "Worker load by component as seen from this process (1.0 = limit)",
+    lambda: {(name,): value for name, value in (load_reporter.load.components.items() if load_reporter.load else ())},
+    labels=("component",),
+)
+
+
+class AdmissionController:
+    """
+    Worker side: the load function and job admission policy.
+
+    load_fnc reports the highest of CPU, memory, loop lag and video streams
+    against their limits, so LiveKit stops offering jobs at config.threshold.
+    Load is only refreshed every few seconds (by LiveKit calling load_fnc),
+    so request_fnc projects from that sample the load after one more session (measured cost per session, plus jobs
+    accepted but not reporting yet) and rejects a job that would cross the
+    threshold; LiveKit then offers it to another worker.
+    """
+
+    # Seconds an accepted job counts as pending before its process reports it
+    PENDING_WINDOW = 10.0
+
+    def __init__(self, config: Optional[LoadConfig] = None) -> None:
+        self.config = config or LoadConfig.from_env()
+        self.load: Optional[WorkerLoad] = None
+        self.accepted = 0
+        self.rejected = 0
+        self._cpu = CpuSampler()
+        self._pending: List[float] = []
+
+    def load_fnc(self, worker=None) -> float:
+        self.load = measure_load(self.config, self._cpu, extra_rss=rss_bytes())
+        return self.load.value
+
+    def session_cost(self) -> float:
+        load = self.load
+        if load is None or load.sessions == 0:
+            return self.config.session_cost
+        return max(self.config.session_cost, load.value / load.sessions)
+
+    def projected_load(self) -> float:
+        now = time.monotonic()
+        self._pending = [t for t in self._pending if now - t < self.PENDING_WINDOW]
+        # The worker's last periodic sample: re-reading /proc/stat per request would give a near-zero
+        # CPU window (0.0 for back-to-back requests) and shorten the next periodic one
+        current = self.load.value if self.load is not None else self.load_fnc()
+        return current + (len(self._pending) + 1) * self.session_cost()
+
+    async def request_fnc(self, req) -> None:
+        projected = self.projected_load()
+        if projected >= self.config.threshold:
+            self.rejected += 1
+            logger.warning(
+                f"Rejecting job for room {req.room.name}: projected load {projected:.2f} "
+                f"({', '.join(f'{k} {v:.2f}' for k, v in self.load.components.items())})"
+            )
+            await req.reject()
+            return
+        self.accepted += 1
+        self._pending.append(time.monotonic())
+        await req.accept()
@@ -0,0 +1,161 @@
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set
+
+from telemetry import metrics, task_activity
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "100"))
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.05"))
+# Innermost frames kept in the stall log
+STACK_LIMIT = int(os.getenv("LOOP_STALL_STACK_LIMIT", "12"))
+
+_SOURCE_ROOT = os.path.dirname(os.path.abspath(__file__))
+_ASYNCIO_ROOT = os.path.dirname(asyncio.__file__)
+
+LOOP_LAG = metrics.histogram(
+    "visora_loop_lag_seconds", "How late event-loop heartbeat ticks fire",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+LOOP_STALLS = metrics.histogram(
+    "visora_loop_stall_seconds", "Event-loop stalls over LOOP_STALL_MS, by the tool or hook that was running",
+    labels=("activity",), buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+@dataclass
+class Stall:
+    started: float
+    activity: str
+    culprit: Optional[str]
+    stack: List[str]
+
+
+def _culprit(frame) -> Optional[str]:
+    """Innermost frame in this repo's code: the line that called into the blocking library."""
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(_SOURCE_ROOT) and path != os.path.abspath(__file__):
+            return f"{os.path.relpath(path, _SOURCE_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _task_stack(frame) -> List[str]:
+    """The blocked call's stack, starting below the event loop's own frames."""
+    summary = traceback.extract_stack(frame)
+    for i in range(len(summary) - 1, -1, -1):
+        if summary[i].filename.startswith(_ASYNCIO_ROOT):
+            summary = summary[i + 1:] or summary
+            break
+    return traceback.format_list(summary[-STACK_LIMIT:])
+
+
+class LoopWatchdog:
+    """
+    Catches blocking calls on an event loop while they block.
+
+    A heartbeat task ticks every interval and records how late each tick
+    was. A monitor thread watches the heartbeat: once it is threshold_ms
+    overdue, the loop is stuck in a synchronous call, so the monitor grabs
+    the loop thread's stack right then, along with what the running task
+    was doing (telemetry.activity: the tool, hook or span) or, failing that,
+    its name. When the loop comes back the stall is logged with that stack
+    and its duration, and counted per activity.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        threshold_ms: float = LOOP_STALL_MS,
+        interval: float = LOOP_WATCHDOG_INTERVAL,
+    ) -> None:
+        self.loop = loop
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.stalls = 0
+        self._listeners: Set[Callable[[float], None]] = set()
+        self._last_tick = time.monotonic()
+        self._stall: Optional[Stall] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, callback: Callable[[float], None]) -> None:
+        """callback(lag_ms) after every tick, on the loop's thread."""
+        self._listeners.add(callback)
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._task = self.loop.create_task(self._heartbeat(), name="loop_watchdog")
+        threading.Thread(target=self._monitor, name="loop_watchdog", daemon=True).start()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = self.loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, self.loop.time() - expected)
+            self._last_tick = time.monotonic()
+            LOOP_LAG.observe(lag)
+            stall, self._stall = self._stall, None
+            if stall is not None and lag >= self.threshold:
+                self._report(stall, lag)
+            for callback in list(self._listeners):
+                callback(lag * 1000)
+
+    def _monitor(self) -> None:
+        poll = min(self.interval, self.threshold / 2)
+        while not self.loop.is_closed():
+            time.sleep(poll)
+            if self._stall is not None or self._task is None or self._task.done():
+                continue
+            if time.monotonic() - self._last_tick - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            try:
+                task = asyncio.current_task(self.loop)
+            except RuntimeError:
+                task = None
+            activity = task_activity(task) or (task.get_name() if task is not None else "callback")
+            stack = _task_stack(frame)
+            self._stall = Stall(self._last_tick, activity, _culprit(frame), stack)
+            # Drop the frame reference; it pins every local of the blocked call
+            del frame
+
+    def _report(self, stall: Stall, lag: float) -> None:
+        self.stalls += 1
+        LOOP_STALLS.observe(lag, activity=stall.activity)
+        logger.warning(
+            f"Event loop blocked for {lag * 1000:.0f} ms in {stall.activity}"
+            f"{f' at {stall.culprit}' if stall.culprit else ''}; stack when caught:\n{''.join(stall.stack).rstrip()}"
+        )
+
+
+_watchdogs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LoopWatchdog]" = weakref.WeakKeyDictionary()
+
+
+def watch_loop(on_lag: Optional[Callable[[float], None]] = None) -> LoopWatchdog:
+    """The running loop's watchdog, started on first use; on_lag receives each tick's lag in ms."""
+    loop = asyncio.get_running_loop()
+    watchdog = _watchdogs.get(loop)
+    if watchdog is None:
+        watchdog = _watchdogs[loop] = LoopWatchdog(loop)
+        watchdog.start()
+    if on_lag is not None:
+        watchdog.add_listener(on_lag)
+    return watchdog
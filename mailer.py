@@ -0,0 +1,302 @@
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Errors that will not go away by retrying the same message
+_PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+@dataclass
+class MailConfig:
+    transport: str = "smtp"  # "smtp" or "resend"
+    sender: Optional[str] = None
+    smtp_host: str = "smtp.gmail.com"
+    smtp_port: int = 587
+    smtp_starttls: bool = True
+    smtp_password: Optional[str] = None
+    smtp_require_auth: bool = True
+    resend_api_key: Optional[str] = None
+    queue_path: str = "mail_queue.db"
+    max_attempts: int = 6
+    base_backoff: float = 5.0
+    max_backoff: float = 600.0
+    # Probe the pooled connection with NOOP before reuse after this much idle time
+    idle_refresh: float = 60.0
+    poll_interval: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "MailConfig":
+        return cls(
+            transport=os.getenv("MAIL_TRANSPORT", "smtp").lower(),
+            sender=os.getenv("GMAIL_USER"),
+            smtp_host=os.getenv("MAIL_SMTP_HOST", "smtp.gmail.com"),
+            smtp_port=int(os.getenv("MAIL_SMTP_PORT", "587")),
+            smtp_starttls=os.getenv("MAIL_SMTP_STARTTLS", "1") == "1",
+            smtp_password=os.getenv("GMAIL_APP_PASSWORD"),
+            smtp_require_auth=os.getenv("MAIL_SMTP_AUTH", "1") == "1",
+            resend_api_key=os.getenv("RESEND_API_KEY"),
+            queue_path=os.getenv("MAIL_QUEUE_PATH", "mail_queue.db"),
+            max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", "6")),
+        )
+
+    @property
+    def configured(self) -> bool:
+        if not self.sender:
+            return False
+        if self.transport == "resend":
+            return bool(self.resend_api_key)
+        return bool(self.smtp_password) or not self.smtp_require_auth
+
+
+class MailQueue:
+    """
+    Outbound mail with a persistent SQLite outbox.
+
+    enqueue() stores the message and returns immediately. A single sender
+    thread owns the outbox connection and one long-lived SMTP connection,
+    which is reused across messages and re-opened when it goes stale.
+    Failed sends are retried with exponential backoff; rows are leased so
+    several worker processes can share one outbox file.
+    """
+
+    LEASE_SECONDS = 120
+
+    def __init__(self, config: Optional[MailConfig] = None) -> None:
+        self.config = config or MailConfig.from_env()
+        self.sent = 0
+        self.failed = 0
+        # One thread: sqlite connection and SMTP session are never shared across threads
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mail")
+        self._db: Optional[sqlite3.Connection] = None
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_last_used = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def configured(self) -> bool:
+        return self.config.configured
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="mail_queue")
+
+    async def enqueue(self, to: List[str], subject: str, body: str, cc: Optional[List[str]] = None) -> int:
+        """Persist a message to the outbox and wake the sender. Returns the outbox id."""
+        self.start()
+        payload = {"to": to, "cc": cc or [], "subject": subject, "body": body}
+        loop = asyncio.get_running_loop()
+        message_id = await loop.run_in_executor(self._executor, self._insert, payload)
+        self._wakeup.set()
+        return message_id
+
+    async def aclose(self) -> None:
+        """Stop sending. Anything still queued stays in the outbox for the next start."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_sync)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            try:
+                next_due = await loop.run_in_executor(self._executor, self._drain)
+            except Exception as e:
+                logger.error(f"Mail queue drain failed: {e}")
+                next_due = self.config.base_backoff
+            timeout = self.config.poll_interval if next_due is None else min(next_due, self.config.poll_interval)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.05))
+            except asyncio.TimeoutError:
+                pass
+
+    # Everything below runs on the mail thread
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.config.queue_path, timeout=10, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    locked_until REAL NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        return self._db
+
+    def _insert(self, payload: dict) -> int:
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO outbox (payload, next_attempt_at, created_at) VALUES (?, ?, ?)",
+            (json.dumps(payload), now, now),
+        )
+        return cursor.lastrowid
+
+    def _claim(self) -> Optional[tuple]:
+        db = self._conn()
+        now = time.time()
+        row = db.execute(
+            "SELECT id, payload, attempts FROM outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? AND locked_until <= ? "
+            "ORDER BY next_attempt_at LIMIT 1",
+            (now, now),
+        ).fetchone()
+        if row is None:
+            return None
+        claimed = db.execute(
+            "UPDATE outbox SET locked_until = ? WHERE id = ? AND locked_until <= ?",
+            (now + self.LEASE_SECONDS, row[0], now),
+        ).rowcount
+        return row if claimed else None
+
+    def _drain(self) -> Optional[float]:
+        """Send every due message; return seconds until the next retry, or None if the outbox is idle."""
+        db = self._conn()
+        while True:
+            row = self._claim()
+            if row is None:
+                break
+            message_id, payload, attempts = row
+            message = json.loads(payload)
+            try:
+                self._deliver(message)
+            except Exception as e:
+                attempts += 1
+                if isinstance(e, _PERMANENT_ERRORS) or attempts >= self.config.max_attempts:
+                    self.failed += 1
+                    db.execute(
+                        "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, locked_until = 0 WHERE id = ?",
+                        (attempts, str(e), message_id),
+                    )
+                    logger.error(f"Giving up on email {message_id} after {attempts} attempts: {e}")
+                else:
+                    delay = min(self.config.base_backoff * 2 ** (attempts - 1), self.config.max_backoff)
+                    db.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, locked_until = 0 WHERE id = ?",
+                        (attempts, time.time() + delay, str(e), message_id),
+                    )
+                    logger.warning(f"Email {message_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {e}")
+                continue
+            self.sent += 1
+            db.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+            logger.info(f"Email {message_id} sent to {', '.join(message['to'])}")
+
+        row = db.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _deliver(self, payload: dict) -> None:
+        if self.config.transport == "resend":
+            self._deliver_resend(payload)
+        else:
+            self._deliver_smtp(payload)
+
+    def _deliver_resend(self, payload: dict) -> None:
+        import resend
+
+        resend.api_key = self.config.resend_api_key
+        params = {
+            "from": self.config.sender,
+            "to": payload["to"],
+            "subject": payload["subject"],
+            "text": payload["body"],
+        }
+        if payload["cc"]:
+            params["cc"] = payload["cc"]
+        resend.Emails.send(params)
+
+    def _deliver_smtp(self, payload: dict) -> None:
+        msg = MIMEMultipart()
+        msg['From'] = self.config.sender
+        msg['To'] = ", ".join(payload["to"])
+        msg['Subject'] = payload["subject"]
+        if payload["cc"]:
+            msg['Cc'] = ", ".join(payload["cc"])
+        msg.attach(MIMEText(payload["body"], 'plain'))
+        recipients = payload["to"] + payload["cc"]
+
+        try:
+            self._smtp_connection().sendmail(self.config.sender, recipients, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # The pooled connection died between the idle check and the send; reconnect once
+            self._close_smtp()
+            self._smtp_connection().sendmail(self.config.sender, recipients, msg.as_string())
+        self._smtp_last_used = time.monotonic()
+
+    def _smtp_connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._smtp_last_used > self.config.idle_refresh:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._close_smtp()
+            except smtplib.SMTPException:
+                self._close_smtp()
+
+        if self._smtp is None:
+            server = smtplib.SMTP(self.config.smtp_host, self.config.smtp_port, timeout=30)
+            try:
+                if self.config.smtp_starttls:
+                    server.starttls()
+                if self.config.smtp_password:
+                    server.login(self.config.sender, self.config.smtp_password)
+            except Exception:
+                server.close()
+                raise
+            self._smtp = server
+            self._smtp_last_used = time.monotonic()
+            logger.info(f"Opened SMTP connection to {self.config.smtp_host}:{self.config.smtp_port}")
+        return self._smtp
+
+    def _close_smtp(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
+
+    def _close_sync(self) -> None:
+        self._close_smtp()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_mail_queue: Optional[MailQueue] = None
+
+
+def get_mail_queue() -> MailQueue:
+    """The worker-wide mail queue; created on first use."""
+    global _mail_queue
+    if _mail_queue is None:
+        _mail_queue = MailQueue()
+    return _mail_queue
@@ -0,0 +1,403 @@
+from dotenv import load_dotenv
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db import db_enabled, get_pool
+from identity import SessionIdentity
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Index reads and appends run here, one at a time, so the loop never waits on numpy or the disk
+_memory_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class MemoryConfig:
+    backend: str = "local"
+    embedder: str = "hashing"
+    dim: int = 768
+    directory: str = "memory_index"
+    top_k: int = 4
+    min_score: float = 0.35
+    # Recall gives up after this long, so it never delays the reply
+    recall_budget_ms: float = 250.0
+    max_tokens: int = 200
+    min_chars: int = 12
+    batch_size: int = 16
+    flush_interval: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "MemoryConfig":
+        default_backend = "pgvector" if db_enabled() else "local"
+        default_embedder = "google" if os.getenv("GOOGLE_API_KEY") else "hashing"
+        return cls(
+            backend=os.getenv("MEMORY_BACKEND", default_backend).lower(),
+            embedder=os.getenv("MEMORY_EMBEDDER", default_embedder).lower(),
+            dim=int(os.getenv("MEMORY_DIM", "768")),
+            directory=os.getenv("MEMORY_DIR", "memory_index"),
+            top_k=int(os.getenv("MEMORY_TOP_K", "4")),
+            min_score=float(os.getenv("MEMORY_MIN_SCORE", "0.35")),
+            recall_budget_ms=float(os.getenv("MEMORY_RECALL_BUDGET_MS", "250")),
+            max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", "200")),
+        )
+
+
+@dataclass
+class Memory:
+    kind: str
+    content: str
+    created_at: datetime
+    score: float = 0.0
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-9)).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Feature-hashed word unigrams and bigrams. No model and no network, so it
+    works offline and in tests; recall is lexical rather than semantic.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def _embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalize(vectors)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self._embed_sync(texts)
+
+
+class GoogleEmbedder:
+    """Gemini text embeddings over REST, on the tools' shared HTTP session."""
+
+    name = "google"
+    URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:batchEmbedContents"
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.model = os.getenv("MEMORY_EMBEDDING_MODEL", "text-embedding-004")
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        from tools import get_http_session
+
+        body = {
+            "requests": [
+                {
+                    "model": f"models/{self.model}",
+                    "content": {"parts": [{"text": text}]},
+                    "outputDimensionality": self.dim,
+                }
+                for text in texts
+            ]
+        }
+        async with get_http_session().post(
+            self.URL.format(model=self.model), params={"key": os.getenv("GOOGLE_API_KEY")}, json=body
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return _normalize(np.array([e["values"] for e in data["embeddings"]], dtype=np.float32))
+
+
+class LocalMemoryIndex:
+    """
+    Append-only float32 index on local disk: vectors.f32 holds unit vectors
+    row by row (memory-mapped for search), meta.jsonl one line per row.
+    Appends take an exclusive file lock so several worker processes can
+    share the directory. Only called on _memory_executor.
+    """
+
+    def __init__(self, directory: str, dim: int) -> None:
+        self.dim = dim
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._meta_path = os.path.join(directory, "meta.jsonl")
+        self._lock_path = os.path.join(directory, ".lock")
+        self._meta: List[dict] = []
+        self._meta_offset = 0
+        self._rows_by_owner: Dict[str, List[int]] = {}
+        self._vectors: Optional[np.ndarray] = None
+
+    def _refresh(self) -> int:
+        """Pick up rows appended since the last call (by any process); returns the usable row count."""
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "rb") as f:
+                f.seek(self._meta_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._meta_offset += len(line)
+                    meta = json.loads(line)
+                    self._rows_by_owner.setdefault(meta["owner"], []).append(len(self._meta))
+                    self._meta.append(meta)
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = min(size // (self.dim * 4), len(self._meta))
+        if rows and (self._vectors is None or len(self._vectors) != rows):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return rows
+
+    def append(self, owner: str, session_id: str, items: List[Tuple[str, str, np.ndarray]]) -> None:
+        created_at = datetime.now(timezone.utc).isoformat()
+        with open(self._lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Vectors first: a reader only uses rows that have both vector and metadata
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack([vector for _, _, vector in items]).astype(np.float32).tobytes())
+            with open(self._meta_path, "a", encoding="utf-8") as f:
+                for kind, content, _ in items:
+                    f.write(json.dumps({
+                        "owner": owner, "session_id": session_id, "kind": kind,
+                        "content": content, "created_at": created_at,
+                    }) + "\n")
+
+    def search(self, owner: str, query: np.ndarray, k: int, before: datetime) -> List[Memory]:
+        total = self._refresh()
+        rows = [
+            row for row in self._rows_by_owner.get(owner, [])
+            if row < total and datetime.fromisoformat(self._meta[row]["created_at"]) < before
+        ]
+        if not rows:
+            return []
+        scores = self._vectors[rows] @ query
+        top = np.argsort(-scores)[:k] if len(rows) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self._memory(rows[i], float(scores[i])) for i in top]
+
+    def recent(self, owner: str, k: int) -> List[Memory]:
+        total = self._refresh()
+        rows = [row for row in self._rows_by_owner.get(owner, []) if row < total][-k:]
+        return [self._memory(row) for row in rows]
+
+    def _memory(self, row: int, score: float = 0.0) -> Memory:
+        meta = self._meta[row]
+        return Memory(meta["kind"], meta["content"], datetime.fromisoformat(meta["created_at"]), score)
+
+
+_PG_INSERT_SQL = """
+INSERT INTO memory_embeddings (owner, session_id, kind, content, embedding)
+SELECT $1, $2::uuid, t.kind, t.content, t.embedding::vector
+FROM unnest($3::text[], $4::text[], $5::text[]) AS t(kind, content, embedding)
+"""
+
+_PG_SEARCH_SQL = """
+SELECT kind, content, created_at, 1 - (embedding <=> $2::vector) AS score
+FROM memory_embeddings
+WHERE owner = $1 AND created_at < $4
+ORDER BY embedding <=> $2::vector
+LIMIT $3
+"""
+
+_PG_RECENT_SQL = """
+SELECT kind, content, created_at FROM memory_embeddings
+WHERE owner = $1 ORDER BY created_at DESC LIMIT $2
+"""
+
+
+def _vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+
+class PgVectorIndex:
+    """memory_embeddings in Postgres (pgvector), searched with the HNSW cosine index."""
+
+    async def append(self, identity: SessionIdentity, owner: str, items: List[Tuple[str, str, np.ndarray]]) -> None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            await identity.ensure(conn)
+            kinds, contents, vectors = zip(*items)
+            await conn.execute(
+                _PG_INSERT_SQL, owner, identity.session_id, kinds, contents, [_vector_literal(v) for v in vectors]
+            )
+
+    async def search(self, owner: str, query: np.ndarray, k: int, before: datetime) -> List[Memory]:
+        pool = await get_pool()
+        rows = await pool.fetch(_PG_SEARCH_SQL, owner, _vector_literal(query), k, before)
+        return [Memory(r["kind"], r["content"], r["created_at"], r["score"]) for r in rows]
+
+    async def recent(self, owner: str, k: int) -> List[Memory]:
+        pool = await get_pool()
+        rows = await pool.fetch(_PG_RECENT_SQL, owner, k)
+        return [Memory(r["kind"], r["content"], r["created_at"]) for r in reversed(rows)]
+
+
+_local_indexes: Dict[str, LocalMemoryIndex] = {}
+
+
+class ConversationMemory:
+    """
+    Long-term memory of one user across sessions.
+
+    remember() only buffers; a background task embeds buffered turns in
+    batches and appends them to the index. recall() embeds the user's
+    message and returns the closest snippets stored before this session
+    started (this session's own turns are already in the chat context), cut
+    to max_tokens. The cutoff is by time, not session id: anonymous users'
+    session ids come from the room name and repeat every time the room is
+    used. It gives up
+    after recall_budget_ms and returns nothing, so memory can make a reply
+    better but never slower.
+    """
+
+    def __init__(self, identity: SessionIdentity, config: Optional[MemoryConfig] = None) -> None:
+        self.identity = identity
+        self.config = config or MemoryConfig.from_env()
+        # Rooms stand in for users until clients send a real user id
+        self.owner = identity.user_id if identity.user_id != "anonymous" else identity.room_name
+        self.started_at = datetime.now(timezone.utc)
+        embedder_cls = GoogleEmbedder if self.config.embedder == "google" else HashingEmbedder
+        self.embedder = embedder_cls(self.config.dim)
+        if self.config.backend == "pgvector":
+            self._pg: Optional[PgVectorIndex] = PgVectorIndex()
+            self._local: Optional[LocalMemoryIndex] = None
+        else:
+            # Vectors from different embedders aren't comparable, so each gets its own directory
+            directory = os.path.join(self.config.directory, f"{self.embedder.name}-{self.config.dim}")
+            self._pg = None
+            if directory not in _local_indexes:
+                _local_indexes[directory] = LocalMemoryIndex(directory, self.config.dim)
+            self._local = _local_indexes[directory]
+        self._pending: List[Tuple[str, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stored = 0
+        self.recalls = 0
+        self.timeouts = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="memory_writer")
+
+    def remember(self, kind: str, content: str) -> None:
+        content = " ".join((content or "").split())
+        if len(content) < self.config.min_chars:
+            return
+        self._pending.append((kind, content))
+        if len(self._pending) >= self.config.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def recall(self, query: str) -> List[Memory]:
+        """Earlier snippets relevant to query, within the time and token budget."""
+        if len(query.strip()) < 3:
+            return []
+        self.recalls += 1
+        started = time.perf_counter()
+        try:
+            memories = await asyncio.wait_for(self._search(query), timeout=self.config.recall_budget_ms / 1000)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.debug(f"Memory recall over budget ({self.config.recall_budget_ms:.0f} ms), skipped")
+            return []
+        except Exception as e:
+            logger.warning(f"Memory recall failed: {e}")
+            return []
+        logger.debug(f"Memory recall: {len(memories)} snippets in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return self._within_budget([m for m in memories if m.score >= self.config.min_score])
+
+    async def recent(self) -> List[Memory]:
+        """The latest snippets, for the start of a session when there is no query yet."""
+        try:
+            if self._pg is not None:
+                coro = self._pg.recent(self.owner, self.config.top_k)
+            else:
+                loop = asyncio.get_running_loop()
+                coro = loop.run_in_executor(_memory_executor, self._local.recent, self.owner, self.config.top_k)
+            memories = await asyncio.wait_for(coro, timeout=self.config.recall_budget_ms / 1000)
+        except Exception as e:
+            logger.debug(f"Recent memories unavailable: {e!r}")
+            return []
+        return self._within_budget(memories)
+
+    async def _search(self, query: str) -> List[Memory]:
+        vector = (await self.embedder.embed([query]))[0]
+        if self._pg is not None:
+            return await self._pg.search(self.owner, vector, self.config.top_k, self.started_at)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _memory_executor, self._local.search, self.owner, vector, self.config.top_k, self.started_at
+        )
+
+    def _within_budget(self, memories: List[Memory]) -> List[Memory]:
+        kept, tokens = [], 0
+        for memory in memories:
+            # ~4 characters per token is close enough for a budget
+            cost = len(memory.content) // 4 + 8
+            if tokens + cost > self.config.max_tokens:
+                break
+            kept.append(memory)
+            tokens += cost
+        return kept
+
+    async def flush(self) -> None:
+        while self._pending:
+            batch = self._pending[:self.config.batch_size]
+            try:
+                vectors = await self.embedder.embed([content for _, content in batch])
+                items = [(kind, content, vector) for (kind, content), vector in zip(batch, vectors)]
+                if self._pg is not None:
+                    await self._pg.append(self.identity, self.owner, items)
+                else:
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(
+                        _memory_executor, self._local.append, self.owner, self.identity.session_id, items
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to store {len(self._pending)} memories, will retry: {e}")
+                return
+            del self._pending[:len(batch)]
+            self.stored += len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.config.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(
+            f"Memory: {self.stored} snippets stored, {self.recalls} recalls ({self.timeouts} over budget)"
+        )
+
+
+def format_memories(memories: List[Memory]) -> str:
+    lines = [f"- ({m.created_at:%Y-%m-%d}) {m.kind}: {m.content}" for m in memories]
+    return "\n".join(lines)
@@ -0,0 +1,217 @@
+from dotenv import load_dotenv
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+import cv2
+import numpy as np
+from livekit import rtc
+
+from regions import TEXT_MODEL, RegionFinder
+from telemetry import metrics
+from vision import frame_to_bgr, run_in_vision_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# OpenCV Zoo CRNN recognizer; its vocabulary is digits and lowercase latin letters
+RECOGNIZER_MODEL = os.getenv("OCR_RECOGNIZER_MODEL", "models/text_recognition_CRNN_EN_2021sep.onnx")
+RECOGNIZER_VOCABULARY = "0123456789abcdefghijklmnopqrstuvwxyz"
+# "dnn" (detector + CRNN), "tesseract" (pytesseract + the tesseract binary), or "auto": dnn if installed
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+TESSERACT_LANG = os.getenv("OCR_TESSERACT_LANG", "msa+ind+eng")
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", "1"))
+# Long edge the frame is read at; small print needs more than the model's image
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "1600"))
+# Lines recognized (and spoken) per chunk
+OCR_CHUNK_LINES = int(os.getenv("OCR_CHUNK_LINES", "4"))
+
+OCR_SECONDS = metrics.histogram("visora_ocr_seconds", "Local OCR stage time", labels=("stage",))
+
+
+def _engine() -> Optional[str]:
+    """The OCR engine that can run here, or None."""
+    dnn = os.path.exists(RECOGNIZER_MODEL)
+    tesseract = importlib.util.find_spec("pytesseract") is not None and shutil.which("tesseract") is not None
+    if OCR_ENGINE == "dnn":
+        return "dnn" if dnn else None
+    if OCR_ENGINE == "tesseract":
+        return "tesseract" if tesseract else None
+    return "dnn" if dnn else "tesseract" if tesseract else None
+
+
+# --- Pool process side: models are loaded once per process by the initializer ----------------
+
+_finder: Optional[RegionFinder] = None
+_recognizer = None
+_engine_name: Optional[str] = None
+
+
+def _init_process(engine: str) -> None:
+    global _finder, _recognizer, _engine_name
+    # One OpenCV thread per pool process; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    _engine_name = engine
+    _finder = RegionFinder(text_model=TEXT_MODEL)
+    _finder.load()
+    if engine == "dnn":
+        _recognizer = cv2.dnn_TextRecognitionModel(RECOGNIZER_MODEL)
+        _recognizer.setDecodeType("CTC-greedy")
+        _recognizer.setVocabulary(list(RECOGNIZER_VOCABULARY))
+        _recognizer.setInputParams(1.0 / 127.5, (100, 32), (127.5, 127.5, 127.5))
+
+
+def _ping() -> bool:
+    return _engine_name is not None
+
+
+def _detect(image: np.ndarray) -> np.ndarray:
+    return _finder.text_boxes(image)
+
+
+def _recognize(rows: List[List[np.ndarray]]) -> List[str]:
+    """Text of each row of crops (the words of one line, left to right)."""
+    if _engine_name == "tesseract":
+        import pytesseract
+
+        # Tesseract gets one crop spanning the whole chunk and does its own line split
+        text = "\n".join(
+            pytesseract.image_to_string(crop, lang=TESSERACT_LANG, config="--psm 6") for row in rows for crop in row
+        )
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    lines = []
+    for row in rows:
+        # The EN CRNN was trained on grayscale text lines
+        words = [_recognizer.recognize(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)).strip() for crop in row]
+        line = " ".join(word for word in words if word)
+        if line:
+            lines.append(line)
+    return lines
+
+
+# --- Session side ------------------------------------------------------------------------------
+
+
+def reading_order(boxes: np.ndarray) -> List[List[np.ndarray]]:
+    """Group (x, y, w, h) line boxes into rows, top to bottom, each row left to right."""
+    if len(boxes) == 0:
+        return []
+    tolerance = 0.5 * float(np.median(boxes[:, 3]))
+    rows: List[List[np.ndarray]] = []
+    for box in boxes[np.argsort(boxes[:, 1] + boxes[:, 3] / 2)]:
+        center = box[1] + box[3] / 2
+        if rows and abs(center - (rows[-1][0][1] + rows[-1][0][3] / 2)) <= tolerance:
+            rows[-1].append(box)
+        else:
+            rows.append([box])
+    return [sorted(row, key=lambda b: b[0]) for row in rows]
+
+
+def _crop(image: np.ndarray, box: np.ndarray, pad: int = 3) -> np.ndarray:
+    x, y, w, h = (int(v) for v in box)
+    return np.ascontiguousarray(image[max(0, y - pad):y + h + pad, max(0, x - pad):x + w + pad])
+
+
+def _union_box(boxes: List[np.ndarray]) -> np.ndarray:
+    boxes = np.array(boxes)
+    x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+    x1, y1 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+    return np.array([x0, y0, x1 - x0, y1 - y0])
+
+
+def _prepare(frame: rtc.VideoFrame) -> np.ndarray:
+    # Copy out of the scratch buffer: the image is pickled to the pool after this returns
+    return frame_to_bgr(frame, OCR_MAX_EDGE).copy()
+
+
+class TextReader:
+    """
+    On-device OCR for the read_text tool.
+
+    Detection and recognition run in a small process pool, so a page of text
+    never holds the GIL the event loop and the vision threads need. Models
+    are loaded once per pool process, in prewarm. Lines come back in reading
+    order, a chunk at a time, so the first lines can be spoken while the
+    rest are still being recognized. Results are not cached: consecutive
+    camera frames of the same page never match exactly, and no perceptual
+    match tells a re-framed page from one with a single digit changed.
+    """
+
+    def __init__(self, engine: str, processes: int = OCR_PROCESSES) -> None:
+        self.engine = engine
+        # Not "fork": by prewarm this process already runs LiveKit IPC, vision pool and OpenCV threads, and a
+        # child forked while one of them holds a lock can deadlock. The initializer loads everything it needs.
+        self._pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_init_process,
+            initargs=(engine,),
+        )
+        self.processes = processes
+
+    def warm(self) -> None:
+        """Start every pool process and load its models now."""
+        for future in [self._pool.submit(_ping) for _ in range(self.processes)]:
+            future.result()
+
+    async def read(self, frame: rtc.VideoFrame) -> AsyncIterator[List[str]]:
+        """Yield the frame's text as chunks of lines, in reading order."""
+        loop = asyncio.get_running_loop()
+        image = await run_in_vision_pool(_prepare, frame)
+
+        started = time.perf_counter()
+        boxes = await loop.run_in_executor(self._pool, _detect, image)
+        OCR_SECONDS.observe(time.perf_counter() - started, stage="detect")
+        rows = reading_order(boxes)
+        chunks = [rows[i:i + OCR_CHUNK_LINES] for i in range(0, len(rows), OCR_CHUNK_LINES)]
+        if self.engine == "tesseract":
+            crops = [[[_crop(image, _union_box([box for row in chunk for box in row]))]] for chunk in chunks]
+        else:
+            crops = [[[_crop(image, box) for box in row] for row in chunk] for chunk in chunks]
+
+        # Everything is queued at once, so the pool works ahead while the first chunk is spoken
+        futures = [loop.run_in_executor(self._pool, _recognize, chunk) for chunk in crops]
+        try:
+            for future in futures:
+                chunk_lines = await future
+                if chunk_lines:
+                    yield chunk_lines
+        finally:
+            for future in futures:
+                future.cancel()
+        OCR_SECONDS.observe(time.perf_counter() - started, stage="total")
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_reader: Optional[TextReader] = None
+_unavailable = False
+
+
+def load_text_reader() -> Optional[TextReader]:
+    """Start the OCR pool and load its models. Called once per worker from prewarm."""
+    global _reader, _unavailable
+    if _reader is None and not _unavailable:
+        engine = _engine()
+        if engine is None:
+            logger.warning(
+                f"No OCR engine available ({RECOGNIZER_MODEL} missing and no tesseract), local text reading disabled"
+            )
+            _unavailable = True
+            return None
+        _reader = TextReader(engine)
+        _reader.warm()
+        logger.info(f"OCR ready: {engine} engine in {_reader.processes} process(es)")
+    return _reader
+
+
+def get_text_reader() -> Optional[TextReader]:
+    return _reader if _reader is not None else load_text_reader()
@@ -18,16 +18,22 @@ Anda mempunyai akses kepada alat untuk membantu pengguna dengan:
 - Menghidupkan kamera peranti untuk panduan visual
 - Mematikan kamera apabila tidak diperlukan
 - Menukar antara kamera hadapan dan belakang untuk sudut pandang berbeza
+- Mengenal pasti orang yang dikenali di hadapan pengguna melalui kamera
+- Mengenal pasti wang kertas (Rupiah dan Ringgit) dan objek harian dengan pantas
+- Membaca teks (papan tanda, label, dokumen, skrin) dengan pantas terus pada peranti
 - Menyemak cuaca semasa untuk mana-mana lokasi, default Samarinda
 - Mencari maklumat di internet yang terkini
 - Menghantar e-mel untuk bantu komunikasi
 
 Sentiasa utamakan penggunaan alat apabila permintaan pengguna boleh mendapat manfaat daripadanya. Jangan meneka jika alat boleh memberi jawapan tepat. Anda boleh guna alat walaupun pengguna tidak memintanya secara jelas.
 
-## Ketika ada perintah "Siapa yang ada di hadapan saya?", Pastikan menyalakan kamera, dan isi parameter camera_type dengan "environment".
+## Ketika ada perintah "Siapa yang ada di hadapan saya?", Pastikan menyalakan kamera, dan isi parameter camera_type dengan "environment", kemudian guna identify_person.
 
 Bila hendak guna alat:
 - Guna **camera_on** apabila pengguna menyebut melihat, menunjukkan, mengenal pasti, menangkap, memeriksa objek, menavigasi persekitaran, atau apa-apa yang memerlukan kamera.
+- Guna **identify_person** apabila pengguna bertanya siapa di hadapan mereka atau sama ada mereka kenal orang itu (kamera mesti hidup).
+- Guna **recognize_item** apabila pengguna bertanya nilai wang kertas yang dipegang (item_type "currency") atau objek apa di hadapan mereka (item_type "object"). Jika alat tidak pasti, barulah terangkan berdasarkan imej kamera.
+- Guna **read_text** apabila pengguna minta dibacakan tulisan, label, papan tanda, dokumen atau skrin (kamera mesti hidup). Bacakan hasilnya tepat seperti tertulis. Jika teks panjang, bahagian seterusnya akan dibacakan secara automatik.
 - Guna **camera_off** apabila pengguna mahu berhenti menggunakan kamera atau menyebut mematikannya.
 - Guna **switch_camera** apabila pengguna mahu menukar pandangan, menukar kamera, atau perlukan perspektif lain (contoh: hadapan ke belakang).
 - Guna **weather** apabila pengguna bertanya tentang suhu, hujan, panas, cadangan pakaian, perjalanan, atau perancangan di luar.
@@ -36,6 +42,9 @@ Bila hendak guna alat:
 
 When to use tools:
 - Use the **camera_on tool** when the user refers to seeing, showing, recognizing, capturing, checking objects, navigating surroundings, "Who is in front of me?", or anything visual requiring camera activation.
+- Use the **identify_person tool** when the user asks who is in front of them or whether they know the person (the camera must be on).
+- Use the **recognize_item tool** when the user asks which banknote they are holding (item_type "currency") or what an everyday object is (item_type "object"). Only fall back to describing the camera image if the tool is unsure.
+- Use the **read_text tool** when the user asks you to read text, a label, a sign, a document or a screen (the camera must be on). Read the result out exactly as written. For long text, the rest is read out automatically.
 - Use the **camera_off tool** when the user wants to stop using the camera or mentions deactivating it.
 - Use the **switch_camera tool** when the user mentions switching views, changing cameras, or needing a different perspective (e.g., front to back camera).
 - Use the **weather tool** when users ask about temperature, rain, heat, clothing suggestions, travel, or planning to go outside.
@@ -125,3 +134,53 @@ Makna kejayaan:
 
 Sentiasa utamakan kejelasan, kegunaan, dan empati.
 """
+
+# Sent in place of an image when the camera view hasn't changed since the last one the model saw
+SCENE_UNCHANGED_NOTE = "[Kamera: pemandangan tidak berubah sejak imej terakhir. Guna imej terakhir yang anda lihat.]"
+
+# Sent in place of an image when no recent frame is clear enough to be useful
+LOW_QUALITY_NOTES = {
+    "dark": "[Kamera: imej terlalu gelap. Minta pengguna cari tempat yang lebih terang atau hidupkan lampu.]",
+    "bright": "[Kamera: imej terlalu terang atau silau. Minta pengguna alihkan kamera dari cahaya terus.]",
+    "blurry": "[Kamera: imej kabur. Minta pengguna pegang telefon dengan stabil dan sedikit jauh dari objek.]",
+    "motion": "[Kamera: imej bergerak terlalu laju. Minta pengguna tahan telefon tanpa bergerak seketika.]",
+}
+
+# Sent with an image that is only part of the camera view (see regions.py)
+CROP_NOTE = (
+    "[Kamera: imej ini potongan {kind} di bahagian {position} bingkai, kira-kira {percent}% daripada pemandangan. "
+    "Jika soalan tentang bahagian lain, minta pengguna halakan kamera ke situ.]"
+)
+CROP_KINDS = {"text": "teks", "face": "wajah", "salient": "objek utama"}
+
+# Sent in place of an image when the worker is too loaded to process camera frames
+VISION_SHED_NOTE = "[Kamera: imej tidak dihantar kerana sistem sedang sibuk. Jika perlu melihat, minta pengguna cuba sebentar lagi.]"
+
+# Added to the turn (and at session start) with snippets recalled from earlier sessions
+MEMORY_NOTE = "[Ingatan daripada perbualan terdahulu dengan pengguna ini. Guna hanya jika berkaitan:\n{memories}]"
+
+# Scene watcher triage: a one-shot image check that decides whether a change is worth interrupting the user for
+SCENE_TRIAGE_PROMPTS = {
+    "obstacle": (
+        "Imej ini daripada kamera telefon seorang pengguna cacat penglihatan yang sedang berjalan. Sesuatu baru "
+        "muncul atau menghampiri di hadapannya. Tetapkan alert=true HANYA jika ada halangan atau bahaya sebenar "
+        "di laluannya, dan tulis message sebagai SATU ayat amaran pendek dalam Bahasa Melayu dengan arah dan jarak "
+        "(contoh: \"Awas, ada kerusi di depan kiri, kira-kira dua langkah.\"). Jika tiada bahaya, alert=false dan "
+        "message kosong."
+    ),
+    "scene": (
+        "Imej ini daripada kamera telefon seorang pengguna cacat penglihatan; pemandangannya baru sahaja berubah "
+        "dengan ketara. Tetapkan alert=true HANYA jika ada sesuatu yang pengguna perlu tahu sekarang (bahaya, "
+        "pintu, tangga, lintasan, atau tempat baharu yang jelas), dan tulis message sebagai SATU ayat pendek dalam "
+        "Bahasa Melayu. Jika tiada yang penting, alert=false dan message kosong."
+    ),
+}
+
+# Spoken when the watcher sees an obstacle but no triage model is configured
+SCENE_OBSTACLE_WARNING = "Awas, ada sesuatu di hadapan anda."
+
+# For realtime models, which can't speak fixed text: relay a scene alert word for word
+SCENE_ALERT_SPEAK = "Sampaikan amaran ini kepada pengguna, tepat seperti tertulis, tanpa tambahan:\n{message}"
+
+# Instructions for speaking the rest of a long text read_text is still recognizing
+READ_TEXT_CONTINUE = "Teruskan membaca teks daripada kamera kepada pengguna, tepat seperti tertulis, tanpa pengenalan atau ulasan:\n{text}"
@@ -0,0 +1,418 @@
+from dotenv import load_dotenv
+import fcntl
+import importlib
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def _plugin(name: str):
+    return importlib.import_module(f"livekit.plugins.{name}")
+
+
+def _gemini_live() -> Dict[str, Any]:
+    # so far this model is good at calling tools, and great for vision
+    # "gemini-2.5-flash-preview-native-audio-dialog": the best model for now, but very expensive, bad for calling tools
+    # "gemini-2.5-flash-exp-native-audio-thinking-dialog": best for speech and vision, bad for calling tools
+    return {
+        "llm": _plugin("google").beta.realtime.RealtimeModel(
+            voice=os.getenv("GEMINI_VOICE", "Leda"),
+            model=os.getenv("GEMINI_MODEL", "gemini-live-2.5-flash-preview"),
+        ),
+    }
+
+
+def _openai_realtime() -> Dict[str, Any]:
+    # Very good at calling tools, but no vision
+    return {
+        "llm": _plugin("openai").realtime.RealtimeModel(
+            model=os.getenv("OPENAI_REALTIME_MODEL", "gpt-4o-realtime-preview-2025-06-03"),
+            voice=os.getenv("OPENAI_VOICE", "sage"),
+            modalities=["audio", "text"],
+        ),
+    }
+
+
+def _deepgram_rime() -> Dict[str, Any]:
+    # Cascaded pipeline: deepgram STT -> text LLM -> rime TTS
+    return {
+        "stt": _plugin("deepgram").STT(),
+        "llm": _plugin("openai").LLM(model=os.getenv("PIPELINE_LLM_MODEL", "gpt-4o-mini")),
+        "tts": _plugin("rime").TTS(),
+    }
+
+
+@dataclass
+class ProviderSpec:
+    name: str
+    plugins: List[str]
+    build: Callable[[], Dict[str, Any]]
+    supports_vision: bool = True
+
+
+PROVIDERS: Dict[str, ProviderSpec] = {
+    "gemini-live": ProviderSpec("gemini-live", ["google"], _gemini_live),
+    "openai-realtime": ProviderSpec("openai-realtime", ["openai"], _openai_realtime, supports_vision=False),
+    "deepgram-rime": ProviderSpec("deepgram-rime", ["deepgram", "openai", "rime"], _deepgram_rime, supports_vision=False),
+}
+
+
+@dataclass
+class RouterConfig:
+    # provider -> traffic weight, e.g. AGENT_PROVIDERS="gemini-live=90,openai-realtime=10"
+    weights: Dict[str, float] = field(default_factory=lambda: {"gemini-live": 1.0})
+    # Tried in order when every weighted provider is degraded
+    fallback: List[str] = field(default_factory=lambda: ["gemini-live"])
+    window: int = 50
+    min_samples: int = 10
+    max_p95_ms: float = 2500.0
+    min_tool_success: float = 0.8
+    # A degraded provider gets traffic again after this long, to re-measure it
+    cooldown_seconds: float = 300.0
+    # Shared by every job process of the worker (and workers on the same host), so stats
+    # from one-session processes add up to something routing can act on
+    state_dir: str = field(default_factory=lambda: os.path.join(tempfile.gettempdir(), "visora-providers"))
+
+    @classmethod
+    def from_env(cls) -> "RouterConfig":
+        weights = {}
+        for entry in os.getenv("AGENT_PROVIDERS", "gemini-live=1").split(","):
+            name, _, weight = entry.strip().partition("=")
+            if name:
+                weights[name] = float(weight or 1)
+        fallback = [n.strip() for n in os.getenv("AGENT_PROVIDER_FALLBACK", ",".join(weights)).split(",") if n.strip()]
+        unknown = [name for name in list(weights) + fallback if name not in PROVIDERS]
+        if unknown:
+            raise ValueError(f"Unknown providers {unknown}; available: {list(PROVIDERS)}")
+        config = cls(
+            weights=weights,
+            fallback=fallback,
+            min_samples=int(os.getenv("PROVIDER_MIN_SAMPLES", "10")),
+            max_p95_ms=float(os.getenv("PROVIDER_MAX_P95_MS", "2500")),
+            min_tool_success=float(os.getenv("PROVIDER_MIN_TOOL_SUCCESS", "0.8")),
+            cooldown_seconds=float(os.getenv("PROVIDER_COOLDOWN_SECONDS", "300")),
+        )
+        if os.getenv("PROVIDER_STATE_DIR"):
+            config.state_dir = os.getenv("PROVIDER_STATE_DIR")
+        return config
+
+
+@dataclass
+class ProviderStats:
+    """Rolling first-audio latency and tool-call outcomes for one provider, across every job process."""
+
+    latencies_ms: List[float] = field(default_factory=list)
+    tool_results: List[bool] = field(default_factory=list)
+    sessions: int = 0
+    errors: int = 0
+    # Wall-clock time of the last degradation; samples before it don't count any more
+    degraded_at: Optional[float] = None
+
+    def percentile(self, q: int) -> Optional[float]:
+        if len(self.latencies_ms) < 2:
+            return None
+        return statistics.quantiles(self.latencies_ms, n=100, method="inclusive")[q - 1]
+
+    @property
+    def tool_success(self) -> Optional[float]:
+        if not self.tool_results:
+            return None
+        return sum(self.tool_results) / len(self.tool_results)
+
+    def summary(self) -> dict:
+        return {
+            "sessions": self.sessions,
+            "errors": self.errors,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "tool_success": self.tool_success,
+            "degraded_at": self.degraded_at,
+        }
+
+
+class ProviderStatsStore:
+    """
+    Provider samples in state_dir, one append-only JSON-lines file per
+    provider, shared by every job process so routing sees the whole worker
+    even though each process only ever runs one session.
+
+    Nothing here touches the disk on the event loop. append() only buffers;
+    a daemon thread writes the buffer every FLUSH_INTERVAL under an exclusive
+    file lock, re-reads each provider's file into the stats load() returns,
+    and then calls on_refresh(name), where the router checks for
+    degradation. Files are trimmed to the newest lines once they grow past
+    MAX_LINES.
+    """
+
+    MAX_LINES = 2000
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, state_dir: str, window: int, on_refresh: Optional[Callable[[str], None]] = None) -> None:
+        self.state_dir = state_dir
+        self.window = window
+        self.on_refresh = on_refresh
+        self._pending: Dict[str, List[str]] = {}
+        self._stats: Dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.state_dir, f"{name}.jsonl")
+
+    def _ensure_thread(self) -> None:
+        # Per process: the router is built at import, and job processes may be forked from the worker
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="provider_stats", daemon=True)
+                self._thread.start()
+
+    def append(self, name: str, kind: str, value: Any = None) -> None:
+        """Buffer a sample for the next flush; cheap enough for session event handlers."""
+        line = json.dumps({"t": time.time(), "kind": kind, "value": value}) + "\n"
+        with self._lock:
+            self._pending.setdefault(name, []).append(line)
+        self._ensure_thread()
+
+    def load(self, name: str) -> ProviderStats:
+        """Stats as of the last refresh. Only the first call for a provider reads its file."""
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = self._read(name)
+            self._ensure_thread()
+            if self.on_refresh is not None:
+                self.on_refresh(name)
+        return self._stats[name]
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for name, lines in pending.items():
+            path = self._path(name)
+            with open(f"{path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+                if os.path.getsize(path) > self.MAX_LINES * 80:
+                    with open(path, encoding="utf-8") as f:
+                        kept = f.readlines()[-self.MAX_LINES // 2:]
+                    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                        f.writelines(kept)
+                    os.replace(f"{path}.tmp", path)
+            self._stats.setdefault(name, ProviderStats())
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            try:
+                self.flush()
+                self._refresh()
+            except Exception as e:
+                logger.warning(f"Provider stats flush failed: {e}")
+
+    def _refresh(self) -> None:
+        for name in list(self._stats):
+            previous, stats = self._stats[name], self._read(name)
+            # A degradation marked locally since the last flush is still in the buffer
+            if previous.degraded_at is not None and (stats.degraded_at or 0.0) < previous.degraded_at:
+                stats.degraded_at = previous.degraded_at
+            self._stats[name] = stats
+            if self.on_refresh is not None:
+                self.on_refresh(name)
+
+    def _read(self, name: str) -> ProviderStats:
+        records = []
+        try:
+            with open(self._path(name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A line being appended right now
+                        continue
+        except FileNotFoundError:
+            pass
+        stats = ProviderStats()
+        for record in records:
+            if record["kind"] == "degraded":
+                stats.degraded_at = record["t"]
+        since = stats.degraded_at or 0.0
+        for record in records:
+            kind = record["kind"]
+            if kind == "session":
+                stats.sessions += 1
+            elif kind == "error":
+                stats.errors += 1
+            elif record["t"] <= since:
+                continue
+            elif kind == "latency":
+                stats.latencies_ms.append(record["value"])
+            elif kind == "tool":
+                stats.tool_results.append(bool(record["value"]))
+        stats.latencies_ms = stats.latencies_ms[-self.window:]
+        stats.tool_results = stats.tool_results[-self.window:]
+        return stats
+
+
+class ProviderRouter:
+    """
+    Picks the LLM/STT/TTS stack for each session from configuration.
+
+    Traffic is split by weight and is sticky per room, so A/B cohorts are
+    stable across reconnects. Each provider's rolling p95 first-audio latency
+    and tool-call success are pooled across job processes in a
+    ProviderStatsStore. A provider that degrades stops getting new sessions
+    until its cooldown passes; sessions already on it fail over to the next
+    healthy provider at their next pause, or at once on an unrecoverable
+    model error.
+    """
+
+    def __init__(self, config: Optional[RouterConfig] = None) -> None:
+        self.config = config or RouterConfig.from_env()
+        # Degradation is checked on the store's flush thread, never in a session's event handlers
+        self.store = ProviderStatsStore(self.config.state_dir, self.config.window, on_refresh=self._check)
+        self.names = sorted(set(self.config.weights) | set(self.config.fallback))
+
+    def required_plugins(self) -> List[str]:
+        plugins = []
+        for name in list(self.config.weights) + self.config.fallback:
+            plugins += [p for p in PROVIDERS[name].plugins if p not in plugins]
+        return plugins
+
+    def is_healthy(self, name: str) -> bool:
+        # Past the cooldown it gets traffic again; only samples since the degradation count
+        degraded_at = self.store.load(name).degraded_at
+        return degraded_at is None or time.time() - degraded_at >= self.config.cooldown_seconds
+
+    def choose(self, room_name: str) -> str:
+        healthy = {name: weight for name, weight in self.config.weights.items() if weight > 0 and self.is_healthy(name)}
+        if healthy:
+            # Stable per-room point in [0, 1) so a room always lands in the same cohort
+            point = zlib.crc32(room_name.encode()) / 2**32
+            total = sum(healthy.values())
+            cumulative = 0.0
+            for name, weight in healthy.items():
+                cumulative += weight / total
+                if point < cumulative:
+                    return name
+            return name
+        return self.next_provider(exclude=None)
+
+    def next_provider(self, exclude: Optional[str]) -> str:
+        """First healthy fallback other than exclude; if none, the fallback with the lowest p95."""
+        candidates = [name for name in self.config.fallback if name != exclude]
+        for name in candidates:
+            if self.is_healthy(name):
+                return name
+        if not candidates:
+            return exclude
+        return min(candidates, key=lambda name: self.store.load(name).percentile(95) or float("inf"))
+
+    def build(self, name: str) -> Dict[str, Any]:
+        """Agent keyword arguments (llm and, for pipelines, stt/tts) for a provider."""
+        return PROVIDERS[name].build()
+
+    def summary(self) -> Dict[str, dict]:
+        return {name: self.store.load(name).summary() for name in self.names}
+
+    def record_session(self, name: str) -> None:
+        self.store.append(name, "session")
+
+    def record_latency(self, name: str, latency_ms: float) -> None:
+        self.store.append(name, "latency", round(latency_ms, 1))
+
+    def record_tool_call(self, name: str, success: bool) -> None:
+        self.store.append(name, "tool", success)
+
+    def flush(self) -> None:
+        """Write buffered samples now (job shutdown); blocking, so call it from a thread."""
+        self.store.flush()
+
+    def record_error(self, name: str) -> None:
+        self.store.append(name, "error")
+        self._degrade(name, "unrecoverable error")
+
+    def _check(self, name: str) -> None:
+        if not self.is_healthy(name):
+            return
+        stats = self.store.load(name)
+        if len(stats.latencies_ms) >= self.config.min_samples:
+            p95 = stats.percentile(95)
+            if p95 > self.config.max_p95_ms:
+                self._degrade(name, f"p95 first audio {p95:.0f} ms")
+                return
+        if len(stats.tool_results) >= self.config.min_samples and stats.tool_success < self.config.min_tool_success:
+            self._degrade(name, f"tool success {stats.tool_success:.0%}")
+
+    def _degrade(self, name: str, reason: str) -> None:
+        logger.warning(f"Provider {name} degraded ({reason}); routing new sessions elsewhere")
+        self.store.append(name, "degraded", reason)
+        # Effective in this process at once, in everyone else's after the next flush
+        self.store.load(name).degraded_at = time.time()
+
+    def attach(self, session, name: str, on_failover: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Measure a session running on provider name. First-audio latency is the
+        time from the user finishing speaking to the agent starting to speak.
+        on_failover(next_provider) is called on an unrecoverable model error,
+        or when the agent is back to listening and its provider has degraded
+        (from any session's samples) and a healthy one is available.
+        Measurements from then on count towards the new provider.
+        """
+        self.record_session(name)
+        current = {"provider": name, "user_stopped_at": None}
+
+        def fail_over(next_name: str, reason: str) -> None:
+            failed = current["provider"]
+            logger.warning(f"Failing over session from {failed} to {next_name} ({reason})")
+            current["provider"] = next_name
+            self.record_session(next_name)
+            on_failover(next_name)
+
+        @session.on("user_state_changed")
+        def _on_user_state_changed(ev):
+            if ev.old_state == "speaking" and ev.new_state != "speaking":
+                current["user_stopped_at"] = time.perf_counter()
+
+        @session.on("agent_state_changed")
+        def _on_agent_state_changed(ev):
+            if ev.new_state == "speaking" and current["user_stopped_at"] is not None:
+                latency_ms = (time.perf_counter() - current["user_stopped_at"]) * 1000
+                self.record_latency(current["provider"], latency_ms)
+                current["user_stopped_at"] = None
+            elif ev.new_state == "listening" and on_failover is not None and not self.is_healthy(current["provider"]):
+                # Between turns, so the swap doesn't cut a reply short
+                next_name = self.next_provider(exclude=current["provider"])
+                if next_name != current["provider"] and self.is_healthy(next_name):
+                    fail_over(next_name, "degraded")
+
+        @session.on("function_tools_executed")
+        def _on_tools_executed(ev):
+            for output in ev.function_call_outputs:
+                if output is not None:
+                    self.record_tool_call(current["provider"], not output.is_error)
+
+        @session.on("error")
+        def _on_error(ev):
+            if getattr(ev.error, "recoverable", True):
+                return
+            failed = current["provider"]
+            self.record_error(failed)
+            next_name = self.next_provider(exclude=failed)
+            if on_failover is not None and next_name != failed:
+                fail_over(next_name, "unrecoverable error")
@@ -0,0 +1,181 @@
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from livekit import rtc
+
+from vision import frame_to_bgr, run_in_vision_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClassifierSpec:
+    model_path: str
+    labels_path: str
+    input_size: int = 224
+    # Per-channel RGB mean/std in 0-255 units, ImageNet defaults
+    mean: Tuple[float, float, float] = (123.675, 116.28, 103.53)
+    std: Tuple[float, float, float] = (58.395, 57.12, 57.375)
+    min_confidence: float = 0.5
+
+
+# Label files hold one spoken label per line, in model output order, phrased to follow
+# "This is ..." (e.g. "a 50,000 rupiah note", "a cup"). "none" is the background class.
+CLASSIFIERS: Dict[str, ClassifierSpec] = {
+    "currency": ClassifierSpec(
+        model_path=os.getenv("CURRENCY_MODEL", "models/banknotes_idr_myr.onnx"),
+        labels_path=os.getenv("CURRENCY_LABELS", "models/banknotes_idr_myr.txt"),
+        min_confidence=float(os.getenv("CURRENCY_MIN_CONFIDENCE", "0.6")),
+    ),
+    "object": ClassifierSpec(
+        model_path=os.getenv("OBJECT_MODEL", "models/household_objects.onnx"),
+        labels_path=os.getenv("OBJECT_LABELS", "models/household_objects.txt"),
+        min_confidence=float(os.getenv("OBJECT_MIN_CONFIDENCE", "0.4")),
+    ),
+}
+
+# Requests arriving within this window share one forward pass. Batching only pays off when several
+# sessions share the process; with one job per process it just adds latency, so it is off (0) by default
+BATCH_WINDOW_MS = float(os.getenv("RECOGNITION_BATCH_WINDOW_MS", "0"))
+MAX_BATCH = int(os.getenv("RECOGNITION_MAX_BATCH", "8"))
+INPUT_MAX_EDGE = 512
+
+
+@dataclass
+class Prediction:
+    label: str
+    confidence: float
+
+    @property
+    def is_background(self) -> bool:
+        return self.label == "none"
+
+
+class BatchedClassifier:
+    """
+    An OpenCV DNN image classifier with optional micro-batching.
+
+    classify() preprocesses its frame in the vision pool. Without a batching
+    window (the default) it runs the model on that frame directly. With one,
+    the frame is queued: the first request opens the window, and every
+    request that lands in it is stacked into one blob and run in a single
+    forward pass.
+    """
+
+    def __init__(self, spec: ClassifierSpec) -> None:
+        self.spec = spec
+        self._net = cv2.dnn.readNetFromONNX(spec.model_path)
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        with open(spec.labels_path, encoding="utf-8") as f:
+            self.labels = [line.strip() for line in f if line.strip()]
+        # cv2.dnn.Net is not thread-safe
+        self._lock = threading.Lock()
+        self._mean = np.array(spec.mean, dtype=np.float32)
+        self._std = np.array(spec.std, dtype=np.float32)
+        self._pending: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.requests = 0
+
+    def _preprocess(self, frame: rtc.VideoFrame) -> np.ndarray:
+        """Center-cropped, normalized CHW float32 tensor for one frame."""
+        image = frame_to_bgr(frame, INPUT_MAX_EDGE)
+        height, width = image.shape[:2]
+        side = min(height, width)
+        top, left = (height - side) // 2, (width - side) // 2
+        crop = image[top:top + side, left:left + side]
+        size = self.spec.input_size
+        rgb = cv2.cvtColor(cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        tensor = (rgb.astype(np.float32) - self._mean) / self._std
+        return tensor.transpose(2, 0, 1)
+
+    def _forward(self, tensors: List[np.ndarray]) -> List[Prediction]:
+        blob = np.ascontiguousarray(np.stack(tensors))
+        with self._lock:
+            self._net.setInput(blob)
+            logits = self._net.forward().reshape(len(tensors), -1)
+        # Softmax unless the model already outputs probabilities
+        if not np.allclose(logits.sum(axis=1), 1.0, atol=1e-3):
+            logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+            logits /= logits.sum(axis=1, keepdims=True)
+        best = logits.argmax(axis=1)
+        return [Prediction(self.labels[i], float(logits[row, i])) for row, i in enumerate(best.tolist())]
+
+    async def classify(self, frame: rtc.VideoFrame) -> Prediction:
+        tensor = await run_in_vision_pool(self._preprocess, frame)
+        self.requests += 1
+        if BATCH_WINDOW_MS <= 0:
+            self.batches += 1
+            return (await run_in_vision_pool(self._forward, [tensor]))[0]
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((tensor, future))
+        if len(self._pending) >= MAX_BATCH:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(BATCH_WINDOW_MS / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending[:MAX_BATCH], self._pending[MAX_BATCH:]
+        if not batch:
+            return
+        self.batches += 1
+        task = asyncio.ensure_future(run_in_vision_pool(self._forward, [tensor for tensor, _ in batch]))
+        task.add_done_callback(lambda t: _resolve(t, [future for _, future in batch]))
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(BATCH_WINDOW_MS / 1000, self._flush)
+
+
+def _resolve(task: asyncio.Future, futures: List[asyncio.Future]) -> None:
+    # One job per process, so the batch and every caller share the same loop
+    error = task.exception()
+    results = task.result() if error is None else [None] * len(futures)
+    for future, result in zip(futures, results):
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+_classifiers: Dict[str, BatchedClassifier] = {}
+
+
+def load_classifiers() -> Dict[str, BatchedClassifier]:
+    """Load every classifier whose model files exist. Called once per worker from prewarm."""
+    for kind, spec in CLASSIFIERS.items():
+        if kind in _classifiers:
+            continue
+        if not (os.path.exists(spec.model_path) and os.path.exists(spec.labels_path)):
+            logger.warning(f"{kind} model not found ({spec.model_path}), {kind} recognition disabled")
+            continue
+        _classifiers[kind] = BatchedClassifier(spec)
+        logger.info(f"Loaded {kind} classifier with {len(_classifiers[kind].labels)} labels")
+    return _classifiers
+
+
+def get_classifier(kind: str) -> Optional[BatchedClassifier]:
+    return _classifiers.get(kind)
+
+
+def describe_prediction(kind: str, prediction: Prediction, min_confidence: float) -> str:
+    if prediction.is_background or prediction.confidence < min_confidence:
+        if kind == "currency":
+            return "I can't make out a banknote clearly. Try holding the note flat, closer to the camera, in good light."
+        return "I'm not sure what this is. Try moving the object closer to the camera."
+    certainty = "" if prediction.confidence >= 0.85 else "probably "
+    return f"This is {certainty}{prediction.label}."
@@ -0,0 +1,241 @@
+from dotenv import load_dotenv
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Long edge of the copy the detectors look at; boxes are mapped back to the full frame
+ANALYSIS_EDGE = 640
+
+# OpenCV Zoo text detector (text_detection_db); without it a gradient heuristic finds text-like blocks
+TEXT_MODEL = os.getenv("VISION_TEXT_MODEL", "models/text_detection_en_ppocrv3_2023may.onnx")
+
+# What the user asked decides what the image needs: words to read, a face, or the whole scene
+_TEXT_WORDS = re.compile(
+    r"\b(baca|bacakan|tulis|tulisan|teks|label|harga|tarikh|tanggal|nombor|nomor|angka|wang|uang|duit|"
+    r"ringgit|rupiah|menu|papan|tanda|ubat|obat|resit|struk|tamat|expired|jenama|merek)\b",
+    re.IGNORECASE,
+)
+_FACE_WORDS = re.compile(r"\b(siapa|orang|wajah|muka|kenal)\b", re.IGNORECASE)
+_SCENE_WORDS = re.compile(
+    r"\b(depan|sekeliling|sekitar|jalan|bilik|ruang|ruangan|mana|halangan|pemandangan|suasana)\b",
+    re.IGNORECASE,
+)
+
+
+def turn_focus(text: str) -> str:
+    """"text", "face", "scene" or "auto" for a user's question, from its wording."""
+    if _TEXT_WORDS.search(text):
+        return "text"
+    if _FACE_WORDS.search(text):
+        return "face"
+    if _SCENE_WORDS.search(text):
+        return "scene"
+    return "auto"
+
+
+@dataclass
+class RegionConfig:
+    enabled: bool = True
+    # Long edge for whole-scene questions, which need little detail
+    scene_edge: int = 512
+    # Crops keep source detail up to this edge; a text crop is usually far smaller
+    crop_edge: int = 768
+    # A region covering more of the frame than this isn't worth cropping to
+    max_coverage: float = 0.6
+    # Margin around a region, as a share of its size
+    padding: float = 0.15
+
+    @classmethod
+    def from_env(cls) -> "RegionConfig":
+        return cls(
+            enabled=os.getenv("VISION_ROI_ENABLED", "1") == "1",
+            scene_edge=int(os.getenv("VISION_SCENE_EDGE", "512")),
+            crop_edge=int(os.getenv("VISION_CROP_EDGE", "768")),
+            max_coverage=float(os.getenv("VISION_ROI_MAX_COVERAGE", "0.6")),
+        )
+
+
+@dataclass
+class Region:
+    """A crop of the frame, normalized to 0..1 so it applies at any resolution."""
+
+    kind: str  # "text", "face" or "salient"
+    x: float
+    y: float
+    w: float
+    h: float
+
+    @property
+    def coverage(self) -> float:
+        return self.w * self.h
+
+    @property
+    def position(self) -> str:
+        cx, cy = self.x + self.w / 2, self.y + self.h / 2
+        horizontal = "kiri" if cx < 0.35 else "kanan" if cx > 0.65 else "tengah"
+        vertical = "atas" if cy < 0.35 else "bawah" if cy > 0.65 else "tengah"
+        if vertical == "tengah":
+            return horizontal
+        if horizontal == "tengah":
+            return vertical
+        return f"{horizontal} {vertical}"
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "box": [round(v, 3) for v in (self.x, self.y, self.w, self.h)]}
+
+
+def _union(boxes: np.ndarray) -> Tuple[float, float, float, float]:
+    x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+    x1, y1 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+    return float(x0), float(y0), float(x1 - x0), float(y1 - y0)
+
+
+def spectral_saliency(gray: np.ndarray, size: int = 64) -> np.ndarray:
+    """Spectral-residual saliency map (Hou & Zhang) at size x size, scaled to 0..1."""
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    spectrum = np.fft.fft2(small)
+    log_amplitude = np.log(np.abs(spectrum) + 1e-6)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    saliency = cv2.GaussianBlur(saliency.astype(np.float32), (0, 0), 2.5)
+    return saliency / max(float(saliency.max()), 1e-6)
+
+
+class RegionFinder:
+    """
+    Finds the part of a frame a question is about, so only that part is sent.
+
+    Runs in the vision pool on a small copy of the frame. Text comes from the
+    DB text detector when its model is installed, else from a gradient
+    heuristic that finds blocks of short horizontal strokes; faces from the
+    face engine's detector; anything else from spectral-residual saliency.
+    Returns None when the interesting part is most of the frame anyway.
+    """
+
+    def __init__(self, config: Optional[RegionConfig] = None, text_model: str = TEXT_MODEL) -> None:
+        self.config = config or RegionConfig.from_env()
+        self.analysis_edge = ANALYSIS_EDGE
+        self._text_model_path = text_model
+        self._text_model = None
+        self._text_model_missing = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Load the text detector now (prewarm) rather than on the first text question."""
+        with self._lock:
+            self._load_text_model()
+
+    def edge_for(self, focus: str, region: Optional[Region], default_edge: int) -> int:
+        if region is not None:
+            return self.config.crop_edge
+        if focus == "scene":
+            return self.config.scene_edge
+        return default_edge
+
+    def find(self, image: np.ndarray, focus: str) -> Optional[Region]:
+        """Region of a BGR image (ideally ANALYSIS_EDGE on its long side) to crop to, or None."""
+        if not self.config.enabled or focus == "scene":
+            return None
+        if focus == "text":
+            boxes, kind = self.text_boxes(image), "text"
+        elif focus == "face":
+            boxes, kind = self._face_boxes(image), "face"
+        else:
+            # Text first: labels, screens and signs are most of what users hold up
+            boxes, kind = self.text_boxes(image), "text"
+            if len(boxes) == 0:
+                boxes, kind = self._salient_boxes(image), "salient"
+        if len(boxes) == 0:
+            return None
+        return self._to_region(boxes, kind, image.shape)
+
+    def _to_region(self, boxes: np.ndarray, kind: str, shape: tuple) -> Optional[Region]:
+        height, width = shape[:2]
+        x, y, w, h = _union(boxes)
+        pad_x, pad_y = w * self.config.padding + 8, h * self.config.padding + 8
+        x0, y0 = max(0.0, x - pad_x), max(0.0, y - pad_y)
+        x1, y1 = min(float(width), x + w + pad_x), min(float(height), y + h + pad_y)
+        region = Region(kind, x0 / width, y0 / height, (x1 - x0) / width, (y1 - y0) / height)
+        if region.coverage > self.config.max_coverage:
+            return None
+        return region
+
+    def text_boxes(self, image: np.ndarray) -> np.ndarray:
+        """(x, y, w, h) boxes of text lines in a BGR image."""
+        with self._lock:
+            # One shared DNN, loaded on first use and run by one vision thread at a time
+            model = self._load_text_model()
+            polygons = model.detect(image)[0] if model is not None else None
+        if polygons is not None:
+            if len(polygons) == 0:
+                return np.zeros((0, 4), dtype=np.float32)
+            return np.array([cv2.boundingRect(np.asarray(p, dtype=np.int32)) for p in polygons], dtype=np.float32)
+        return self._text_boxes_heuristic(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+
+    def _load_text_model(self):
+        if self._text_model is None and not self._text_model_missing:
+            if not os.path.exists(self._text_model_path):
+                logger.info(f"Text detector model not found ({self._text_model_path}), using gradient heuristic")
+                self._text_model_missing = True
+                return None
+            model = cv2.dnn_TextDetectionModel_DB(self._text_model_path)
+            model.setBinaryThreshold(0.3).setPolygonThreshold(0.5).setMaxCandidates(200).setUnclipRatio(2.0)
+            model.setInputParams(1.0 / 255.0, (736, 736), (122.67891434, 116.66876762, 104.00698793))
+            self._text_model = model
+        return self._text_model
+
+    @staticmethod
+    def _text_boxes_heuristic(gray: np.ndarray) -> np.ndarray:
+        height, width = gray.shape
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+        otsu, _ = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        # Printed text is high contrast; the floor keeps Otsu from splitting soft texture into "strokes"
+        _, binary = cv2.threshold(gradient, max(otsu, 48), 255, cv2.THRESH_BINARY)
+        # Remove long straight edges (label borders, shelves, door frames) so they don't join up lines
+        for size in ((width // 10, 1), (1, height // 6)):
+            edges = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, size))
+            binary = cv2.subtract(binary, edges)
+        # Join the characters of a line into one blob
+        lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+        contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if not (0.015 * height <= h <= 0.15 * height and w >= 2.5 * h and w >= 0.04 * width):
+                continue
+            # Text lines are dense with strokes; outlines of objects are not
+            if cv2.countNonZero(binary[y:y + h, x:x + w]) < 0.25 * w * h:
+                continue
+            boxes.append((x, y, w, h))
+        return np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+    @staticmethod
+    def _face_boxes(image: np.ndarray) -> np.ndarray:
+        from faces import get_face_engine
+
+        engine = get_face_engine()
+        if engine is None:
+            return np.zeros((0, 4), dtype=np.float32)
+        return engine.detect(image)
+
+    @staticmethod
+    def _salient_boxes(image: np.ndarray, size: int = 64) -> np.ndarray:
+        saliency = spectral_saliency(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), size)
+        mask = (saliency > min(0.5, 3 * float(saliency.mean()))).astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        if count <= 1:
+            return np.zeros((0, 4), dtype=np.float32)
+        # Largest salient blob, mapped back from size x size
+        x, y, w, h, _ = stats[1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))]
+        height, width = image.shape[:2]
+        return np.array([[x * width / size, y * height / size, w * width / size, h * height / size]], dtype=np.float32)
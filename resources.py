@@ -0,0 +1,89 @@
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def import_plugins(names: str) -> Dict[str, Any]:
+    """Import livekit.plugins.<name> for each name in a comma-separated list."""
+    plugins = {}
+    for name in filter(None, (n.strip() for n in names.split(","))):
+        plugins[name] = importlib.import_module(f"livekit.plugins.{name}")
+    return plugins
+
+
+class ResourceRegistry:
+    """
+    Heavy per-worker resources, loaded once and shared read-only by every session.
+
+    Sync loaders (models, plugin objects) run in prewarm, before the process
+    accepts a job. Async warmers (connection pools) are bound to the job's
+    event loop, so they run in the background as soon as a job starts.
+    Every load is timed for the startup report.
+    """
+
+    def __init__(self) -> None:
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._warmers: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._resources: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+
+    def register_async(self, name: str, warmer: Callable[[], Awaitable[Any]]) -> None:
+        self._warmers[name] = warmer
+
+    def get(self, name: str) -> Any:
+        """The loaded resource; loads it now if prewarm didn't."""
+        if name not in self._resources:
+            started = time.perf_counter()
+            self._resources[name] = self._loaders[name]()
+            self.timings[name] = time.perf_counter() - started
+        return self._resources[name]
+
+    def load_all(self) -> None:
+        for name in self._loaders:
+            try:
+                self.get(name)
+            except Exception as e:
+                # A missing optional model must not keep the worker from starting
+                logger.error(f"Failed to prewarm {name}: {e}")
+
+    async def warm_async(self) -> None:
+        async def warm(name: str, warmer: Callable[[], Awaitable[Any]]) -> None:
+            started = time.perf_counter()
+            try:
+                await warmer()
+            except Exception as e:
+                logger.warning(f"Failed to warm {name}: {e}")
+                return
+            self.timings[name] = time.perf_counter() - started
+
+        await asyncio.gather(*(warm(name, warmer) for name, warmer in self._warmers.items()))
+
+
+class StartupReport:
+    """Where a worker's cold start went: imports, prewarm, and the first spoken reply of each job."""
+
+    def __init__(self, registry: ResourceRegistry, import_seconds: float) -> None:
+        self.registry = registry
+        self.import_seconds = import_seconds
+        self.prewarm_seconds: Optional[float] = None
+
+    def log_prewarm(self, seconds: float) -> None:
+        self.prewarm_seconds = seconds
+        breakdown = ", ".join(f"{name} {t:.2f}s" for name, t in self.registry.timings.items())
+        logger.info(f"Startup: imports {self.import_seconds:.2f}s, prewarm {seconds:.2f}s ({breakdown})")
+
+    def log_first_reply(self, job_started_at: float) -> None:
+        first_reply = time.perf_counter() - job_started_at
+        breakdown = ", ".join(f"{name} {t:.2f}s" for name, t in self.registry.timings.items())
+        prewarm = f"{self.prewarm_seconds:.2f}s" if self.prewarm_seconds is not None else "not run"
+        logger.info(
+            f"Startup: first reply {first_reply:.2f}s after job start "
+            f"(imports {self.import_seconds:.2f}s, prewarm {prewarm}; {breakdown})"
+        )
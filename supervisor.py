@@ -0,0 +1,158 @@
+from dotenv import load_dotenv
+import asyncio
+import inspect
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from telemetry import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Resources registered under this prefix are counted as open video streams
+VIDEO_STREAM_PREFIX = "video_stream_"
+
+_live: Dict[int, "SessionSupervisor"] = {}
+_live_lock = threading.Lock()
+
+
+def live_totals() -> Dict[str, int]:
+    """Counts summed over every live session in this process, plus the number of sessions."""
+    with _live_lock:
+        supervisors = list(_live.values())
+    totals = {"tasks": 0, "resources": 0, "video_streams": 0, "buffer_bytes": 0}
+    for supervisor in supervisors:
+        for kind, value in supervisor.counts().items():
+            totals[kind] += value
+    totals["sessions"] = len(supervisors)
+    return totals
+
+
+def _collect_counts() -> Dict[tuple, float]:
+    return {(kind,): value for kind, value in live_totals().items() if kind != "sessions"}
+
+
+metrics.gauge("visora_sessions_active", "Sessions with a live supervisor", lambda: {(): len(_live)})
+metrics.gauge(
+    "visora_session_resources", "Tasks, open resources and buffered bytes held by live sessions",
+    _collect_counts, labels=("kind",),
+)
+
+
+class SessionSupervisor:
+    """
+    Owns everything a session starts in the background: tasks, open channels
+    and streams, and frame buffers.
+
+    Every task holds a strong reference until it finishes, so nothing is
+    garbage-collected mid-flight. Optional tasks are refused once the session
+    has max_tasks running. Buffers report their size for accounting, and
+    owners bound themselves with max_buffer_bytes. aclose() (on room
+    disconnect or job shutdown) closes resources newest first, then cancels
+    whatever tasks are left.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        max_tasks: Optional[int] = None,
+        max_buffer_bytes: Optional[int] = None,
+    ) -> None:
+        self.session_id = session_id
+        self.max_tasks = max_tasks if max_tasks is not None else int(os.getenv("SESSION_MAX_TASKS", "64"))
+        self.max_buffer_bytes = (
+            max_buffer_bytes if max_buffer_bytes is not None
+            else int(os.getenv("SESSION_MAX_FRAME_MB", "16")) * 2**20
+        )
+        self._tasks: Set[asyncio.Task] = set()
+        self._resources: Dict[str, Callable[[], Any]] = {}
+        self._buffers: Dict[str, Callable[[], int]] = {}
+        self._close_task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.refused = 0
+        with _live_lock:
+            _live[id(self)] = self
+
+    def spawn(self, coro: Awaitable, name: str, essential: bool = False) -> Optional[asyncio.Task]:
+        """
+        Run coro as a tracked task. Optional work is dropped (None) once closing
+        starts or at the task cap; essential work only once closed.
+        """
+        closing = self._close_task is not None
+        if self.closed or (not essential and (closing or len(self._tasks) >= self.max_tasks)):
+            coro.close()
+            self.refused += 1
+            logger.warning(f"Session {self.session_id}: refused task {name} ({len(self._tasks)} running)")
+            return None
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def register(self, name: str, closer: Callable[[], Any]) -> None:
+        """Close this resource (sync or async closer) when the session ends."""
+        self._resources[name] = closer
+
+    def release(self, name: str) -> Optional[Callable[[], Any]]:
+        """Stop tracking a resource its owner is closing itself; returns its closer."""
+        return self._resources.pop(name, None)
+
+    def register_buffer(self, name: str, size: Callable[[], int]) -> None:
+        self._buffers[name] = size
+
+    def unregister_buffer(self, name: str) -> None:
+        self._buffers.pop(name, None)
+
+    @property
+    def buffer_bytes(self) -> int:
+        return sum(size() for size in list(self._buffers.values()))
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "tasks": len(self._tasks),
+            "resources": len(self._resources),
+            "video_streams": sum(1 for name in self._resources if name.startswith(VIDEO_STREAM_PREFIX)),
+            "buffer_bytes": self.buffer_bytes,
+        }
+
+    def close_soon(self) -> None:
+        """Start closing from a sync callback (e.g. the room's disconnected event)."""
+        if self._close_task is None:
+            self._close_task = asyncio.create_task(self._close(), name=f"supervisor_close_{self.session_id}")
+
+    async def aclose(self) -> None:
+        self.close_soon()
+        await asyncio.shield(self._close_task)
+
+    async def _close(self, timeout: float = 5.0) -> None:
+        leftover = self.counts()
+        for name in reversed(list(self._resources)):
+            closer = self._resources.pop(name, None)
+            if closer is None:
+                # Released by an earlier closer
+                continue
+            try:
+                result = closer()
+                if inspect.isawaitable(result):
+                    await asyncio.wait_for(result, timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Session {self.session_id}: closing {name} failed: {e}")
+        self._buffers.clear()
+
+        tasks = [task for task in self._tasks if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning(f"Session {self.session_id}: {len(pending)} tasks ignored cancellation")
+        self.closed = True
+        with _live_lock:
+            _live.pop(id(self), None)
+        logger.info(
+            f"Session {self.session_id} closed: {leftover['tasks']} tasks, {leftover['resources']} resources, "
+            f"{leftover['buffer_bytes'] / 2**20:.1f} MB buffered at close; {self.refused} tasks refused"
+        )
@@ -0,0 +1,361 @@
+from dotenv import load_dotenv
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers everything from a fast EOU decision to a slow web search
+DEFAULT_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            # [bucket counts..., count, sum]
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            labels = [f'{name}="{value}"' for name, value in zip(self.label_names, key)]
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_count{suffix} {values[-2]}")
+            lines.append(f"{self.name}_sum{suffix} {values[-1]:.6f}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            labels = ",".join(f'{name}="{v}"' for name, v in zip(self.label_names, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from collect(), which returns {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Dict[Tuple[str, ...], float]], labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in self.collect().items():
+            labels = ",".join(f'{name}="{v}"' for name, v in zip(self.label_names, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: list = []
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, collect: Callable[[], Dict[Tuple[str, ...], float]], labels: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, help, collect, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+TURN_LATENCY = metrics.histogram(
+    "visora_turn_first_audio_seconds", "User end of speech to first agent audio, per turn"
+)
+TURN_SPANS = metrics.histogram(
+    "visora_turn_span_seconds", "Duration of each stage of a voice turn", labels=("span",)
+)
+TOOL_LATENCY = metrics.histogram(
+    "visora_tool_seconds", "Function tool execution time", labels=("tool", "outcome")
+)
+SLOW_TURNS = metrics.counter("visora_slow_turns_total", "Turns slower than SLOW_TURN_MS")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server() -> Optional[int]:
+    """
+    Serve /metrics on a daemon thread, so scrapes keep working while the event
+    loop is busy. Each job process is its own worker, so the first free port in
+    METRICS_PORT .. METRICS_PORT + METRICS_PORT_RANGE - 1 is used. 0 disables.
+    """
+    global _server
+    if _server is not None:
+        return _server.server_address[1]
+    base_port = int(os.getenv("METRICS_PORT", "9464"))
+    if base_port <= 0:
+        return None
+    host = os.getenv("METRICS_HOST", "127.0.0.1")
+    for port in range(base_port, base_port + int(os.getenv("METRICS_PORT_RANGE", "16"))):
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError:
+            continue
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics_http", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return port
+    logger.warning(f"No free metrics port in range starting at {base_port}; metrics not exported")
+    return None
+
+
+# What each task is doing right now (innermost last), so a loop stall can name its culprit
+_task_activities: "weakref.WeakKeyDictionary[asyncio.Task, List[str]]" = weakref.WeakKeyDictionary()
+
+
+@contextmanager
+def activity(label: str):
+    """Mark the current task as running label (a tool, hook or span) for stall attribution."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is None:
+        yield
+        return
+    stack = _task_activities.setdefault(task, [])
+    stack.append(label)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def task_activity(task: Optional[asyncio.Task]) -> Optional[str]:
+    """The innermost activity of a task; safe to call from another thread."""
+    if task is None:
+        return None
+    stack = _task_activities.get(task)
+    return stack[-1] if stack else None
+
+
+SLOW_TURN_MS = float(os.getenv("SLOW_TURN_MS", "2000"))
+SLOW_TURN_LOG = os.getenv("SLOW_TURN_LOG", "turn_traces.jsonl")
+
+# One writer thread, so trace lines never interleave
+_trace_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="turn_trace")
+
+
+def _append_trace(path: str, line: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+class TurnTrace:
+    """Span timeline of one voice turn, relative to the user's end of speech."""
+
+    def __init__(self) -> None:
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.now(timezone.utc)
+        self.origin = time.perf_counter()
+        self.spans: List[dict] = []
+        self.first_audio_ms: Optional[float] = None
+
+    def add(self, name: str, duration: float, start: Optional[float] = None, **attrs) -> None:
+        start = start if start is not None else time.perf_counter() - duration
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.origin) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+            **attrs,
+        })
+        TURN_SPANS.observe(duration, span=name)
+
+    def to_dict(self, session_id: str) -> dict:
+        return {
+            "session_id": session_id,
+            "turn_id": self.turn_id,
+            "started_at": self.started_at.isoformat(),
+            "first_audio_ms": self.first_audio_ms,
+            "spans": self.spans,
+        }
+
+
+class TurnTracer:
+    """
+    Builds a TurnTrace per turn from AgentSession events.
+
+    A turn starts when VAD reports the end of user speech and ends when the
+    agent goes back to listening after replying. EOU, STT, LLM and TTS timings
+    come from the session's metrics events; frame handling and tool calls are
+    added by span() and timed_tool. Turns slower than SLOW_TURN_MS to first
+    audio are appended to SLOW_TURN_LOG as one JSON line each.
+    """
+
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.current: Optional[TurnTrace] = None
+        self._thinking_at: Optional[float] = None
+
+    def attach(self, session) -> None:
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+        session.on("metrics_collected", self._on_metrics_collected)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        started = time.perf_counter()
+        try:
+            with activity(name):
+                yield
+        finally:
+            if self.current is not None:
+                self.current.add(name, time.perf_counter() - started, start=started, **attrs)
+
+    def _on_user_state_changed(self, ev) -> None:
+        if ev.new_state == "speaking":
+            # Barge-in or a new utterance: whatever was pending is no longer one turn
+            self._finish()
+        elif ev.old_state == "speaking":
+            self.current = TurnTrace()
+
+    def _on_agent_state_changed(self, ev) -> None:
+        trace = self.current
+        if trace is None:
+            return
+        now = time.perf_counter()
+        if ev.new_state == "thinking":
+            self._thinking_at = now
+            trace.add("turn_detection", now - trace.origin, start=trace.origin)
+        elif ev.new_state == "speaking" and trace.first_audio_ms is None:
+            trace.first_audio_ms = round((now - trace.origin) * 1000, 1)
+            TURN_LATENCY.observe(now - trace.origin)
+            if self._thinking_at is not None:
+                trace.add("thinking", now - self._thinking_at, start=self._thinking_at)
+        elif ev.new_state == "listening" and trace.first_audio_ms is not None:
+            self._finish()
+
+    def _on_metrics_collected(self, ev) -> None:
+        trace = self.current
+        if trace is None:
+            return
+        m = ev.metrics
+        kind = getattr(m, "type", None)
+        if kind == "eou_metrics":
+            # Both measured from the end of user speech
+            trace.add("eou_decision", m.end_of_utterance_delay, start=trace.origin)
+            trace.add("transcription", m.transcription_delay, start=trace.origin)
+        elif kind in ("llm_metrics", "realtime_model_metrics") and m.ttft >= 0:
+            trace.add("llm_first_token", m.ttft, model=getattr(m, "label", None))
+        elif kind == "tts_metrics" and m.ttfb >= 0:
+            trace.add("tts_first_audio", m.ttfb)
+
+    def _finish(self) -> None:
+        trace, self.current, self._thinking_at = self.current, None, None
+        if trace is None or trace.first_audio_ms is None or trace.first_audio_ms < SLOW_TURN_MS:
+            return
+        SLOW_TURNS.inc()
+        line = json.dumps(trace.to_dict(self.session_id), default=str)
+        asyncio.get_running_loop().run_in_executor(_trace_executor, _append_trace, SLOW_TURN_LOG, line)
+        logger.warning(f"Slow turn {trace.turn_id}: first audio after {trace.first_audio_ms:.0f} ms")
+
+
+def timed_tool(fn):
+    """
+    Time a function tool into visora_tool_seconds and the current turn's trace.
+    Apply under @function_tool; the wrapped signature is preserved for schema generation.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(context, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with activity(f"tool:{name}"):
+                result = await fn(context, *args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            duration = time.perf_counter() - started
+            TOOL_LATENCY.observe(duration, tool=name, outcome=outcome)
+            tracer = context.userdata.get("turn_tracer")
+            if tracer is not None and tracer.current is not None:
+                tracer.current.add(f"tool:{name}", duration, start=started, outcome=outcome)
+
+    return wrapper
@@ -1,50 +1,81 @@
 from dotenv import load_dotenv
 import logging
-from livekit.agents import function_tool, RunContext
-import requests
-from langchain_community.tools import DuckDuckGoSearchRun
+from livekit.agents import function_tool, RunContext, ToolError
+import aiohttp
 import os
-import smtplib
-from email.mime.multipart import MIMEMultipart  
-from email.mime.text import MIMEText
 from typing import Optional
-from supabase import Client, acreate_client, create_client
-import cv2
-import numpy as np
-from datetime import datetime
-import uuid
-import json
 import asyncio
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from broadcaster import CameraBroadcaster
+from camera import CameraStateStore
+from identity import SessionIdentity, session_id_for_room
+from cache import TTLCache
+from telemetry import timed_tool
 
 load_dotenv()
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_ANON_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+# Heavy modules each tool needs. They are imported on the tool's first call, or
+# ahead of time by warm_tool_dependencies() once the job has connected.
+TOOL_DEPENDENCIES = {
+    "search_web": ["langchain_community.tools"],
+    "identify_person": ["faces"],
+    "recognize_item": ["recognition"],
+    "read_text": ["ocr"],
+}
 
-async def create_async_supabase():
-  supabase = await acreate_client(supabase_url, supabase_key)
-  return supabase
+async def warm_tool_dependencies() -> None:
+    """Import every tool's heavy dependencies in a background thread."""
+    for tool_name, modules in TOOL_DEPENDENCIES.items():
+        for module in modules:
+            try:
+                await asyncio.to_thread(importlib.import_module, module)
+            except Exception as e:
+                logging.warning(f"Failed to warm {module} for {tool_name}: {e}")
 
-import os
-import uuid
-import logging
-from datetime import datetime
-import asyncio
-from supabase import create_client, Client
-from livekit.agents import function_tool
+def get_camera_broadcaster(context: RunContext) -> CameraBroadcaster:
+    """
+    Return the session's long-lived camera broadcaster.
+    entrypoint creates it per room; if a tool runs without one (e.g. a bare
+    session), one is created lazily and attached to the session userdata.
+    """
+    userdata = context.userdata
+    broadcaster = userdata.get("camera_broadcaster")
+    if broadcaster is None:
+        broadcaster = CameraBroadcaster()
+        broadcaster.start()
+        userdata["camera_broadcaster"] = broadcaster
+    return broadcaster
+
+def get_camera_state(context: RunContext) -> CameraStateStore:
+    """The session's camera state; created lazily, like the broadcaster, if entrypoint didn't."""
+    userdata = context.userdata
+    store = userdata.get("camera_state")
+    if store is None:
+        store = CameraStateStore(get_session(context), get_camera_broadcaster(context))
+        userdata["camera_state"] = store
+    return store
 
-# Initialize Supabase client
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_ANON_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+# Shared keep-alive connection pool for outbound HTTP from tools
+_http_session: Optional[aiohttp.ClientSession] = None
 
-async def create_async_supabase():
-    supabase = await acreate_client(supabase_url, supabase_key)
-    return supabase
+def get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+    return _http_session
+
+async def close_http_session() -> None:
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
 
 @function_tool
+@timed_tool
 async def camera_on(context: RunContext, camera_type: str = "user") -> str:
     """
     Turn on the camera for visual assistance. Use this tool when users need to activate their camera for visual help.
@@ -54,33 +85,19 @@ async def camera_on(context: RunContext, camera_type: str = "user") -> str:
         Confirmation message about the camera activation
     """
     try:
-        event_payload = {
-            "action": "on",
-            "camera_type": camera_type,
-            "timestamp": datetime.now().isoformat(),
-            "event_id": str(uuid.uuid4())[:8],
-            "message": "Camera activation requested",
-            "is_enabled": True
-        }
-
-        async_supabase = await create_async_supabase()
-        camera_channel = async_supabase.channel("visora_agent")
-        await camera_channel.subscribe()
-
-        asyncio.create_task(camera_channel.send_broadcast(
-            "camera_states",
-            event_payload
-        ))
-
-        logging.info(f"Broadcast camera ON event: {event_payload}")
         camera_name = "back camera" if camera_type == "environment" else "front camera"
+        if not get_camera_state(context).turn_on(camera_type):
+            return f"The {camera_name} is already on."
+
+        logging.info(f"Queued camera ON event: {camera_type}")
         return f"The {camera_name} is now on and ready to help you see your surroundings."
 
     except Exception as e:
         logging.error(f"Error turning on camera: {e}")
-        return "I'm having trouble turning on the camera right now. Please try again."
+        raise ToolError("I'm having trouble turning on the camera right now. Please try again.") from e
 
 @function_tool
+@timed_tool
 async def camera_off(context: RunContext) -> str:
     """
     Turn off the camera. Use this tool when users want to deactivate their camera.
@@ -88,59 +105,26 @@ async def camera_off(context: RunContext) -> str:
         Confirmation message about the camera deactivation
     """
     try:
-        event_payload = {
-            "action": "off",
-            "timestamp": datetime.now().isoformat(),
-            "event_id": str(uuid.uuid4())[:8],
-            "message": "Camera deactivation requested",
-            "is_enabled": False
-        }
-
-        async_supabase = await create_async_supabase()
-        camera_channel = async_supabase.channel("visora_agent")
-        await camera_channel.subscribe()
-
-        asyncio.create_task(camera_channel.send_broadcast(
-            "camera_states",
-            event_payload
-        ))
-
-        logging.info(f"Broadcast camera OFF event: {event_payload}")
+        if not get_camera_state(context).turn_off():
+            return "The camera is already off."
+
+        logging.info("Queued camera OFF event")
         return "The camera has been turned off."
 
     except Exception as e:
         logging.error(f"Error turning off camera: {e}")
-        return "I'm having trouble turning off the camera right now. Please try again."
+        raise ToolError("I'm having trouble turning off the camera right now. Please try again.") from e
 
 @function_tool
-async def switch_camera(context: RunContext, current_camera_type: str = "user") -> str:
+@timed_tool
+async def switch_camera(context: RunContext) -> str:
     """
     Switch between front and back cameras. Use this tool when users want to change the active camera.
-    Args:
-        current_camera_type: The current camera - "user" for front-facing or "environment" for back camera
     Returns:
         Confirmation message about the camera switch
     """
     try:
-        new_camera_type = "environment" if current_camera_type == "user" else "user"
-        event_payload = {
-            "action": "switch",
-            "camera_type": current_camera_type,
-            "new_camera_type": new_camera_type,
-            "timestamp": datetime.now().isoformat(),
-            "event_id": str(uuid.uuid4())[:8],
-            "message": f"Camera switch requested: {current_camera_type} -> {new_camera_type}",
-            "is_enabled": True
-        }
-
-        async_supabase = await create_async_supabase()
-        camera_channel = async_supabase.channel("visora_agent")
-        await camera_channel.subscribe()
-
-        asyncio.create_task(camera_channel.send_broadcast(
-            "camera_states",
-            event_payload
-        ))
+        new_camera_type = get_camera_state(context).switch()
 
         camera_name = "back camera" if new_camera_type == "environment" else "front camera"
         logging.info(f"Camera switched to {new_camera_type}")
@@ -148,9 +132,25 @@ async def switch_camera(context: RunContext, current_camera_type: str = "user")
 
     except Exception as e:
         logging.error(f"Error switching camera: {e}")
-        return "I'm having trouble switching the camera right now. Please try again."
+        raise ToolError("I'm having trouble switching the camera right now. Please try again.") from e
+
+WEATHER_URL = os.getenv("WEATHER_URL", "https://wttr.in")
+# Per-city current conditions; wttr.in only refreshes every few minutes anyway
+_weather_cache = TTLCache(
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("WEATHER_CACHE_STALE_TTL", "10800")),
+    name="weather",
+)
+
+async def _fetch_current_weather(city: str) -> dict:
+    async with get_http_session().get(f"{WEATHER_URL}/{city}", params={"format": "j1"}) as response:
+        response.raise_for_status()
+        data = await response.json(content_type=None)
+    return data['current_condition'][0]
 
 @function_tool
+@timed_tool
 async def get_weather(
     context: RunContext,
     city: str = "Jakarta"
@@ -167,45 +167,84 @@ async def get_weather(
         Current weather conditions and helpful details for planning activities
     """
     try:
-        response = requests.get(f"https://wttr.in/{city}?format=j1", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            current = data['current_condition'][0]
-            
-            # Create natural weather description
-            temp_c = current['temp_C']
-            feels_like = current['FeelsLikeC']
-            humidity = current['humidity']
-            wind_speed = current['windspeedKmph']
-            weather_desc = current['weatherDesc'][0]['value']
-            
-            # Build conversational weather report
-            description = f"The weather in {city} right now is {weather_desc.lower()}. "
-            description += f"It's {temp_c} degrees Celsius, but feels like {feels_like} degrees. "
-            description += f"Humidity is at {humidity} percent with winds at {wind_speed} kilometers per hour. "
-            
-            # Add helpful suggestions
-            if int(temp_c) >= 30:
-                description += "It's quite warm today, so staying hydrated is important."
-            elif int(temp_c) <= 15:
-                description += "It's cool today, so you might want to bring a jacket."
-            
-            if "rain" in weather_desc.lower():
-                description += " You'll want to bring an umbrella."
-            
-            logging.info(f"Weather data retrieved successfully for {city}")
-            return description.strip()
-        else:
-            logging.warning(f"Weather API returned status {response.status_code} for {city}")
-            return f"I couldn't get weather information for {city} right now. Please try again later."
-    except requests.RequestException as e:
+        current = await _weather_cache.get_or_fetch(
+            city.strip().lower(), lambda: _fetch_current_weather(city)
+        )
+
+        # Create natural weather description
+        temp_c = current['temp_C']
+        feels_like = current['FeelsLikeC']
+        humidity = current['humidity']
+        wind_speed = current['windspeedKmph']
+        weather_desc = current['weatherDesc'][0]['value']
+
+        # Build conversational weather report
+        description = f"The weather in {city} right now is {weather_desc.lower()}. "
+        description += f"It's {temp_c} degrees Celsius, but feels like {feels_like} degrees. "
+        description += f"Humidity is at {humidity} percent with winds at {wind_speed} kilometers per hour. "
+
+        # Add helpful suggestions
+        if int(temp_c) >= 30:
+            description += "It's quite warm today, so staying hydrated is important."
+        elif int(temp_c) <= 15:
+            description += "It's cool today, so you might want to bring a jacket."
+
+        if "rain" in weather_desc.lower():
+            description += " You'll want to bring an umbrella."
+
+        logging.info(f"Weather data retrieved successfully for {city}")
+        return description.strip()
+    except aiohttp.ClientResponseError as e:
+        logging.warning(f"Weather API returned status {e.status} for {city}")
+        raise ToolError(f"I couldn't get weather information for {city} right now. Please try again later.") from e
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.error(f"Network error retrieving weather for {city}: {e}")
-        return f"I'm having trouble connecting to the weather service for {city}."
+        raise ToolError(f"I'm having trouble connecting to the weather service for {city}.") from e
     except Exception as e:
         logging.error(f"Unexpected error retrieving weather for {city}: {e}")
-        return f"Something went wrong while getting weather information for {city}."
+        raise ToolError(f"Something went wrong while getting weather information for {city}.") from e
+
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "8"))
+# Roughly 30 seconds of speech; longer payloads only inflate the realtime model's context
+SEARCH_MAX_CHARS = int(os.getenv("SEARCH_MAX_CHARS", "600"))
+
+# DuckDuckGoSearchRun is synchronous; it runs on its own small pool so a slow
+# search can never starve the loop or the default executor
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+_search_engine = None
+_search_cache = TTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "900")),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "3600")),
+    name="search",
+)
+
+def truncate_for_speech(text: str, max_chars: int = SEARCH_MAX_CHARS) -> str:
+    """Cut text to max_chars, preferring the end of a sentence, then a word boundary."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+async def _run_search(query: str) -> str:
+    global _search_engine
+    loop = asyncio.get_running_loop()
+    if _search_engine is None:
+        # langchain_community is slow to import; keep it off the loop and out of worker boot
+        tools_module = await loop.run_in_executor(_search_executor, importlib.import_module, "langchain_community.tools")
+        _search_engine = tools_module.DuckDuckGoSearchRun()
+    raw_results = await asyncio.wait_for(
+        loop.run_in_executor(_search_executor, lambda: _search_engine.run(tool_input=query)),
+        timeout=SEARCH_TIMEOUT,
+    )
+    return truncate_for_speech(raw_results)
 
 @function_tool
+@timed_tool
 async def search_web(
     context: RunContext,
     query: str
@@ -222,8 +261,9 @@ async def search_web(
         Current information and search results from the web
     """
     try:
-        search = DuckDuckGoSearchRun()
-        raw_results = search.run(tool_input=query)
+        raw_results = await _search_cache.get_or_fetch(
+            " ".join(query.lower().split()), lambda: _run_search(query)
+        )
         
         # Format for natural speech
         formatted_results = f"Here's what I found about {query}: {raw_results}"
@@ -234,11 +274,15 @@ async def search_web(
         logging.info(f"Web search completed successfully for query: '{query}'")
         return formatted_results.strip()
         
+    except asyncio.TimeoutError:
+        logging.error(f"Web search timed out after {SEARCH_TIMEOUT}s for '{query}'")
+        raise ToolError(f"The search for {query} is taking too long right now. Please try again in a moment.")
     except Exception as e:
         logging.error(f"Error during web search for '{query}': {e}")
-        return f"I'm having trouble searching for information about {query} right now. The internet connection might be having issues."
+        raise ToolError(f"I'm having trouble searching for information about {query} right now. The internet connection might be having issues.") from e
 
 @function_tool
+@timed_tool
 async def send_email(
     context: RunContext,
     to_email: str,
@@ -259,90 +303,252 @@ async def send_email(
     Returns:
         Confirmation that the email was sent successfully or information about any problems
     """
+    from mailer import get_mail_queue
     try:
-        # Gmail SMTP configuration
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        
-        # Get credentials from environment variables
-        gmail_user = os.getenv("GMAIL_USER")
-        gmail_password = os.getenv("GMAIL_APP_PASSWORD")
-        
-        if not gmail_user or not gmail_password:
-            logging.error("Gmail credentials missing in environment")
+        mail_queue = get_mail_queue()
+        if not mail_queue.configured:
+            logging.error("Email credentials missing in environment")
             return "I can't send emails right now because the email credentials aren't set up properly."
-        
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = gmail_user
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add CC if provided
-        recipients = [to_email]
-        if cc_email:
-            msg['Cc'] = cc_email
-            recipients.append(cc_email)
-        
-        # Attach message body
-        msg.attach(MIMEText(message, 'plain'))
-        
-        # Connect to Gmail SMTP server
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()  # Enable TLS encryption
-        server.login(gmail_user, gmail_password)
-        
-        # Send email
-        text = msg.as_string()
-        server.sendmail(gmail_user, recipients, text)
-        server.quit()
-        
-        logging.info(f"Email sent successfully to {to_email}" + (f" and CC to {cc_email}" if cc_email else ""))
-        
-        confirmation = f"Your email has been sent successfully to {to_email}"
+
+        # Delivery (connection reuse, retries, backoff) happens in the background mail queue
+        await mail_queue.enqueue(
+            to=[to_email],
+            subject=subject,
+            body=message,
+            cc=[cc_email] if cc_email else None,
+        )
+
+        logging.info(f"Email queued for {to_email}" + (f" and CC to {cc_email}" if cc_email else ""))
+
+        confirmation = f"Your email to {to_email}"
         if cc_email:
             confirmation += f" with a copy to {cc_email}"
-        confirmation += f" at {datetime.now().strftime('%I:%M %p')}"
-        
+        confirmation += " has been queued and will be sent in a moment."
+
         return confirmation
-        
-    except smtplib.SMTPAuthenticationError:
-        logging.error("Gmail authentication failed")
-        return "I couldn't send the email because there's an authentication problem with the email account."
-    except smtplib.SMTPException as e:
-        logging.error(f"SMTP error occurred: {e}")
-        return f"There was a problem sending the email: {str(e)}"
+
     except Exception as e:
-        logging.error(f"Unexpected error sending email: {str(e)}")
-        return f"Something went wrong while sending the email: {str(e)}"
+        logging.error(f"Unexpected error queuing email: {str(e)}")
+        raise ToolError(f"Something went wrong while sending the email: {str(e)}") from e
 
-def get_session_id(context) -> str:
+def get_latest_frame(context: RunContext):
+    """Newest camera frame captured by the session's agent, or None if the camera is off."""
+    return getattr(context.session.current_agent, "latest_frame", None)
+
+@function_tool
+@timed_tool
+async def identify_person(context: RunContext) -> str:
     """
-    Generate consistent session ID based on context for session management.
-    Handles both JobContext (from agent.py) and RunContext (from tool calls).
-    Ensures the same session ID is used across all functions within a session.
+    Recognize who is in front of the user using the camera. Use this tool when users ask who is in front of them,
+    who is there, or whether they know the person they are facing. The camera must be on.
+
+    Returns:
+        Who is visible, where they are relative to the user, or that the person is not recognized
     """
-    import uuid
+    try:
+        from faces import describe_matches, get_face_engine
 
-    # Try to get room name - handle different context types
-    room_name = "default_room"
-    
-    # For JobContext (used in agent.py entrypoint)
-    if hasattr(context, 'room') and hasattr(context.room, 'name'):
-        room_name = context.room.name
-    # For RunContext (used in tool calls) - try different attributes
-    elif hasattr(context, 'room') and hasattr(context.room, 'name'):
-        room_name = context.room.name
-    elif hasattr(context, '_room_name'):
-        room_name = context._room_name
-    # Fallback: try to get room from any available attribute
-    else:
-        room_obj = getattr(context, 'room', None)
-        if room_obj and hasattr(room_obj, 'name'):
-            room_name = room_obj.name
-    
-    # Generate consistent UUID based on room name (same room = same session)
-    session_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, room_name))
-    logging.info(f"Generated session ID: {session_id} for room: '{room_name}' (context type: {type(context).__name__})")
-    
-    return session_id
\ No newline at end of file
+        engine = get_face_engine()
+        if engine is None:
+            return "Face recognition isn't available right now. I can still describe what the person looks like."
+
+        frame = get_latest_frame(context)
+        if frame is None:
+            return "The camera isn't sending any picture yet. Please turn on the camera and point it at the person."
+
+        matches = await engine.identify_frame(frame)
+        logging.info(f"Face recognition found {len(matches)} faces: {[m.name for m in matches]}")
+        return describe_matches(matches)
+
+    except Exception as e:
+        logging.error(f"Error identifying person: {e}")
+        raise ToolError("I'm having trouble recognizing faces right now. Please try again.") from e
+
+@function_tool
+@timed_tool
+async def recognize_item(context: RunContext, item_type: str = "object") -> str:
+    """
+    Quickly recognize a banknote or a common household object held in front of the camera. Use this tool when users
+    ask what note or how much money they are holding, or what an object in front of them is. The camera must be on.
+
+    Args:
+        item_type: "currency" for Indonesian or Malaysian banknotes, or "object" for everyday household items
+
+    Returns:
+        A short description of the recognized banknote or object
+    """
+    try:
+        from recognition import describe_prediction, get_classifier
+
+        kind = "currency" if item_type.lower() in ("currency", "money", "banknote", "note", "wang", "uang") else "object"
+        classifier = get_classifier(kind)
+        if classifier is None:
+            return f"Quick {kind} recognition isn't available right now. I can look at the camera image instead."
+
+        frame = get_latest_frame(context)
+        if frame is None:
+            return "The camera isn't sending any picture yet. Please turn on the camera and hold the item in front of it."
+
+        prediction = await classifier.classify(frame)
+        logging.info(f"Recognized {kind}: {prediction.label} ({prediction.confidence:.2f})")
+        return describe_prediction(kind, prediction, classifier.spec.min_confidence)
+
+    except Exception as e:
+        logging.error(f"Error recognizing {item_type}: {e}")
+        raise ToolError("I'm having trouble recognizing that right now. Please try again.") from e
+
+# read_text answers with whatever is recognized by then; anything later is spoken as it arrives
+READ_TEXT_FIRST_MS = float(os.getenv("OCR_FIRST_RESPONSE_MS", "400"))
+# The rest of a text is dropped if the agent can't get a word in for this long
+READ_TEXT_STALL_SECONDS = float(os.getenv("OCR_STALL_SECONDS", "20"))
+
+async def _read_rest(session, chunks: asyncio.Queue, producer: asyncio.Task) -> None:
+    """Speak the rest of a long text as it is recognized, after each reply finishes; stop if the user cuts in."""
+    from prompts import READ_TEXT_CONTINUE
+
+    loop = asyncio.get_running_loop()
+    # Woken by recognized chunks and by session state changes; never polled in a tight loop
+    wake = asyncio.Event()
+    closed = False
+
+    def on_state_changed(_event=None) -> None:
+        wake.set()
+
+    def on_close(_event=None) -> None:
+        nonlocal closed
+        closed = True
+        wake.set()
+
+    async def collect() -> None:
+        while True:
+            lines = await chunks.get()
+            if lines is None:
+                return
+            pending.extend(lines)
+            wake.set()
+
+    pending = []
+    collector = asyncio.create_task(collect(), name="read_text_collect")
+    collector.add_done_callback(on_state_changed)
+    session.on("agent_state_changed", on_state_changed)
+    session.on("user_state_changed", on_state_changed)
+    session.on("close", on_close)
+    stalled_since = loop.time()
+    try:
+        while not closed and (pending or not collector.done()):
+            if session.user_state == "speaking":
+                return
+            if not pending or session.agent_state != "listening":
+                if not pending:
+                    stalled_since = loop.time()
+                elif loop.time() - stalled_since > READ_TEXT_STALL_SECONDS:
+                    logging.info(f"Dropping {len(pending)} unread lines: no turn to read them in")
+                    return
+                wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            text, pending = "\n".join(pending), []
+            if session.current_agent.tts:
+                # Cascaded pipeline: speak the text verbatim
+                handle = session.say(text)
+            else:
+                handle = session.generate_reply(instructions=READ_TEXT_CONTINUE.format(text=text))
+            await handle
+            if handle.interrupted:
+                return
+            stalled_since = loop.time()
+    finally:
+        session.off("agent_state_changed", on_state_changed)
+        session.off("user_state_changed", on_state_changed)
+        session.off("close", on_close)
+        collector.cancel()
+        producer.cancel()
+
+@function_tool
+@timed_tool
+async def read_text(context: RunContext) -> str:
+    """
+    Read printed text in front of the camera: signs, labels, packaging, documents and screens. Runs on the device
+    and is faster than describing the camera image, so use it whenever users ask you to read something. The camera
+    must be on and pointed at the text.
+
+    Returns:
+        The text in reading order. For long text, the first part; the rest is read out automatically as it is recognized
+    """
+    try:
+        from ocr import get_text_reader
+
+        reader = get_text_reader()
+        if reader is None:
+            return "Quick text reading isn't available right now. I can read it from the camera image instead."
+
+        frame = get_latest_frame(context)
+        if frame is None:
+            return "The camera isn't sending any picture yet. Please turn on the camera and point it at the text."
+
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def produce() -> None:
+            try:
+                async for lines in reader.read(frame):
+                    chunks.put_nowait(lines)
+            finally:
+                chunks.put_nowait(None)
+
+        producer = asyncio.create_task(produce(), name="read_text")
+        first = await chunks.get()
+        if first is None:
+            # Surfaces a recognition error, if that's why nothing came back
+            await producer
+            return "I can't find any text in view. Try holding it closer, flat, and in good light."
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + READ_TEXT_FIRST_MS / 1000
+        lines = list(first)
+        finished = False
+        while not finished:
+            try:
+                more = await asyncio.wait_for(chunks.get(), timeout=max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                break
+            finished = more is None
+            lines.extend(more or [])
+        text = "\n".join(lines)
+        logging.info(f"Read {len(lines)} lines of text{'' if finished else ', more to come'}")
+        if finished:
+            return f"Text in view:\n{text}"
+
+        supervisor = context.userdata.get("supervisor")
+        rest = _read_rest(context.session, chunks, producer)
+        if supervisor is None or supervisor.spawn(rest, name="read_text_rest") is None:
+            # No way to speak the rest later; at least stop recognizing it
+            rest.close()
+            producer.cancel()
+            return f"Text in view (the first part only):\n{text}"
+        return f"Text in view, first part (read this now; the rest follows automatically):\n{text}"
+
+    except Exception as e:
+        logging.error(f"Error reading text: {e}")
+        raise ToolError("I'm having trouble reading that right now. Please try again.") from e
+
+def get_session(context) -> SessionIdentity:
+    """The session identity entrypoint resolved; built from the room name if there is none."""
+    userdata = getattr(context, "userdata", None)
+    if userdata is not None and "session" in userdata:
+        return userdata["session"]
+    room = getattr(context, "room", None)
+    return SessionIdentity(getattr(room, "name", None) or "default_room")
+
+def get_session_id(context) -> str:
+    """
+    Session ID for a JobContext or RunContext. Resolved once in entrypoint and
+    kept in userdata, so this is a dict lookup on the tool hot path.
+    """
+    userdata = getattr(context, "userdata", None)
+    if userdata is not None and "session" in userdata:
+        return userdata["session"].session_id
+    room = getattr(context, "room", None)
+    return session_id_for_room(getattr(room, "name", None) or "default_room")
@@ -0,0 +1,420 @@
+from dotenv import load_dotenv
+import asyncio
+import base64
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from livekit import rtc
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Shared by every session in the worker; cv2 releases the GIL while resizing/encoding
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("VISION_THREADS", "2")), thread_name_prefix="vision")
+# Per-thread scratch buffers, reused as long as the frame size doesn't change
+_buffers = threading.local()
+
+async def run_in_vision_pool(fn, *args):
+    """Run CPU-bound image work on the shared vision pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fn, *args)
+
+
+_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+@dataclass
+class EncoderConfig:
+    max_edge: int = 768
+    format: str = "jpeg"  # "jpeg" or "webp"
+    quality: int = 75
+    debug_dump_path: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "EncoderConfig":
+        image_format = os.getenv("VISION_FORMAT", "jpeg").lower()
+        if image_format not in _MIME_TYPES:
+            logger.warning(f"Unsupported VISION_FORMAT '{image_format}', falling back to jpeg")
+            image_format = "jpeg"
+        return cls(
+            max_edge=int(os.getenv("VISION_MAX_EDGE", "768")),
+            format=image_format,
+            quality=int(os.getenv("VISION_QUALITY", "75")),
+            debug_dump_path=os.getenv("VISION_DEBUG_DUMP_PATH") or None,
+        )
+
+
+@dataclass
+class DedupConfig:
+    enabled: bool = True
+    # dHash Hamming distance at or below which frames are the same scene
+    hash_distance: int = 4
+    # Above this distance the scene has clearly changed; in between, SSIM decides
+    hash_changed_distance: int = 12
+    ssim_threshold: float = 0.90
+    # Re-send a frame at least this often even if nothing changed
+    max_unchanged_seconds: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "DedupConfig":
+        return cls(
+            enabled=os.getenv("VISION_DEDUP_ENABLED", "1") == "1",
+            hash_distance=int(os.getenv("VISION_DEDUP_HASH_DISTANCE", "4")),
+            hash_changed_distance=int(os.getenv("VISION_DEDUP_HASH_CHANGED_DISTANCE", "12")),
+            ssim_threshold=float(os.getenv("VISION_DEDUP_SSIM", "0.90")),
+            max_unchanged_seconds=float(os.getenv("VISION_DEDUP_MAX_AGE", "30")),
+        )
+
+
+@dataclass
+class QualityConfig:
+    enabled: bool = True
+    # How far back to look for a better frame, and how often to keep one
+    window_ms: int = 500
+    sample_interval_ms: int = 125
+    # Thresholds are measured on a grayscale thumbnail of SCORE_EDGE pixels
+    min_sharpness: float = 40.0  # variance of the Laplacian
+    min_brightness: float = 35.0  # mean luminance, 0-255
+    max_brightness: float = 240.0
+    max_motion: float = 30.0  # mean absolute difference to the neighbouring sample
+
+    @classmethod
+    def from_env(cls) -> "QualityConfig":
+        return cls(
+            enabled=os.getenv("VISION_QUALITY_GATE_ENABLED", "1") == "1",
+            window_ms=int(os.getenv("VISION_QUALITY_WINDOW_MS", "500")),
+            sample_interval_ms=int(os.getenv("VISION_QUALITY_SAMPLE_MS", "125")),
+            min_sharpness=float(os.getenv("VISION_MIN_SHARPNESS", "40")),
+            min_brightness=float(os.getenv("VISION_MIN_BRIGHTNESS", "35")),
+            max_brightness=float(os.getenv("VISION_MAX_BRIGHTNESS", "240")),
+            max_motion=float(os.getenv("VISION_MAX_MOTION", "30")),
+        )
+
+
+@dataclass
+class FrameQuality:
+    sharpness: float
+    brightness: float
+    motion: float
+    # None when usable, otherwise "dark", "bright", "blurry" or "motion"
+    problem: Optional[str] = None
+
+    @property
+    def score(self) -> float:
+        return self.sharpness / (1.0 + self.motion / 10.0)
+
+
+@dataclass
+class EncodedFrame:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    # Set when only part of the frame was encoded (a regions.Region)
+    region: Optional[Any] = None
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def _scratch(name: str, shape: tuple) -> np.ndarray:
+    buf = getattr(_buffers, name, None)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype=np.uint8)
+        setattr(_buffers, name, buf)
+    return buf
+
+
+def _as_bgra(frame: rtc.VideoFrame) -> rtc.VideoFrame:
+    # Screen shares and some clients already send BGRA; convert() refuses a same-format conversion
+    if frame.type == rtc.VideoBufferType.BGRA:
+        return frame
+    return frame.convert(rtc.VideoBufferType.BGRA)
+
+
+def frame_to_bgr(frame: rtc.VideoFrame, max_edge: int, region: Optional[Any] = None) -> np.ndarray:
+    """
+    Convert a LiveKit frame to a BGR array no larger than max_edge on its longest side.
+    With a region (normalized x, y, w, h), only that part is converted, at full source detail.
+    The result lives in a per-thread scratch buffer; copy it if it must outlive the call.
+    """
+    bgra = _as_bgra(frame)
+    src = np.frombuffer(bgra.data, dtype=np.uint8).reshape(bgra.height, bgra.width, 4)
+    if region is not None:
+        x0, y0 = int(region.x * bgra.width), int(region.y * bgra.height)
+        x1 = max(x0 + 1, int((region.x + region.w) * bgra.width))
+        y1 = max(y0 + 1, int((region.y + region.h) * bgra.height))
+        src = src[y0:y1, x0:x1]
+
+    src_height, src_width = src.shape[:2]
+    scale = min(1.0, max_edge / max(src_width, src_height))
+    if scale < 1.0:
+        width, height = max(1, round(src_width * scale)), max(1, round(src_height * scale))
+        src = cv2.resize(src, (width, height), dst=_scratch("resized", (height, width, 4)), interpolation=cv2.INTER_AREA)
+
+    return cv2.cvtColor(src, cv2.COLOR_BGRA2BGR, dst=_scratch("bgr", src.shape[:2] + (3,)))
+
+
+def encode_bgr(image: np.ndarray, image_format: str = "jpeg", quality: int = 75) -> EncodedFrame:
+    if image_format == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    ok, buf = cv2.imencode(f".{image_format}", image, params)
+    if not ok:
+        raise ValueError(f"Failed to encode frame as {image_format}")
+    return EncodedFrame(
+        data=buf.tobytes(),
+        mime_type=_MIME_TYPES[image_format],
+        width=image.shape[1],
+        height=image.shape[0],
+    )
+
+
+def dhash(gray: np.ndarray) -> np.ndarray:
+    """64-bit difference hash of a grayscale image, as 8 packed bytes."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> int:
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean structural similarity of two equally sized grayscale images."""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+    blur = lambda x: cv2.GaussianBlur(x, (7, 7), 1.5)
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    score = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return float(score.mean())
+
+
+class FrameDeduplicator:
+    """
+    Decide whether a frame shows the same scene as the last frame sent to the model.
+    dHash handles the clear cases; SSIM on a small thumbnail settles the ambiguous band.
+    """
+
+    THUMBNAIL_SIZE = (64, 64)
+
+    def __init__(self, config: Optional[DedupConfig] = None) -> None:
+        self.config = config or DedupConfig.from_env()
+        self.sent = 0
+        self.skipped = 0
+        self._last_hash: Optional[np.ndarray] = None
+        self._last_thumbnail: Optional[np.ndarray] = None
+        self._last_sent_at = 0.0
+
+    def is_duplicate(self, image: np.ndarray) -> bool:
+        """Check a BGR frame against the last sent one; if it is new, it becomes the reference."""
+        if not self.config.enabled:
+            self.sent += 1
+            return False
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        frame_hash = dhash(gray)
+        thumbnail = cv2.resize(gray, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+        duplicate = False
+        if self._last_hash is not None and time.monotonic() - self._last_sent_at < self.config.max_unchanged_seconds:
+            distance = hamming(frame_hash, self._last_hash)
+            if distance <= self.config.hash_distance:
+                duplicate = True
+            elif distance <= self.config.hash_changed_distance:
+                duplicate = ssim(thumbnail, self._last_thumbnail) >= self.config.ssim_threshold
+
+        if duplicate:
+            self.skipped += 1
+            return True
+
+        self._last_hash = frame_hash
+        self._last_thumbnail = thumbnail
+        self._last_sent_at = time.monotonic()
+        self.sent += 1
+        return False
+
+    def reset(self) -> None:
+        """Forget the reference frame, e.g. after the camera was switched."""
+        self._last_hash = None
+        self._last_thumbnail = None
+
+
+SCORE_EDGE = 160
+
+
+def frame_to_gray(frame: rtc.VideoFrame, max_edge: int = SCORE_EDGE) -> np.ndarray:
+    """Small grayscale view of a frame. I420 frames use the Y plane directly, no color conversion."""
+    if frame.type == rtc.VideoBufferType.I420:
+        gray = np.frombuffer(frame.data, dtype=np.uint8, count=frame.width * frame.height)
+        gray = gray.reshape(frame.height, frame.width)
+    else:
+        bgra = _as_bgra(frame)
+        bgra = np.frombuffer(bgra.data, dtype=np.uint8).reshape(bgra.height, bgra.width, 4)
+        gray = cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY)
+    scale = max_edge / max(frame.width, frame.height)
+    size = (max(1, round(frame.width * scale)), max(1, round(frame.height * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def score_frames(frames: List[rtc.VideoFrame], config: QualityConfig) -> List[FrameQuality]:
+    grays = [frame_to_gray(frame) for frame in frames]
+    sharpness = [float(cv2.Laplacian(gray, cv2.CV_32F).var()) for gray in grays]
+
+    if len({gray.shape for gray in grays}) == 1:
+        stack = np.stack(grays).astype(np.int16)
+        brightness = stack.mean(axis=(1, 2))
+        if len(grays) > 1:
+            diffs = np.abs(np.diff(stack, axis=0)).mean(axis=(1, 2))
+            # Each sample's motion is the larger difference to either neighbour
+            motion = np.maximum(np.append(diffs, diffs[-1]), np.insert(diffs, 0, diffs[0]))
+        else:
+            motion = np.zeros(1)
+    else:
+        # Resolution changed mid-window (camera switch), score frames independently
+        brightness = np.array([gray.mean() for gray in grays])
+        motion = np.zeros(len(grays))
+
+    qualities = []
+    for sharp, bright, move in zip(sharpness, brightness.tolist(), motion.tolist()):
+        problem = None
+        if bright < config.min_brightness:
+            problem = "dark"
+        elif bright > config.max_brightness:
+            problem = "bright"
+        elif move > config.max_motion:
+            problem = "motion"
+        elif sharp < config.min_sharpness:
+            problem = "blurry"
+        qualities.append(FrameQuality(sharpness=sharp, brightness=bright, motion=move, problem=problem))
+    return qualities
+
+
+def select_best_frame(
+    frames: List[rtc.VideoFrame], config: QualityConfig
+) -> Tuple[rtc.VideoFrame, FrameQuality]:
+    """Pick the sharpest steady frame, preferring usable ones; the newest wins ties."""
+    qualities = score_frames(frames, config)
+    best = max(
+        range(len(frames)),
+        key=lambda i: (qualities[i].problem is None, qualities[i].score, i),
+    )
+    return frames[best], qualities[best]
+
+
+class FrameRing:
+    """
+    Recently sampled frames from the capture stream, bounded to one quality window.
+    push() is called for every decoded frame and is O(1); it only keeps one frame
+    per sample interval.
+    """
+
+    def __init__(self, config: Optional[QualityConfig] = None, max_bytes: Optional[int] = None) -> None:
+        self.config = config or QualityConfig.from_env()
+        size = max(1, self.config.window_ms // max(1, self.config.sample_interval_ms))
+        self._frames: deque = deque(maxlen=size)
+        self._last_sample_at = 0.0
+        # Large camera resolutions keep fewer frames rather than more memory
+        self.max_bytes = max_bytes
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(frame.data) for _, frame in self._frames)
+
+    def push(self, frame: rtc.VideoFrame) -> None:
+        now = time.monotonic()
+        if (now - self._last_sample_at) * 1000 >= self.config.sample_interval_ms:
+            self._frames.append((now, frame))
+            self._last_sample_at = now
+            if self.max_bytes is not None:
+                while len(self._frames) > 1 and self.nbytes > self.max_bytes:
+                    self._frames.popleft()
+
+    def snapshot(self, latest: Optional[rtc.VideoFrame] = None) -> List[rtc.VideoFrame]:
+        """Frames from the last window, oldest first, with latest appended if it wasn't sampled."""
+        cutoff = time.monotonic() - self.config.window_ms / 1000
+        frames = [frame for sampled_at, frame in self._frames if sampled_at >= cutoff]
+        if latest is not None and (not frames or frames[-1] is not latest):
+            frames.append(latest)
+        return frames
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self._last_sample_at = 0.0
+
+    async def select(self, latest: rtc.VideoFrame) -> Tuple[rtc.VideoFrame, Optional[FrameQuality]]:
+        """Best frame of the recent window, scored in the vision pool. Quality is None when the gate is off."""
+        if not self.config.enabled:
+            return latest, None
+        frames = self.snapshot(latest)
+        return await run_in_vision_pool(select_best_frame, frames, self.config)
+
+
+class FrameEncoder:
+    """
+    Downscale and compress video frames in the shared vision thread pool so the
+    event loop (and every room's audio) never waits on image work.
+    """
+
+    def __init__(self, config: Optional[EncoderConfig] = None, region_finder: Optional[Any] = None) -> None:
+        self.config = config or EncoderConfig.from_env()
+        # regions.RegionFinder: picks the resolution per turn and crops to what the question is about
+        self.region_finder = region_finder
+        self._dump_task: Optional[asyncio.Task] = None
+
+    def _encode_sync(
+        self, frame: rtc.VideoFrame, deduplicator: Optional[FrameDeduplicator], focus: Optional[str] = None
+    ) -> Optional[EncodedFrame]:
+        region, max_edge = None, self.config.max_edge
+        if self.region_finder is not None and focus is not None:
+            # The analysis copy lives in the scratch buffer, so it's done with before the real conversion
+            region = self.region_finder.find(frame_to_bgr(frame, self.region_finder.analysis_edge), focus)
+            max_edge = self.region_finder.edge_for(focus, region, max_edge)
+        image = frame_to_bgr(frame, max_edge, region)
+        if deduplicator is not None and deduplicator.is_duplicate(image):
+            return None
+        encoded = encode_bgr(image, self.config.format, self.config.quality)
+        encoded.region = region
+        return encoded
+
+    async def encode(
+        self, frame: rtc.VideoFrame, deduplicator: Optional[FrameDeduplicator] = None, focus: Optional[str] = None
+    ) -> Optional[EncodedFrame]:
+        """
+        Encode a frame for upload. Returns None if deduplicator says the scene is unchanged.
+        With a focus (see regions.turn_focus) and a region finder, may encode only part of the frame.
+        """
+        encoded = await run_in_vision_pool(self._encode_sync, frame, deduplicator, focus)
+        if encoded is not None and self.config.debug_dump_path:
+            self._dump(encoded)
+        return encoded
+
+    def _dump(self, encoded: EncodedFrame) -> None:
+        # Fire-and-forget, but never more than one write in flight
+        if self._dump_task is not None and not self._dump_task.done():
+            return
+        path = self.config.debug_dump_path
+        self._dump_task = asyncio.create_task(asyncio.to_thread(_write_file, path, encoded.data))
+
+
+def _write_file(path: str, data: bytes) -> None:
+    try:
+        with open(path, "wb") as f:
+            f.write(data)
+    except OSError as e:
+        logger.warning(f"Failed to write debug frame to {path}: {e}")
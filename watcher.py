@@ -0,0 +1,323 @@
+from dotenv import load_dotenv
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import aiohttp
+import cv2
+import numpy as np
+from livekit import rtc
+
+from prompts import SCENE_ALERT_SPEAK, SCENE_OBSTACLE_WARNING, SCENE_TRIAGE_PROMPTS
+from telemetry import metrics
+from vision import FrameEncoder, dhash, frame_to_gray, hamming, run_in_vision_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Long edge of the detector's grayscale view; ~6k pixels keeps each sample well under a millisecond
+WATCH_EDGE = 96
+
+SCENE_SAMPLES = metrics.counter("visora_scene_samples_total", "Frames checked by the scene watcher")
+SCENE_ALERTS = metrics.counter(
+    "visora_scene_alerts_total",
+    "Scene changes by outcome: spoken, dismissed by triage, not worth a fallback warning, busy, or error",
+    labels=("reason", "outcome"),
+)
+
+
+@dataclass
+class WatcherConfig:
+    enabled: bool = True
+    # Sampling interval adapts between these: fast while the view moves, slow while it is static
+    min_interval: float = 0.25
+    max_interval: float = 2.0
+    # Mean absolute frame-to-frame difference (0-255) that counts as movement
+    motion_threshold: float = 6.0
+    # Per-pixel difference from the settled background that counts as changed
+    pixel_threshold: int = 25
+    # Obstacle: this share of the centre-bottom region changed, clearly more than the edges
+    obstacle_fraction: float = 0.35
+    obstacle_dominance: float = 1.6
+    # New scene: the settled view's dHash is this far from the view at the last alert
+    scene_distance: int = 22
+    confirm_samples: int = 2
+    cooldown: float = 8.0
+    # One-shot image model that decides whether a change is worth speaking about; "" disables it
+    triage_model: str = "gemini-2.5-flash-lite"
+    # A late alert is worse than none
+    triage_timeout: float = 3.0
+
+    @classmethod
+    def from_env(cls) -> "WatcherConfig":
+        return cls(
+            enabled=os.getenv("SCENE_WATCHER_ENABLED", "1") == "1",
+            min_interval=float(os.getenv("SCENE_WATCHER_MIN_INTERVAL", "0.25")),
+            max_interval=float(os.getenv("SCENE_WATCHER_MAX_INTERVAL", "2.0")),
+            obstacle_fraction=float(os.getenv("SCENE_WATCHER_OBSTACLE_FRACTION", "0.35")),
+            scene_distance=int(os.getenv("SCENE_WATCHER_SCENE_DISTANCE", "22")),
+            cooldown=float(os.getenv("SCENE_WATCHER_COOLDOWN", "8")),
+            triage_model=(
+                os.getenv("SCENE_TRIAGE_MODEL", "gemini-2.5-flash-lite") if os.getenv("GOOGLE_API_KEY") else ""
+            ),
+            triage_timeout=float(os.getenv("SCENE_TRIAGE_TIMEOUT", "3")),
+        )
+
+
+@dataclass
+class SceneObservation:
+    motion: float
+    centre_change: float
+    edge_change: float
+    # "obstacle", "scene" or None
+    reason: Optional[str] = None
+
+
+class SceneChangeDetector:
+    """
+    Cheap change detector on a tiny grayscale view; runs in the vision pool.
+
+    It doesn't know what anything is. It flags two patterns worth a look by
+    the realtime model. An obstacle is something growing in the centre of the
+    view (where the user is heading) much faster than at the edges, which
+    mostly change from the user's own movement. A new scene is a view that
+    has settled somewhere clearly different from where the last alert was.
+    """
+
+    def __init__(self, config: WatcherConfig) -> None:
+        self.config = config
+        self._previous: Optional[np.ndarray] = None
+        self._background: Optional[np.ndarray] = None
+        self._alert_hash: Optional[np.ndarray] = None
+        self._streak = 0
+
+    def reset(self) -> None:
+        self._previous = None
+        self._background = None
+        self._streak = 0
+
+    def update(self, frame: rtc.VideoFrame) -> SceneObservation:
+        gray = frame_to_gray(frame, WATCH_EDGE).astype(np.float32)
+        if self._previous is None or self._previous.shape != gray.shape:
+            self._previous = gray
+            self._background = gray.copy()
+            return SceneObservation(motion=0.0, centre_change=0.0, edge_change=0.0)
+
+        motion = float(np.abs(gray - self._previous).mean())
+        changed = np.abs(gray - self._background) > self.config.pixel_threshold
+        h, w = changed.shape
+        # Centre-bottom: the path ahead of a phone held at chest height
+        centre = changed[h // 3:, w // 4: 3 * w // 4]
+        centre_change = float(centre.mean())
+        edge_change = float((changed.sum() - centre.sum()) / max(1, changed.size - centre.size))
+
+        obstacle = (
+            centre_change >= self.config.obstacle_fraction
+            and centre_change >= self.config.obstacle_dominance * max(edge_change, 0.05)
+        )
+        self._streak = self._streak + 1 if obstacle else 0
+
+        reason = None
+        if self._streak >= self.config.confirm_samples:
+            reason = "obstacle"
+        elif motion < self.config.motion_threshold:
+            current_hash = dhash(gray.astype(np.uint8))
+            if self._alert_hash is None:
+                self._alert_hash = current_hash
+            elif hamming(current_hash, self._alert_hash) >= self.config.scene_distance:
+                reason = "scene"
+        if reason is not None:
+            self._alert_hash = dhash(gray.astype(np.uint8))
+            self._streak = 0
+
+        # Slow-moving background, so a person walking past registers but a steady pan settles
+        cv2.accumulateWeighted(gray, self._background, 0.2)
+        self._previous = gray
+        return SceneObservation(motion, centre_change, edge_change, reason)
+
+
+@dataclass
+class TriageResult:
+    alert: bool
+    message: str
+
+
+class SceneTriage:
+    """
+    Decides whether a flagged change is worth interrupting the user for.
+
+    One small generateContent call with the frame and a JSON schema, on the
+    tools' shared HTTP session, instead of a full realtime turn: most
+    changes are harmless, and a realtime model asked for an "empty reply"
+    tends to say something anyway.
+    """
+
+    URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+    SCHEMA = {
+        "type": "OBJECT",
+        "properties": {"alert": {"type": "BOOLEAN"}, "message": {"type": "STRING"}},
+        "required": ["alert", "message"],
+    }
+
+    def __init__(self, model: str, timeout: float) -> None:
+        self.model = model
+        self.timeout = timeout
+
+    async def check(self, image: bytes, mime_type: str, reason: str) -> TriageResult:
+        from tools import get_http_session
+
+        body = {
+            "contents": [{
+                "role": "user",
+                "parts": [
+                    {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image).decode("ascii")}},
+                    {"text": SCENE_TRIAGE_PROMPTS[reason]},
+                ],
+            }],
+            "generationConfig": {
+                "temperature": 0,
+                "maxOutputTokens": 80,
+                "responseMimeType": "application/json",
+                "responseSchema": self.SCHEMA,
+            },
+        }
+        async with get_http_session().post(
+            self.URL.format(model=self.model), params={"key": os.getenv("GOOGLE_API_KEY")}, json=body,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+        result = json.loads(data["candidates"][0]["content"]["parts"][0]["text"])
+        message = str(result.get("message") or "").strip()
+        return TriageResult(bool(result.get("alert")) and bool(message), message)
+
+
+class SceneWatcher:
+    """
+    Watches the session's camera between user turns and speaks up on its own.
+
+    Samples the newest frame at an adaptive rate. When the detector flags an
+    obstacle or a new scene, and nobody is speaking, the frame goes to
+    SceneTriage, at most once per cooldown; only an alert it confirms is
+    spoken. Without a triage model, obstacles get a fixed short warning and
+    scene changes are left alone.
+    """
+
+    def __init__(
+        self,
+        session,
+        get_frame: Callable[[], Optional[rtc.VideoFrame]],
+        config: Optional[WatcherConfig] = None,
+        should_pause: Callable[[], bool] = lambda: False,
+    ) -> None:
+        self.config = config or WatcherConfig.from_env()
+        self.session = session
+        self._get_frame = get_frame
+        self._should_pause = should_pause
+        self._detector = SceneChangeDetector(self.config)
+        self._encoder = FrameEncoder()
+        self._triage = (
+            SceneTriage(self.config.triage_model, self.config.triage_timeout) if self.config.triage_model else None
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._last_alert_at = 0.0
+        self._last_frame: Optional[rtc.VideoFrame] = None
+        self.interval = self.config.max_interval
+        self.samples = 0
+        self.alerts = 0
+
+    def start(self) -> None:
+        if self.config.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="scene_watcher")
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info(f"Scene watcher: {self.samples} samples, {self.alerts} alerts")
+
+    def _idle(self) -> bool:
+        # Never talk over the user or the agent, or while a reply is being prepared
+        return (
+            getattr(self.session, "user_state", "listening") != "speaking"
+            and getattr(self.session, "agent_state", "listening") == "listening"
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            frame = self._get_frame()
+            if frame is None or self._should_pause():
+                self._detector.reset()
+                self.interval = self.config.max_interval
+                continue
+            if frame is self._last_frame:
+                # Stream stalled; nothing new to look at
+                continue
+            self._last_frame = frame
+            try:
+                observation = await run_in_vision_pool(self._detector.update, frame)
+            except Exception as e:
+                logger.warning(f"Scene watcher sample failed: {e}")
+                continue
+            self.samples += 1
+            SCENE_SAMPLES.inc()
+
+            if observation.motion >= self.config.motion_threshold:
+                self.interval = max(self.config.min_interval, self.interval / 2)
+            else:
+                self.interval = min(self.config.max_interval, self.interval * 1.5)
+
+            if observation.reason is None or time.monotonic() - self._last_alert_at < self.config.cooldown:
+                continue
+            if not self._idle():
+                SCENE_ALERTS.inc(reason=observation.reason, outcome="busy")
+                continue
+            self._last_alert_at = time.monotonic()
+            try:
+                await self._alert(frame, observation)
+            except Exception as e:
+                SCENE_ALERTS.inc(reason=observation.reason, outcome="error")
+                logger.warning(f"Scene alert failed: {e}")
+
+    async def _alert(self, frame: rtc.VideoFrame, observation: SceneObservation) -> None:
+        reason = observation.reason
+        logger.info(
+            f"Scene change ({reason}): centre {observation.centre_change:.2f}, "
+            f"edges {observation.edge_change:.2f}, motion {observation.motion:.1f}"
+        )
+        if self._triage is not None:
+            encoded = await self._encoder.encode(frame)
+            triage = await self._triage.check(encoded.data, encoded.mime_type, reason)
+            if not triage.alert:
+                SCENE_ALERTS.inc(reason=reason, outcome="dismissed")
+                return
+            message = triage.message
+        elif reason == "obstacle":
+            message = SCENE_OBSTACLE_WARNING
+        else:
+            # A new place isn't worth interrupting for without knowing what it is
+            SCENE_ALERTS.inc(reason=reason, outcome="skipped")
+            return
+        if not self._idle():
+            # The user or the agent started talking while triage ran
+            SCENE_ALERTS.inc(reason=reason, outcome="busy")
+            return
+        self.alerts += 1
+        SCENE_ALERTS.inc(reason=reason, outcome="sent")
+        logger.info(f"Scene alert ({reason}): {message}")
+        if self.session.current_agent.tts:
+            # Cascaded pipeline: speak the alert verbatim
+            self.session.say(message)
+        else:
+            self.session.generate_reply(instructions=SCENE_ALERT_SPEAK.format(message=message))